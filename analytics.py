@@ -0,0 +1,75 @@
+"""
+Backend for the aggregations that scan whole base tables (the SQL
+Queries tab's claims per listing).
+
+With FOOD_ANALYTICS_BACKEND=parquet they run in process on the
+memory-mapped Parquet snapshot written by snapshot.py, using pyarrow's
+query engine (group_by / join), so they neither read the SQLite file
+nor hold a read transaction open alongside the app's writes. Results
+are as old as the latest snapshot. The default backend (sqlite), or a
+missing snapshot or pyarrow, runs the equivalent SQL through
+db.run_query instead.
+
+Aggregations already kept as rollups (the Data Analysis charts, see
+chart_data.py) read O(groups) rows and stay on SQLite.
+
+Each function returns the same columns from either backend. Snapshot
+runs are recorded in db.stats under the SQL they replace, so they show
+up on the Diagnostics page with the app's other queries.
+"""
+
+import os
+import time
+
+from db import run_query, stats
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import snapshot
+except ImportError:  # pyarrow is optional; the SQLite backend needs nothing else
+    snapshot = None
+
+BACKEND = os.environ.get("FOOD_ANALYTICS_BACKEND", "sqlite")
+
+CLAIMS_PER_LISTING_SQL = ("SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claim_count FROM food_listings f "
+                          "LEFT JOIN claims c ON c.food_id=f.food_id GROUP BY f.food_id, f.food_name "
+                          "ORDER BY claim_count DESC")
+
+
+def current_snapshot() -> dict:
+    """Manifest of the snapshot queries run on, or None when they run on SQLite."""
+    if BACKEND != "parquet" or snapshot is None:
+        return None
+    return snapshot.manifest()
+
+
+def _run(sql: str, params: list, arrow_query):
+    _, tables = (None, None) if current_snapshot() is None else snapshot.load()
+    if tables is None:
+        return run_query(sql, params)
+    start = time.perf_counter()
+    df = arrow_query(tables, *params).to_pandas()
+    stats.record(sql, params, "snapshot", (time.perf_counter() - start) * 1000, len(df))
+    return df
+
+
+def _strings(column):
+    return column.cast(pa.string()) if pa.types.is_dictionary(column.type) else column
+
+
+def claims_per_listing():
+    """Claims per listing, most claimed first."""
+    def arrow_query(tables):
+        counts = tables["claims"].group_by("food_id").aggregate([("claim_id", "count")])
+        # Each row group of the snapshot has its own food_name dictionary; the join needs one
+        listings = tables["food_listings"].select(["food_id", "food_name"]).unify_dictionaries()
+        joined = listings.join(counts, "food_id", join_type="left outer")
+        result = pa.table({
+            "food_id": joined["food_id"],
+            "food_name": _strings(joined["food_name"]),
+            "claim_count": pc.fill_null(joined["claim_id_count"], 0),
+        })
+        return result.sort_by([("claim_count", "descending"), ("food_id", "ascending")])
+
+    return _run(CLAIMS_PER_LISTING_SQL, [], arrow_query)
@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
-import sqlite3
+import json
+import os
+
 import pandas as pd
 import numpy as np
 import streamlit as st
 import altair as alt
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.linear_model import LogisticRegression
 from datetime import datetime
 
-DB_PATH = "food.db"
+from db import run_query, exec_query, pool, stats as query_stats, writes
+import analytics
+import availability
+import claim_status
+import lookups
+from dimensions import dimensions
+from pickers import find_claims, find_listings, find_receivers
+import reservations
+from model_registry import registry, InsufficientData
+from score_listings import score_open_listings, at_risk_listings
+from listings import COLUMNS as LISTING_COLUMNS, SORTS as LISTING_SORTS, count_listings, listings_page, save_listing, search_listings
+from query_stats import explain
+from chart_data import OTHER, TREND_ALL, listing_counts, trend, trend_extent
 
 # Add advanced CSS with modern design elements
 st.markdown("""
@@ -478,28 +487,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ---------- Helpers ----------
-@st.cache_data
-def run_query(q, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        df = pd.read_sql_query(q, conn, params=params or [])
-    finally:
-        conn.close()
-    return df
-
-def exec_query(q, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        cur.execute(q, params or [])
-        conn.commit()
-    finally:
-        conn.close()
-
-def load_table(name):
-    return run_query(f"SELECT * FROM {name}")
-
 # ---------- UI ----------
 st.title("🍽️ Local Food Wastage Management System")
 st.markdown("""
@@ -532,14 +519,20 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-tab1, tab2, tab3, tab4 = st.tabs([
-    " 🔍 Data Filtering ", 
-    " 📝 CRUD Operations ", 
-    " 📓 SQL Queries ", 
-    " 📊 Data Analysis"
-])
+def typeahead(label, find, key, allow_none=False, **find_kwargs):
+    """Search box plus a selectbox of the top matches; returns the chosen id."""
+    text = st.text_input(label, key=f"{key}_search", placeholder="Type a name or #id to search")
+    matches = find(text, **find_kwargs)
+    labels = dict(zip(matches["id"].tolist(), matches["label"].tolist()))
+    options = ([None] if allow_none else []) + list(labels)
+    return st.selectbox(
+        f"{label} matches", options, key=key, label_visibility="collapsed",
+        format_func=lambda i: "(none)" if i is None else labels[i],
+    )
 
-with tab1:
+# Each section is its own page, so a rerun only executes the queries of the
+# section the user is looking at.
+def data_filtering():
     st.markdown("""
         <div class='glass-card'>
         <h2 style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; margin-top: 0;'>🔍 Discover Available Food Donations</h2>
@@ -547,10 +540,24 @@ with tab1:
         Our advanced search algorithms make discovering food donations intuitive and efficient.</p>
         </div>
     """, unsafe_allow_html=True)
+
+    st.markdown("### 🔎 Search")
+    search_text = st.text_input(
+        "Search food, city or provider",
+        placeholder="e.g. rice near Kellytown, or a provider name or street",
+    )
+    if search_text.strip():
+        results = search_listings(search_text)
+        if results is None or results.empty:
+            st.info("No listings match your search.")
+        else:
+            st.caption(f"Top {len(results)} matches, best first; [brackets] mark the matched words.")
+            st.dataframe(results, use_container_width=True, hide_index=True)
+        st.divider()
     
-    cities = run_query("SELECT DISTINCT location FROM food_listings ORDER BY location")["location"].dropna().tolist()
-    providers = run_query("SELECT provider_id, name FROM providers ORDER BY name")
-    provider_map = dict(zip(providers["name"], providers["provider_id"]))
+    dims = dimensions.refresh()
+    cities = dims.values("location")
+    provider_map = dict(zip(dims.values("provider"), dims.ids("provider")))
     provider_names = list(provider_map.keys())
 
     st.markdown("### 🎯 Smart Filters")
@@ -560,37 +567,53 @@ with tab1:
     with c2:
         provider_name = st.selectbox("🏢 Provider", ["All"] + provider_names)
     with c3:
-        food_type = st.selectbox("🍽️ Food Type", ["All"] + sorted(run_query("SELECT DISTINCT food_type FROM food_listings")["food_type"].dropna().tolist()))
+        food_type = st.selectbox("🍽️ Food Type", ["All"] + dims.values("food_type"))
     with c4:
-        meal_type = st.selectbox("⏰ Meal Type", ["All"] + sorted(run_query("SELECT DISTINCT meal_type FROM food_listings")["meal_type"].dropna().tolist()))
-
-    base_q = "SELECT f.*, p.name as provider_name, p.contact as provider_contact FROM food_listings f LEFT JOIN providers p ON p.provider_id=f.provider_id"
-    clauses = []
-    params = []
-    if city != "All":
-        clauses.append("f.location = ?")
-        params.append(city)
-    if provider_name != "All":
-        clauses.append("f.provider_id = ?")
-        params.append(provider_map[provider_name])
-    if food_type != "All":
-        clauses.append("f.food_type = ?")
-        params.append(food_type)
-    if meal_type != "All":
-        clauses.append("f.meal_type = ?")
-        params.append(meal_type)
-    if clauses:
-        base_q += " WHERE " + " AND ".join(clauses)
+        meal_type = st.selectbox("⏰ Meal Type", ["All"] + dims.values("meal_type"))
 
-    df = run_query(base_q, params)
+    filters = {
+        "location": city if city != "All" else None,
+        "provider_id": int(provider_map[provider_name]) if provider_name != "All" else None,
+        "food_type": food_type if food_type != "All" else None,
+        "meal_type": meal_type if meal_type != "All" else None,
+    }
+    total = count_listings(filters)
     
     st.markdown("### 📋 Results")
-    if not df.empty:
-        st.markdown(f"<div class='metric-card'><h3 style='margin: 0; color: white;'>{len(df)}</h3><p style='margin: 0.5rem 0 0 0; color: rgba(255,255,255,0.8);'>Available Listings</p></div>", unsafe_allow_html=True)
-    
-    st.dataframe(df, use_container_width=True)
+    if total:
+        st.markdown(f"<div class='metric-card'><h3 style='margin: 0; color: white;'>{total}</h3><p style='margin: 0.5rem 0 0 0; color: rgba(255,255,255,0.8);'>Available Listings</p></div>", unsafe_allow_html=True)
+
+    o1, o2, o3, o4 = st.columns([4, 2, 1, 1])
+    with o1:
+        shown_columns = st.multiselect("🧾 Columns", list(LISTING_COLUMNS), default=list(LISTING_COLUMNS))
+    with o2:
+        sort_by = st.selectbox("↕️ Sort by", list(LISTING_SORTS))
+    with o3:
+        descending = st.toggle("Descending")
+    with o4:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+
+    # Stack of cursors for the pages visited so far; restart on any change
+    page_key = repr((filters, sort_by, descending, page_size))
+    if st.session_state.get("listings_page_key") != page_key:
+        st.session_state["listings_page_key"] = page_key
+        st.session_state["listings_cursors"] = [None]
+    cursors = st.session_state["listings_cursors"]
+
+    df, next_cursor = listings_page(filters, shown_columns or ["food_id"], sort_by, descending, cursors[-1], page_size)
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    n1, n2, n3 = st.columns([1, 4, 1])
+    with n1:
+        st.button("⬅️ Previous", disabled=len(cursors) == 1, on_click=cursors.pop, use_container_width=True)
+    with n2:
+        st.caption(f"Page {len(cursors)} of {max(1, -(-total // page_size))}")
+    with n3:
+        st.button("Next ➡️", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,), use_container_width=True)
 
-with tab2:
+RECENT_CLAIMS = 200
+
+def crud_operations():
     st.markdown("""
         <div class='glass-card'>
         <h2 style='background: linear-gradient(135deg, #10b981 0%, #3b82f6 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; margin-top: 0;'>📝 Smart Data Management</h2>
@@ -604,13 +627,13 @@ with tab2:
     with crud_tabs[0]:
         st.markdown("### ✨ Create New Food Listing")
         
-        # Get existing values from database for dropdowns
-        existing_foods = run_query("SELECT DISTINCT food_name FROM food_listings")["food_name"].dropna().tolist()
-        existing_locations = run_query("SELECT DISTINCT location FROM food_listings")["location"].dropna().tolist()
-        existing_providers = run_query("SELECT DISTINCT provider_id, name FROM providers ORDER BY name")
-        existing_provider_types = run_query("SELECT DISTINCT provider_type FROM food_listings")["provider_type"].dropna().tolist()
-        existing_food_types = run_query("SELECT DISTINCT food_type FROM food_listings")["food_type"].dropna().tolist()
-        existing_meal_types = run_query("SELECT DISTINCT meal_type FROM food_listings")["meal_type"].dropna().tolist()
+        # Existing values for the dropdowns
+        dims = dimensions.refresh()
+        existing_foods = dims.values("food_name")
+        existing_locations = dims.values("location")
+        existing_provider_types = dims.values("provider_type")
+        existing_food_types = dims.values("food_type")
+        existing_meal_types = dims.values("meal_type")
         
         with st.form("add_listing"):
             col = st.columns(2)
@@ -634,10 +657,10 @@ with tab2:
                 st.markdown("**🏢 Provider Details**")
                 provider_selection = st.selectbox(
                     "Provider",
-                    options=existing_providers["name"].tolist(),
+                    options=dims.values("provider"),
                     key="add_provider"
                 )
-                provider_id = existing_providers[existing_providers["name"] == provider_selection]["provider_id"].iloc[0] if provider_selection else 1
+                provider_id = dims.id_of("provider", provider_selection) if provider_selection else 1
                 
                 provider_type = st.selectbox(
                     "Provider Type",
@@ -658,18 +681,18 @@ with tab2:
                 ) or st.text_input("Or enter new meal type")
             submitted = st.form_submit_button("🚀 Create Listing")
             if submitted:
-                exec_query(
-                    "INSERT INTO food_listings (food_name, quantity, expiry_date, provider_id, provider_type, location, food_type, meal_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    [food_name, int(quantity), str(expiry_date), int(provider_id), provider_type, location.strip().title(), food_type_in, meal_type_in],
-                )
+                save_listing({
+                    "food_name": food_name, "quantity": int(quantity), "expiry_date": str(expiry_date),
+                    "provider_id": int(provider_id), "provider_type": provider_type,
+                    "location": location.strip().title(), "food_type": food_type_in, "meal_type": meal_type_in,
+                })
                 st.success("✅ Listing created successfully!")
 
     with crud_tabs[1]:
         st.markdown("### ✏️ Update Existing Listing")
-        listings = load_table("food_listings")
-        if not listings.empty:
-            listing_id = st.selectbox("Select Food ID", listings["food_id"].tolist())
-            row = listings[listings["food_id"] == listing_id].iloc[0]
+        listing_id = typeahead("🔎 Find listing", find_listings, key="update_listing_id")
+        if listing_id is not None:
+            row = run_query("SELECT * FROM food_listings_view WHERE food_id = ?", [listing_id]).iloc[0]
             with st.form("update_listing"):
                 col = st.columns(2)
                 with col[0]:
@@ -686,10 +709,11 @@ with tab2:
                     meal_type_in = st.text_input("Meal Type", value=row.get("meal_type",""))
                 submitted = st.form_submit_button("💫 Update Listing")
                 if submitted:
-                    exec_query(
-                        "UPDATE food_listings SET food_name=?, quantity=?, expiry_date=?, provider_id=?, provider_type=?, location=?, food_type=?, meal_type=? WHERE food_id=?",
-                        [food_name, int(quantity), str(expiry_date), int(provider_id), provider_type, location.strip().title(), food_type_in, meal_type_in, int(listing_id)],
-                    )
+                    save_listing({
+                        "food_name": food_name, "quantity": int(quantity), "expiry_date": str(expiry_date),
+                        "provider_id": int(provider_id), "provider_type": provider_type,
+                        "location": location.strip().title(), "food_type": food_type_in, "meal_type": meal_type_in,
+                    }, int(listing_id))
                     st.success("✅ Listing updated successfully!")
 
     with crud_tabs[2]:
@@ -699,10 +723,9 @@ with tab2:
             <strong>⚠️ Warning:</strong> This action cannot be undone. Please double-check before deleting.
             </div>
         """, unsafe_allow_html=True)
-        listings = load_table("food_listings")
-        if not listings.empty:
-            listing_id = st.selectbox("Select Food ID to Delete", listings["food_id"].tolist(), key="delete_select")
-            selected_row = listings[listings["food_id"] == listing_id].iloc[0]
+        listing_id = typeahead("🔎 Find listing to delete", find_listings, key="delete_listing_id")
+        if listing_id is not None:
+            selected_row = run_query("SELECT food_name, quantity FROM food_listings WHERE food_id = ?", [listing_id]).iloc[0]
             st.markdown(f"**Preview:** {selected_row['food_name']} - Quantity: {selected_row['quantity']}")
             if st.button("🗑️ Confirm Delete", type="secondary"):
                 exec_query("DELETE FROM food_listings WHERE food_id=?", [int(listing_id)])
@@ -710,28 +733,15 @@ with tab2:
 
     with crud_tabs[3]:
         st.markdown("### 🎯 Advanced Claims Management")
-        claims = load_table("claims")
-        
-        # Get related data for dropdowns
-        food_listings = run_query("""
-            SELECT f.food_id, f.food_name, p.name as provider_name 
-            FROM food_listings f 
-            JOIN providers p ON f.provider_id = p.provider_id
-            WHERE f.food_id NOT IN (SELECT food_id FROM claims WHERE status != 'Cancelled')
-        """)
-        receivers = run_query("SELECT receiver_id, name FROM receivers ORDER BY name")
-        existing_claims = run_query("""
-            SELECT c.claim_id, f.food_name, r.name as receiver_name, c.status
-            FROM claims c
-            JOIN food_listings f ON c.food_id = f.food_id
-            JOIN receivers r ON c.receiver_id = r.receiver_id
-        """)
+        status_counts = run_query(
+            "SELECT s.status, r.claims_count FROM rollup_claim_status r "
+            "JOIN claim_statuses s ON s.status_code = r.status_code ORDER BY r.claims_count DESC"
+        )
         
-        if not claims.empty:
+        if not status_counts.empty:
             st.markdown("### 📊 Current Claims Overview")
-            status_counts = claims['status'].value_counts()
             metrics_cols = st.columns(len(status_counts))
-            for i, (status, count) in enumerate(status_counts.items()):
+            for i, (status, count) in enumerate(zip(status_counts["status"], status_counts["claims_count"])):
                 with metrics_cols[i]:
                     status_color = {"Pending": "#f59e0b", "Completed": "#10b981", "Cancelled": "#ef4444"}.get(status, "#6b7280")
                     st.markdown(f"""
@@ -741,62 +751,65 @@ with tab2:
                         </div>
                     """, unsafe_allow_html=True)
         
-        st.dataframe(claims, use_container_width=True)
+        st.caption(f"Latest {RECENT_CLAIMS} claims")
+        st.dataframe(
+            run_query(f"SELECT * FROM {claim_status.VIEW} ORDER BY claim_id DESC LIMIT ?", [RECENT_CLAIMS]),
+            use_container_width=True,
+        )
         st.divider()
         
         st.markdown("### ✨ Create or Update Claim")
+        # The pickers sit outside the form so their matches update as the user types
+        claim_id = typeahead("🔄 Existing claim to update (optional)", find_claims,
+                             key="claim_id", allow_none=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**🍽️ Food Selection**")
+            food_id = typeahead("Available food items", find_listings, key="claim_food_id", available_only=True)
+        with col2:
+            st.markdown("**👥 Receiver Selection**")
+            receiver_id = typeahead("Receiver", find_receivers, key="claim_receiver_id")
+
         with st.form("manage_claim"):
-            if not existing_claims.empty:
-                claim_options = [f"#{row['claim_id']}: {row['food_name']} → {row['receiver_name']} [{row['status']}]" 
-                               for _, row in existing_claims.iterrows()]
-                claim_selection = st.selectbox(
-                    "🔄 Select Existing Claim to Update (optional)",
-                    options=[""] + claim_options
-                )
-                claim_id = claim_selection.split(":")[0].replace("#", "") if claim_selection else ""
-            else:
-                claim_id = ""
-            
             col1, col2 = st.columns(2)
             with col1:
-                st.markdown("**🍽️ Food Selection**")
-                food_options = [f"{row['food_id']}: {row['food_name']} (by {row['provider_name']})" 
-                              for _, row in food_listings.iterrows()]
-                food_selection = st.selectbox(
-                    "Available Food Items",
-                    options=food_options if food_options else ["No available food items"]
-                )
-                food_id = int(food_selection.split(":")[0]) if food_options else 1
-                
                 status = st.selectbox(
                     "📊 Status",
-                    options=["Pending", "Completed", "Cancelled"],
+                    options=list(claim_status.STATUSES.values()),
                     format_func=lambda x: f"🟡 {x}" if x == "Pending" else (f"🟢 {x}" if x == "Completed" else f"🔴 {x}")
                 )
             
             with col2:
-                st.markdown("**👥 Receiver Selection**")
-                receiver_selection = st.selectbox(
-                    "Choose Receiver",
-                    options=[f"{row['receiver_id']}: {row['name']}" for _, row in receivers.iterrows()]
-                )
-                receiver_id = int(receiver_selection.split(":")[0])
-                
                 current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 ts = st.text_input("⏰ Timestamp", value=current_time)
             
             submitted = st.form_submit_button("🎯 Process Claim")
-            if submitted:
-                if claim_id.strip():
-                    exec_query("UPDATE claims SET food_id=?, receiver_id=?, status=?, timestamp=? WHERE claim_id=?",
-                               [int(food_id), int(receiver_id), status, ts, int(claim_id)])
-                    st.success("🔄 Claim updated successfully!")
+            if submitted and (food_id is None or receiver_id is None):
+                st.error("Pick an available food item and a receiver first.")
+            elif submitted:
+                # Availability is re-checked inside the write transaction, so a
+                # listing claimed by someone else since this page loaded is refused
+                if claim_id is not None:
+                    result = reservations.update_claim(int(claim_id), int(food_id), int(receiver_id), status, ts)
+                else:
+                    result = reservations.reserve_claim(int(food_id), int(receiver_id), status, ts)
+                if result["outcome"] == reservations.RESERVED:
+                    st.success(f"✨ {result['message']}")
+                elif result["outcome"] == reservations.UPDATED:
+                    st.success(f"🔄 {result['message']}")
+                elif result["outcome"] == reservations.CONFLICT:
+                    st.warning(f"⚠️ {result['message']} Pick another food item.")
                 else:
-                    exec_query("INSERT INTO claims (food_id, receiver_id, status, timestamp) VALUES (?, ?, ?, ?)",
-                               [int(food_id), int(receiver_id), status, ts])
-                    st.success("✨ New claim created successfully!")
+                    st.error(result["message"])
+
+def snapshot_caption():
+    current = analytics.current_snapshot()
+    if current is not None:
+        st.caption(f"Claims per listing is read from the analytics snapshot taken at "
+                   f"{current['exported_at']}; changes since then are not included yet.")
+
 
-with tab3:
+def sql_queries():
     st.markdown("""
         <div class='glass-card'>
         <h2 style='background: linear-gradient(135deg, #8b5cf6 0%, #ec4899 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; margin-top: 0;'>📊 Advanced SQL Analytics</h2>
@@ -804,8 +817,9 @@ with tab3:
         Discover hidden patterns, trends, and actionable intelligence from your food management ecosystem.</p>
         </div>
     """, unsafe_allow_html=True)
+    snapshot_caption()
 
-    def show_sql(title, sql, params=None, description=""):
+    def show_sql(title, sql, params=None, description="", run=None):
         st.markdown(f"""
             <div class='chart-container'>
             <h3 style='margin-top: 0; color: white; display: flex; align-items: center; gap: 0.5rem;'>
@@ -818,7 +832,7 @@ with tab3:
         with st.markdown("###View SQL Query"):
             st.code(sql, language="sql")
         
-        result_df = run_query(sql, params)
+        result_df = run() if run else run_query(sql, params)
         if not result_df.empty:
             st.dataframe(result_df, use_container_width=True)
         else:
@@ -827,19 +841,19 @@ with tab3:
 
     show_sql(
         "🏙️ Geographic Provider Distribution", 
-        "SELECT city, COUNT(*) AS providers_count FROM providers GROUP BY city ORDER BY providers_count DESC;",
+        "SELECT city, providers_count FROM rollup_provider_cities ORDER BY providers_count DESC;",
         description="Analyze the concentration of food providers across different cities to identify hotspots and gaps in coverage."
     )
     
     show_sql(
         "👥 Receiver Network Analysis", 
-        "SELECT city, COUNT(*) AS receivers_count FROM receivers GROUP BY city ORDER BY receivers_count DESC;",
+        "SELECT city, receivers_count FROM rollup_receiver_cities ORDER BY receivers_count DESC;",
         description="Understand receiver distribution to optimize resource allocation and identify underserved areas."
     )
     
     show_sql(
         "🏢 Top Provider Categories", 
-        "SELECT provider_type, SUM(quantity) AS total_quantity FROM food_listings GROUP BY provider_type ORDER BY total_quantity DESC;",
+        "SELECT value AS provider_type, total_quantity FROM rollup_listings WHERE dimension='provider_type' ORDER BY total_quantity DESC;",
         description="Identify which types of providers contribute the most food donations by volume."
     )
 
@@ -847,72 +861,75 @@ with tab3:
     st.markdown("### 🎯 Interactive City Analysis")
     city_for_contacts = st.selectbox(
         "🏙️ Select city for detailed provider analysis", 
-        ["(Select a city)"] + sorted(run_query("SELECT DISTINCT city FROM providers")["city"].dropna().tolist()),
+        ["(Select a city)"] + dimensions.refresh().values("provider_city"),
         key="city_selector"
     )
     if city_for_contacts != "(Select a city)":
         show_sql(
             f"📞 Provider Network in {city_for_contacts}", 
-            "SELECT name, type, address, city, contact FROM providers WHERE city = ? ORDER BY name;", 
+            f"SELECT p.name, {lookups.name_of('providers', 'type', 'p')} AS type, p.address, "
+            f"{lookups.name_of('providers', 'city', 'p')} AS city, p.contact "
+            f"FROM providers p WHERE p.city_id = {lookups.id_of('providers', 'city')} ORDER BY p.name;", 
             [city_for_contacts],
             f"Complete directory of food providers operating in {city_for_contacts} with contact information."
         )
 
     show_sql(
         "🏆 Most Active Receivers", 
-        "SELECT r.receiver_id, r.name, COUNT(*) AS claims_count FROM claims c JOIN receivers r ON r.receiver_id=c.receiver_id GROUP BY r.receiver_id, r.name ORDER BY claims_count DESC;",
+        "SELECT r.receiver_id, r.name, s.claims_count FROM rollup_receivers s JOIN receivers r ON r.receiver_id=s.receiver_id ORDER BY s.claims_count DESC;",
         description="Identify the most engaged receivers in the platform based on claim frequency."
     )
     
     show_sql(
         "📊 Total Food Impact", 
-        "SELECT SUM(quantity) AS total_quantity_available FROM food_listings;",
+        "SELECT SUM(total_quantity) AS total_quantity_available FROM rollup_listings WHERE dimension='location';",
         description="Measure the total quantity of food made available through the platform."
     )
     
     show_sql(
         "🌆 City Ranking by Activity", 
-        "SELECT location AS city, COUNT(*) AS listings_count FROM food_listings GROUP BY location ORDER BY listings_count DESC;",
+        "SELECT value AS city, listings_count FROM rollup_listings WHERE dimension='location' ORDER BY listings_count DESC;",
         description="Rank cities by the number of food listings to identify the most active regions."
     )
     
     show_sql(
         "🍽️ Popular Food Categories", 
-        "SELECT food_type, COUNT(*) AS appearances FROM food_listings GROUP BY food_type ORDER BY appearances DESC;",
+        "SELECT value AS food_type, listings_count AS appearances FROM rollup_listings WHERE dimension='food_type' ORDER BY appearances DESC;",
         description="Discover which types of food are most commonly donated through the platform."
     )
     
     show_sql(
         "🎯 Claim Success Analysis", 
-        "SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claim_count FROM food_listings f LEFT JOIN claims c ON c.food_id=f.food_id GROUP BY f.food_id, f.food_name ORDER BY claim_count DESC;",
-        description="Analyze which food items generate the most claims, indicating high demand patterns."
+        analytics.CLAIMS_PER_LISTING_SQL + ";",
+        description="Analyze which food items generate the most claims, indicating high demand patterns.",
+        run=analytics.claims_per_listing,
     )
     
     show_sql(
         "🏅 Provider Success Rates", 
-        "SELECT p.provider_id, p.name, COUNT(*) AS successful_claims FROM claims c JOIN food_listings f ON f.food_id=c.food_id JOIN providers p ON p.provider_id=f.provider_id WHERE LOWER(c.status)='completed' GROUP BY p.provider_id, p.name ORDER BY successful_claims DESC;",
+        "SELECT p.provider_id, p.name, s.claims_completed AS successful_claims FROM rollup_providers s JOIN providers p ON p.provider_id=s.provider_id WHERE s.claims_completed > 0 ORDER BY successful_claims DESC;",
         description="Identify providers with the highest rate of successful food donations."
     )
     
     show_sql(
         "📈 Claim Status Distribution", 
-        "WITH total AS (SELECT COUNT(*) AS n FROM claims) SELECT status, COUNT(*) AS cnt, ROUND(100.0 * COUNT(*) / (SELECT n FROM total),2) AS pct FROM claims GROUP BY status ORDER BY cnt DESC;",
+        "SELECT s.status, r.claims_count AS cnt, ROUND(100.0 * r.claims_count / (SELECT SUM(claims_count) FROM rollup_claim_status),2) AS pct FROM rollup_claim_status r JOIN claim_statuses s ON s.status_code = r.status_code ORDER BY cnt DESC;",
         description="Analyze the distribution of claim statuses to understand system efficiency."
     )
     
     show_sql(
         "⚡ Urgent Items (Expiring Soon)", 
-        "SELECT food_id, food_name, quantity, expiry_date, location FROM food_listings WHERE DATE(expiry_date) <= DATE('now', '+2 days') ORDER BY DATE(expiry_date) ASC;",
+        "SELECT food_id, food_name, quantity, expiry_date, location FROM food_listings_view WHERE expiry_date <= DATE('now', '+2 days') ORDER BY expiry_date ASC;",
         description="Critical alert system for items that need immediate attention due to approaching expiry dates."
     )
     
     show_sql(
         "📋 Unclaimed Opportunities", 
-        "SELECT f.food_id, f.food_name, f.quantity, f.location FROM food_listings f LEFT JOIN claims c ON c.food_id=f.food_id WHERE c.claim_id IS NULL;",
+        f"SELECT f.food_id, f.food_name, f.quantity, f.location FROM food_listings_view f WHERE {availability.is_open('f')};",
         description="Identify available food items that haven't been claimed yet, representing immediate opportunities."
     )
 
-with tab4:
+def data_analysis():
     st.markdown("""
         <div class='glass-card'>
         <h2 style='background: linear-gradient(135deg, #f59e0b 0%, #ec4899 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; margin-top: 0;'>🤖 AI-Powered Insights & Predictions</h2>
@@ -921,9 +938,12 @@ with tab4:
         </div>
     """, unsafe_allow_html=True)
 
-    fl = load_table("food_listings")
-    if not fl.empty:
+    has_listings = count_listings({}) > 0
+    dims = dimensions.refresh()
+    if has_listings:
         st.markdown("### 📊 Visual Data Exploration")
+        # One row per group from the rollups, not every listing (see chart_data.py)
+        series = {dim: listing_counts(dim) for dim in ("location", "food_type", "meal_type")}
         
         col1, col2 = st.columns(2)
         with col1:
@@ -933,7 +953,7 @@ with tab4:
                 <p style='color: rgba(255,255,255,0.7); font-size: 0.9rem;'>Food listings across different cities</p>
                 </div>
             """, unsafe_allow_html=True)
-            plot1 = alt.Chart(fl.dropna(subset=["location"])).mark_bar(
+            plot1 = alt.Chart(series["location"]["data"]).mark_bar(
                 color=alt.Gradient(
                     gradient='linear',
                     stops=[alt.GradientStop(color='#667eea', offset=0),
@@ -941,9 +961,9 @@ with tab4:
                 ),
                 cornerRadius=8
             ).encode(
-                x=alt.X("location:N", sort="-y", title="City"),
-                y=alt.Y("count():Q", title="Number of Listings"),
-                tooltip=["location", "count()"]
+                x=alt.X("location:N", sort=None, title="City"),
+                y=alt.Y("listings_count:Q", title="Number of Listings"),
+                tooltip=["location", "listings_count"]
             ).properties(height=300)
             st.altair_chart(plot1, use_container_width=True)
 
@@ -954,7 +974,7 @@ with tab4:
                 <p style='color: rgba(255,255,255,0.7); font-size: 0.9rem;'>Distribution of food types</p>
                 </div>
             """, unsafe_allow_html=True)
-            plot2 = alt.Chart(fl.dropna(subset=["food_type"])).mark_bar(
+            plot2 = alt.Chart(series["food_type"]["data"]).mark_bar(
                 color=alt.Gradient(
                     gradient='linear',
                     stops=[alt.GradientStop(color='#10b981', offset=0),
@@ -962,9 +982,9 @@ with tab4:
                 ),
                 cornerRadius=8
             ).encode(
-                x=alt.X("food_type:N", sort="-y", title="Food Type"),
-                y=alt.Y("count():Q", title="Count"),
-                tooltip=["food_type", "count()"]
+                x=alt.X("food_type:N", sort=None, title="Food Type"),
+                y=alt.Y("listings_count:Q", title="Count"),
+                tooltip=["food_type", "listings_count"]
             ).properties(height=300)
             st.altair_chart(plot2, use_container_width=True)
 
@@ -974,7 +994,7 @@ with tab4:
             <p style='color: rgba(255,255,255,0.7); font-size: 0.9rem;'>Analysis of meal type distribution patterns</p>
             </div>
         """, unsafe_allow_html=True)
-        plot3 = alt.Chart(fl.dropna(subset=["meal_type"])).mark_bar(
+        plot3 = alt.Chart(series["meal_type"]["data"]).mark_bar(
             color=alt.Gradient(
                 gradient='linear',
                 stops=[alt.GradientStop(color='#8b5cf6', offset=0),
@@ -982,12 +1002,64 @@ with tab4:
             ),
             cornerRadius=8
         ).encode(
-            x=alt.X("meal_type:N", sort="-y", title="Meal Type"),
-            y=alt.Y("count():Q", title="Number of Listings"),
-            tooltip=["meal_type", "count()"]
+            x=alt.X("meal_type:N", sort=None, title="Meal Type"),
+            y=alt.Y("listings_count:Q", title="Number of Listings"),
+            tooltip=["meal_type", "listings_count"]
         ).properties(height=300)
         st.altair_chart(plot3, use_container_width=True)
 
+        sent = sum(s["payload_bytes"] for s in series.values())
+        full = sum(s["full_bytes"] for s in series.values())
+        bucketed = series["location"]["other_groups"]
+        st.caption(f"Chart data: {sent / 1024:.1f} KB of grouped counts instead of ~{full / 1024:,.0f} KB "
+                   f"of listing rows ({100 * (1 - sent / full):.1f}% less)"
+                   + (f"; {bucketed} smaller cities are grouped as \"{OTHER}\"." if bucketed else "."))
+
+        st.markdown("### 📈 Trends")
+        first, last = trend_extent()
+        if last is None:
+            st.caption("No timestamped listings or claims yet.")
+        else:
+            # Ranges end at the latest activity; long ones are read at a coarser grain
+            ranges = {"Last 48 hours": 2 * 86400, "Last 7 days": 7 * 86400, "Last 30 days": 30 * 86400,
+                      "Last 90 days": 90 * 86400, "Last year": 365 * 86400, "All time": last - first + 3600}
+            trend_cols = st.columns(2)
+            span = trend_cols[0].selectbox("Range", list(ranges), index=2, key="trend_range")
+            city = trend_cols[1].selectbox("City", ["All cities"] + dims.values("location"), key="trend_city")
+            grain, trend_df = trend(last + 3600 - ranges[span], last, TREND_ALL if city == "All cities" else city)
+
+            claims_by_status = trend_df.melt(
+                id_vars="period", value_vars=["claims_pending", "claims_completed", "claims_cancelled"],
+                var_name="status", value_name="claims")
+            claims_by_status["status"] = claims_by_status["status"].str.removeprefix("claims_").str.title()
+            plot4 = alt.Chart(claims_by_status).mark_area(opacity=0.8).encode(
+                x=alt.X("period:T", title=None),
+                y=alt.Y("claims:Q", stack=True, title="Claims"),
+                color=alt.Color("status:N", scale=alt.Scale(domain=["Pending", "Completed", "Cancelled"],
+                                                             range=["#f59e0b", "#10b981", "#ef4444"])),
+                tooltip=["period:T", "status", "claims"]
+            ).properties(height=260)
+            st.altair_chart(plot4, use_container_width=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                plot5 = alt.Chart(trend_df).mark_line(color="#667eea", point=len(trend_df) <= 60).encode(
+                    x=alt.X("period:T", title=None),
+                    y=alt.Y("listings_created:Q", title="Listings created"),
+                    tooltip=["period:T", "listings_created"]
+                ).properties(height=220)
+                st.altair_chart(plot5, use_container_width=True)
+            with col2:
+                plot6 = alt.Chart(trend_df).mark_bar(color="#8b5cf6").encode(
+                    x=alt.X("period:T", title=None),
+                    y=alt.Y("quantity_claimed:Q", title="Quantity claimed (completed)"),
+                    tooltip=["period:T", "quantity_claimed"]
+                ).properties(height=220)
+                st.altair_chart(plot6, use_container_width=True)
+            st.caption(f"{len(trend_df)} {dict(hour='hourly', day='daily', week='weekly')[grain]} buckets (UTC) up to "
+                       f"{trend_df['period'].iloc[-1]:%Y-%m-%d %H:%M}, the latest activity. "
+                       "Imported listings are dated by their first claim.")
+
     # ---------- Advanced ML Prediction System ----------
     st.markdown("""
         <div class='glass-card'>
@@ -998,28 +1070,18 @@ with tab4:
         </div>
     """, unsafe_allow_html=True)
 
-    claims = load_table("claims")
-    if not fl.empty and not claims.empty:
-        data = claims.merge(fl, how="left", on="food_id", suffixes=("_claim", ""))
-        data["status_target"] = (data["status"].str.lower() == "completed").astype(int)
-
-        # Select features for ML model
-        features = ["quantity", "provider_type", "location", "food_type", "meal_type"]
-        X = data[features].copy()
-        y = data["status_target"].copy()
-
-        # Handle missing numeric values
-        X["quantity"] = X["quantity"].fillna(0)
-
-        categorical = ["provider_type", "location", "food_type", "meal_type"]
-        pre = ColumnTransformer([("cat", OneHotEncoder(handle_unknown="ignore"), categorical)], remainder="passthrough")
-        model = Pipeline([("pre", pre), ("clf", LogisticRegression(max_iter=200))])
-
+    if has_listings:
         try:
-            if y.nunique() > 1:  # Ensure we have both classes
-                X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-                model.fit(X_train, y_train)
-                acc = model.score(X_test, y_test)
+            # Trained model comes from the on-disk registry; it is only
+            # retrained (in the background) once enough new claims arrive.
+            try:
+                entry = registry.current()
+            except InsufficientData:
+                entry = None
+
+            if entry is not None:
+                model = entry["model"]
+                acc = entry["metrics"]["accuracy"]
                 
                 # Model performance metrics
                 col1, col2, col3 = st.columns(3)
@@ -1033,14 +1095,14 @@ with tab4:
                 with col2:
                     st.markdown(f"""
                         <div class='metric-card' style='background: linear-gradient(135deg, rgba(139, 92, 246, 0.2) 0%, rgba(236, 72, 153, 0.2) 100%);'>
-                        <h3 style='margin: 0; color: #8b5cf6;'>{len(X_train)}</h3>
+                        <h3 style='margin: 0; color: #8b5cf6;'>{entry['metrics']['train_samples']}</h3>
                         <p style='margin: 0.5rem 0 0 0; color: rgba(255,255,255,0.8);'>Training Samples</p>
                         </div>
                     """, unsafe_allow_html=True)
                 with col3:
                     st.markdown(f"""
                         <div class='metric-card' style='background: linear-gradient(135deg, rgba(245, 158, 11, 0.2) 0%, rgba(239, 68, 68, 0.2) 100%);'>
-                        <h3 style='margin: 0; color: #f59e0b;'>{len(features)}</h3>
+                        <h3 style='margin: 0; color: #f59e0b;'>{entry['metrics']['n_features']}</h3>
                         <p style='margin: 0.5rem 0 0 0; color: rgba(255,255,255,0.8);'>Features Used</p>
                         </div>
                     """, unsafe_allow_html=True)
@@ -1053,16 +1115,16 @@ with tab4:
                     with pred_cols[0]:
                         st.markdown("**📊 Food Characteristics**")
                         qty_in = st.number_input("Quantity", 1, 100000, 50, help="Amount of food available")
-                        food_type_in = st.selectbox("Food Type", options=sorted(fl["food_type"].dropna().unique().tolist()), help="Category of food being donated")
+                        food_type_in = st.selectbox("Food Type", options=dims.values("food_type"), help="Category of food being donated")
                     
                     with pred_cols[1]:
                         st.markdown("**🏢 Provider Information**")
-                        provider_type_in = st.selectbox("Provider Type", options=sorted(fl["provider_type"].dropna().unique().tolist()), help="Type of organization providing food")
-                        location_in = st.selectbox("Location", options=sorted(fl["location"].dropna().unique().tolist()), help="City where food is available")
+                        provider_type_in = st.selectbox("Provider Type", options=dims.values("provider_type"), help="Type of organization providing food")
+                        location_in = st.selectbox("Location", options=dims.values("location"), help="City where food is available")
                     
                     with pred_cols[2]:
                         st.markdown("**⏰ Timing Details**")
-                        meal_type_in = st.selectbox("Meal Type", options=sorted(fl["meal_type"].dropna().unique().tolist()), help="Type of meal being offered")
+                        meal_type_in = st.selectbox("Meal Type", options=dims.values("meal_type"), help="Type of meal being offered")
                         st.markdown("**🎯 Prediction Confidence**")
                         st.caption("Model will calculate probability based on historical patterns")
                     
@@ -1120,6 +1182,21 @@ with tab4:
                             - **Food Type**: Fresh meals generally claim faster than packaged goods
                         """)
 
+                st.markdown("### ⚠️ Most At-Risk Listings")
+                st.markdown("Open listings ranked by predicted completion probability, lowest first. Click a column header to re-sort.")
+                risk_cols = st.columns([1, 3])
+                with risk_cols[0]:
+                    risk_limit = st.number_input("Listings to show", 10, 10000, 100, step=10)
+                    if st.button("🔄 Re-score open listings", use_container_width=True):
+                        summary = score_open_listings()
+                        st.success(f"✅ Scored {summary['scored']} listings in {summary['seconds']:.2f}s")
+                with risk_cols[1]:
+                    at_risk = at_risk_listings(risk_limit)
+                    if not at_risk.empty:
+                        st.dataframe(at_risk, use_container_width=True, hide_index=True)
+                    else:
+                        st.info("No scores yet. Re-score open listings or run `python score_listings.py`.")
+
             else:
                 st.warning("⚠️ Insufficient data diversity for ML prediction. Need both successful and unsuccessful claims for training.")
                 
@@ -1127,6 +1204,81 @@ with tab4:
             st.error(f"🔧 ML model temporarily unavailable. Technical details: {str(e)}")
             st.info("💡 **Tip**: Ensure your database has sufficient historical data with varied claim outcomes.")
 
+def diagnostics():
+    st.markdown("## 🩺 Query Diagnostics")
+    st.caption(f"Every run_query / exec_query call in this server process since {query_stats.dump()['since']}. "
+               f"Calls over {query_stats.slow_ms:.0f} ms are logged as slow (FOOD_SLOW_QUERY_MS).")
+
+    summary = pd.DataFrame(query_stats.summary())
+    if summary.empty:
+        st.info("No queries recorded yet. Use the other pages, then come back.")
+        return
+
+    calls, hits = int(summary["calls"].sum()), int(summary["cache_hits"].sum())
+    cols = st.columns(4)
+    cols[0].metric("Queries", f"{calls:,}")
+    cols[1].metric("Distinct statements", len(summary))
+    cols[2].metric("Cache hit rate", f"{100 * hits / calls:.0f}%")
+    cols[3].metric("Total query time", f"{summary['total_ms'].sum() / 1000:.2f} s")
+
+    st.markdown("### ⏱️ Statements by total time")
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    st.markdown("### ✍️ Write queue")
+    queue = writes.metrics()
+    cols = st.columns(4)
+    cols[0].metric("Queue depth", queue["queue_depth"])
+    cols[1].metric("Group commits", f"{queue['batches']:,}",
+                   help=f"{queue['requests']:,} writes, {queue['failed']} failed, "
+                        f"{queue['retried_batches']} batches retried while the database was busy")
+    cols[2].metric("Avg / max batch", f"{queue['avg_batch_size']} / {queue['max_batch_size']}")
+    cols[3].metric("p95 write latency", f"{queue['p95_request_ms']} ms",
+                   help=f"Queue wait plus commit; p95 commit alone {queue['p95_commit_ms']} ms")
+    if queue["batch_size_histogram"]:
+        st.bar_chart(pd.Series(queue["batch_size_histogram"], name="commits").rename_axis("batch size"))
+
+    st.markdown("### 🐢 Recent slow queries")
+    slow = pd.DataFrame(query_stats.slow_queries())
+    if slow.empty:
+        st.caption("None so far.")
+    else:
+        st.dataframe(slow, use_container_width=True, hide_index=True)
+
+    st.markdown("### 🔎 Query plan")
+    labels = dict(zip(summary["fingerprint"], summary["sql"]))
+    fp = st.selectbox("Statement", list(labels), format_func=lambda f: f"{f} · {labels[f][:120]}")
+    if st.button("EXPLAIN QUERY PLAN"):
+        sql, params = query_stats.last_call(fp)
+        try:
+            st.code("\n".join(explain(pool.reader(), sql, params)), language="text")
+        except Exception as e:
+            st.error(f"Could not explain this statement: {e}")
+
+    cols = st.columns(2)
+    cols[0].download_button("⬇️ Download JSON", json.dumps({**query_stats.dump(), "write_queue": writes.metrics()}, indent=2),
+                            file_name="query_stats.json", mime="application/json")
+    if cols[1].button("Reset statistics"):
+        query_stats.reset()
+        writes.reset_metrics()
+        st.rerun()
+
+
+# The Diagnostics page is hidden unless the session was opened with
+# ?diagnostics in the URL or the server runs with FOOD_DIAGNOSTICS=1.
+if "diagnostics" in st.query_params or os.environ.get("FOOD_DIAGNOSTICS") == "1":
+    st.session_state["show_diagnostics"] = True
+
+pages = [
+    st.Page(data_filtering, title="Data Filtering", icon="🔍", default=True),
+    st.Page(crud_operations, title="CRUD Operations", icon="📝"),
+    st.Page(sql_queries, title="SQL Queries", icon="📓"),
+    st.Page(data_analysis, title="Data Analysis", icon="📊"),
+]
+if st.session_state.get("show_diagnostics"):
+    pages.append(st.Page(diagnostics, title="Diagnostics", icon="🩺"))
+page = st.navigation(pages, position="top")
+page.run()
+
 # Premium Footer
 st.markdown("""
     <div class='footer-box'>
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Availability state of food listings.
+
+food_listings.availability is a small-integer code kept current by
+triggers on claims, in the same transaction as the claim write:
+
+- OPEN: no active (pending or completed) claim
+- RESERVED: a pending claim and no completed one
+- FULFILLED: a completed claim
+- EXPIRED: past its expiry date while open
+
+Expiry depends on the clock rather than on a write, so it is applied by
+expire() (`python availability.py --expire`, e.g. from a daily cron job)
+instead of by the triggers. An expired listing stays expired until a claim
+makes it reserved or fulfilled.
+
+Queries for open listings filter on the literal code
+(`f.availability = 1`) so SQLite can use the idx_food_open partial index;
+their cost follows the number of open listings, not the claim history.
+
+Usage:
+    python availability.py            # recompute every listing's state, then verify
+    python availability.py --expire   # mark open listings past their expiry date as expired
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import claim_status
+from query_cache import register_derived, bump_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+OPEN = 1
+RESERVED = 2
+FULFILLED = 3
+EXPIRED = 4
+
+STATES = {OPEN: "Open", RESERVED: "Reserved", FULFILLED: "Fulfilled", EXPIRED: "Expired"}
+
+LOOKUP_TABLE = "listing_states"
+TRIGGER_PREFIX = "trg_availability_"
+
+# Claim writes change food_listings rows through the triggers below
+register_derived("food_listings", ["claims"])
+
+
+def _column(alias: str) -> str:
+    return f"{alias}.availability" if alias else "availability"
+
+
+def is_open(alias: str = "") -> str:
+    return f"{_column(alias)} = {OPEN}"
+
+
+def state_of(food_id: str) -> str:
+    """State of listing `food_id` from its claims, inside an UPDATE of food_listings.
+
+    One probe of idx_claims_active_food: the largest `status_code = completed`
+    over the active claims is 1 (fulfilled), 0 (reserved) or NULL (none).
+    """
+    return (
+        f"CASE (SELECT MAX({claim_status.is_completed('c')}) FROM claims c "
+        f"WHERE c.food_id = {food_id} AND {claim_status.is_active('c')}) "
+        f"WHEN 1 THEN {FULFILLED} WHEN 0 THEN {RESERVED} "
+        f"ELSE CASE availability WHEN {EXPIRED} THEN {EXPIRED} ELSE {OPEN} END END"
+    )
+
+
+def _refresh(food_ids: str) -> list:
+    return [f"UPDATE food_listings SET availability = {state_of('food_listings.food_id')} "
+            f"WHERE food_id IN ({food_ids});"]
+
+
+TRIGGERS = {
+    ("claims", "INSERT"): _refresh("NEW.food_id"),
+    ("claims", "DELETE"): _refresh("OLD.food_id"),
+    ("claims", "UPDATE OF food_id, status_code"): _refresh("OLD.food_id, NEW.food_id"),
+}
+
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"{TRIGGER_PREFIX}{table}_{event.split()[0].lower()}"
+
+
+def create_lookup(conn: sqlite3.Connection):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {LOOKUP_TABLE} (
+        state_code INTEGER PRIMARY KEY,
+        state      TEXT NOT NULL UNIQUE
+    );
+    """)
+    conn.executemany(
+        f"INSERT INTO {LOOKUP_TABLE} (state_code, state) VALUES (?, ?) "
+        "ON CONFLICT(state_code) DO UPDATE SET state = excluded.state",
+        list(STATES.items()),
+    )
+
+
+def installed(conn: sqlite3.Connection) -> bool:
+    count = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", [TRIGGER_PREFIX + "%"]
+    ).fetchone()[0]
+    return count == len(TRIGGERS)
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recompute every listing's state and (re)install the triggers.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    for (table, event) in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, event)};")
+    conn.execute(f"UPDATE food_listings SET availability = {state_of('food_listings.food_id')};")
+    for (table, event), body in TRIGGERS.items():
+        conn.execute(
+            f"CREATE TRIGGER {_trigger_name(table, event)} AFTER {event} ON {table} "
+            f"BEGIN\n    " + "\n    ".join(body) + "\nEND;"
+        )
+    bump_versions(conn, ["food_listings"])
+
+
+def expire(conn: sqlite3.Connection, now_epoch: int = None) -> int:
+    """Mark open listings whose expiry has passed as expired; returns how many.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    now_epoch = int(time.time()) if now_epoch is None else now_epoch
+    changed = conn.execute(
+        f"UPDATE food_listings SET availability = {EXPIRED} WHERE {is_open()} AND expiry_epoch < ?", [now_epoch]
+    ).rowcount
+    if changed:
+        bump_versions(conn, ["food_listings"])
+    return changed
+
+
+def verify(conn: sqlite3.Connection) -> int:
+    """Number of listings whose stored state differs from their claims."""
+    return conn.execute(
+        f"SELECT COUNT(*) FROM food_listings WHERE availability IS NOT ({state_of('food_listings.food_id')})"
+    ).fetchone()[0]
+
+
+def counts(conn: sqlite3.Connection) -> dict:
+    rows = conn.execute("SELECT availability, COUNT(*) FROM food_listings GROUP BY availability").fetchall()
+    return {STATES.get(code, code): n for code, n in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild, verify or expire listing availability states.")
+    parser.add_argument("--expire", action="store_true", help="mark open listings past their expiry date as expired")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if args.expire:
+            changed = expire(conn)
+            conn.commit()
+            print(f"[OK] Marked {changed} open listings as expired")
+        else:
+            rebuild(conn)
+            conn.commit()
+            print(f"[OK] Recomputed availability and installed {len(TRIGGERS)} triggers")
+        mismatches = verify(conn)
+        print("[OK] " + ", ".join(f"{state}: {n}" for state, n in counts(conn).items()))
+    finally:
+        conn.close()
+    if mismatches:
+        print(f"[FAIL] {mismatches} listings have a state that does not match their claims")
+        sys.exit(1)
+    print("[DONE] Availability verified")
+
+
+if __name__ == "__main__":
+    main()
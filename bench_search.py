@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark the listings search index at scale.
+
+Builds a scratch database with the project schema, fills it with synthetic
+providers and listings drawn from the values in the bundled CSVs, builds
+the FTS5 index with search.rebuild and times search.SEARCH_SQL for a set
+of typical queries.
+
+Usage:
+    python bench_search.py [--listings 1000000] [--providers 20000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import lookups
+import search
+import setup_db
+
+QUERIES = [
+    "rice",
+    "rice new jess",
+    "chicken lake",
+    "gonzales",
+    "andreamouth",
+    "soup kellytown",
+    "zzzz",
+]
+
+
+def generate(conn: sqlite3.Connection, n_listings: int, n_providers: int, seed: int = 0):
+    rng = random.Random(seed)
+    providers = pd.read_csv("providers_data.csv")
+    listings = pd.read_csv("food_listings_data.csv")
+    names, addresses = providers["Name"].tolist(), providers["Address"].tolist()
+    foods = listings["Food_Name"].tolist()
+    # City and type columns are stored as lookup ids (see lookups.py)
+    types = list(lookups.ensure(conn, "provider_types", providers["Type"]).values())
+    cities = list(lookups.ensure(conn, "cities", providers["City"]).values())
+    locations = list(lookups.ensure(conn, "cities", listings["Location"]).values())
+    food_types = list(lookups.ensure(conn, "food_types", listings["Food_Type"]).values())
+    meal_types = list(lookups.ensure(conn, "meal_types", listings["Meal_Type"]).values())
+
+    conn.executemany(
+        "INSERT INTO providers (provider_id, name, type_id, address, city_id, contact) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, rng.choice(names), rng.choice(types), rng.choice(addresses), rng.choice(cities), "")
+         for i in range(1, n_providers + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO food_listings (food_id, food_name, quantity, expiry_date, provider_id, provider_type_id, "
+        "location_id, food_type_id, meal_type_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, rng.choice(foods), rng.randint(1, 50), "2025-03-20", rng.randint(1, n_providers),
+          rng.choice(types), rng.choice(locations), rng.choice(food_types), rng.choice(meal_types))
+         for i in range(1, n_listings + 1)),
+    )
+
+def time_query(conn: sqlite3.Connection, text: str, repeat: int) -> tuple:
+    params = [search.match_expression(text), 50]
+    rows = conn.execute(search.SEARCH_SQL, params).fetchall()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(search.SEARCH_SQL, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return len(rows), statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full-text listing search on synthetic data.")
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--providers", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        try:
+            setup_db.create_schema(conn)
+            start = time.perf_counter()
+            generate(conn, args.listings, args.providers)
+            conn.commit()
+            print(f"[OK] Generated {args.listings:,} listings in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            search.rebuild(conn)
+            conn.commit()
+            print(f"[OK] Built {search.FTS_TABLE} in {time.perf_counter() - start:.1f}s")
+
+            print(f"{'query':<20} {'rows':>5} {'median ms':>10} {'p95 ms':>8}")
+            for text in QUERIES:
+                rows, median, p95 = time_query(conn, text, args.repeat)
+                print(f"{text:<20} {rows:>5} {median:>10.2f} {p95:>8.2f}")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
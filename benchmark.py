@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for the database, queries.sql and the app's data paths.
+
+For each scale the harness writes synthetic CSVs with generate_data.py,
+loads them into a scratch database with setup_db.full_load, and then (in
+a child process with FOOD_DB_PATH pointing at that database) times:
+
+- every statement in queries.sql,
+- the Data Filtering tab: listing count, first page, a filtered and
+  sorted page, a deep keyset page and a full-text search,
+- the Manage Claims tab: status counts, latest claims and the pickers,
+- the Data Analysis chart series and trends, the dropdown vocabularies and model
+  training,
+- the analytics aggregation on SQLite and on a Parquet snapshot (with
+  the time to export it), when pyarrow is installed.
+
+App paths run with the query cache cleared, so they measure the
+database rather than the cache. Results are written as JSON and Markdown
+named after the current commit; pass an earlier JSON report as
+--baseline to add a change column to the Markdown.
+
+Usage:
+    python benchmark.py                               # 10k and 100k
+    python benchmark.py --scales 10k,100k,1m,10m --repeat 5
+    python benchmark.py --baseline benchmarks/benchmark-abc1234.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import generate_data
+import setup_db
+
+DEFAULT_SCALES = "10k,100k"
+OUT_DIR = "benchmarks"
+TRAINING_MAX_ROWS = 1_000_000  # sklearn fit above this takes minutes; use --train-all
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def timed(fn, repeat: int, before=None) -> dict:
+    """Median and min wall time of fn() in ms, and the size of its result."""
+    timings, result = [], None
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    rows = len(result) if hasattr(result, "__len__") else None
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3), "rows": rows}
+
+
+def run_worker(repeat: int, train: bool) -> dict:
+    """Time the queries against FOOD_DB_PATH; runs in the child process."""
+    import analytics
+    import chart_data
+    import db
+    import listings
+    import pickers
+    from check_query_plans import queries_from_sql_file
+    from claim_status import VIEW
+    from dimensions import DimensionCache
+
+    conn = db.pool.reader()
+    city = conn.execute("SELECT city FROM rollup_provider_cities ORDER BY providers_count DESC LIMIT 1").fetchone()[0]
+    location = conn.execute(
+        "SELECT value FROM rollup_listings WHERE dimension = 'location' ORDER BY listings_count DESC LIMIT 1"
+    ).fetchone()[0]
+    max_food = conn.execute("SELECT MAX(food_id) FROM food_listings").fetchone()[0]
+    first_hour, last_hour = chart_data.trend_extent()
+    results = {}
+
+    for label, sql in queries_from_sql_file():
+        params = [city] * sql.count("?")
+        name, n = label, 1
+        while name in results:  # several statements share a numbered comment
+            n += 1
+            name = f"{label} ({n})"
+        results[name] = timed(lambda: conn.execute(sql, params).fetchall(), repeat)
+
+    app_paths = {
+        "filter: count all listings": lambda: [listings.count_listings({})],
+        "filter: first page": lambda: listings.listings_page({})[0],
+        "filter: location + food type, by expiry": lambda: listings.listings_page(
+            {"location": location, "food_type": "Vegan"}, sort_by="expiry_date")[0],
+        "filter: deep page (keyset)": lambda: listings.listings_page({}, cursor=(None, max_food // 2))[0],
+        "search: rice": lambda: listings.search_listings("rice"),
+        # Same statements as the Manage Claims tab in app.py
+        "claims tab: status counts": lambda: db.run_query(
+            "SELECT s.status, r.claims_count FROM rollup_claim_status r "
+            "JOIN claim_statuses s ON s.status_code = r.status_code ORDER BY r.claims_count DESC"),
+        "claims tab: latest claims": lambda: db.run_query(
+            f"SELECT * FROM {VIEW} ORDER BY claim_id DESC LIMIT ?", [200]),
+        "claims tab: claim picker": lambda: pickers.find_claims(""),
+        "claims tab: receiver picker 'ma'": lambda: pickers.find_receivers("ma"),
+        "claims tab: available listing picker 'rice'": lambda: pickers.find_listings("rice", available_only=True),
+        "dropdowns: load all vocabularies": lambda: DimensionCache().refresh()._values,
+        "analysis tab: chart series": lambda: [chart_data.listing_counts(dim)
+                                               for dim in ("location", "food_type", "meal_type")],
+        "analysis tab: trend, last 30 days": lambda: chart_data.trend(last_hour - 30 * 86400, last_hour)[1],
+        "analysis tab: trend, all time": lambda: chart_data.trend(first_hour, last_hour)[1],
+    }
+    for name, fn in app_paths.items():
+        results[name] = timed(fn, repeat, before=db.cache.clear)
+
+    if analytics.snapshot is not None:  # pyarrow installed: compare the two analytics backends
+        results["analytics: export snapshot"] = timed(analytics.snapshot.export, 1)
+        for backend in ("sqlite", "parquet"):
+            analytics.BACKEND = backend
+            results[f"analytics ({backend}): claims per listing"] = timed(
+                analytics.claims_per_listing, repeat, before=db.cache.clear)
+
+    if train:
+        import model_registry
+        n_claims = conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+        results["model: train claim-success model"] = timed(
+            lambda: [model_registry.train("benchmark", n_claims)], 1, before=db.cache.clear)
+    return results
+
+
+def bench_scale(scale: str, work_dir: str, seed: int, repeat: int, train_all: bool) -> dict:
+    n_rows = generate_data.parse_rows(scale)
+    csv_dir = os.path.join(work_dir, scale)
+    db_path = os.path.join(csv_dir, "food.db")
+
+    start = time.perf_counter()
+    counts = generate_data.generate(csv_dir, n_rows, seed=seed)
+    generate_s = time.perf_counter() - start
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        start = time.perf_counter()
+        setup_db.full_load(conn, csv_dir)
+        load_s = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    results_path = os.path.join(csv_dir, "results.json")
+    train = train_all or n_rows <= TRAINING_MAX_ROWS
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", results_path, "--repeat", str(repeat)]
+    if train:
+        cmd.append("--train-all")
+    subprocess.run(cmd, check=True, env={**os.environ, "FOOD_DB_PATH": db_path,
+                                         "FOOD_SNAPSHOT_DIR": os.path.join(csv_dir, "snapshots")})
+    with open(results_path, encoding="utf-8") as f:
+        timings = json.load(f)
+
+    return {
+        "rows": counts,
+        "generate_s": round(generate_s, 2),
+        "load_s": round(load_s, 2),
+        "db_mb": round(os.path.getsize(db_path) / 2**20, 1),
+        "timings": timings,
+    }
+
+
+def to_markdown(report: dict, baseline: dict = None) -> str:
+    lines = [
+        f"# Benchmark {report['commit']}",
+        "",
+        f"{report['generated_at']} · SQLite {report['sqlite']} · Python {report['python']} · "
+        f"seed {report['seed']} · median of {report['repeat']} runs",
+    ]
+    if baseline:
+        lines.append(f"\nBaseline: {baseline['commit']} ({baseline['generated_at']})")
+    for scale, result in report["scales"].items():
+        base = (baseline or {}).get("scales", {}).get(scale, {}).get("timings", {})
+        rows = ", ".join(f"{table} {n:,}" for table, n in result["rows"].items())
+        lines += [
+            "", f"## {scale}", "",
+            f"{rows}. Generated in {result['generate_s']}s, loaded in {result['load_s']}s, "
+            f"database {result['db_mb']} MB.", "",
+            "| query | rows | median ms | min ms |" + (" baseline ms | change |" if baseline else ""),
+            "|---|---:|---:|---:|" + ("---:|---:|" if baseline else ""),
+        ]
+        for name, t in result["timings"].items():
+            line = f"| {name} | {t['rows'] if t['rows'] is not None else ''} | {t['median_ms']:.2f} | {t['min_ms']:.2f} |"
+            if baseline:
+                if name in base and base[name]["median_ms"]:
+                    change = (t["median_ms"] / base[name]["median_ms"] - 1) * 100
+                    line += f" {base[name]['median_ms']:.2f} | {change:+.0f}% |"
+                else:
+                    line += " | |"
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark queries and app data paths at several data scales.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="comma-separated row counts, e.g. 10k,100k,1m,10m (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query (default: %(default)s)")
+    parser.add_argument("--work-dir", help="where to keep generated CSVs and databases (default: a temp dir)")
+    parser.add_argument("--out", default=OUT_DIR, help="report directory (default: %(default)s)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--train-all", action="store_true",
+                        help=f"also train the model above {TRAINING_MAX_ROWS:,} rows")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, "w", encoding="utf-8") as f:
+            json.dump(run_worker(args.repeat, args.train_all), f)
+        return
+
+    report = {
+        "commit": git_commit(),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "sqlite": sqlite3.sqlite_version,
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = args.work_dir or tmp
+        for scale in args.scales.split(","):
+            print(f"[..] {scale}: generating and loading")
+            report["scales"][scale] = result = bench_scale(scale, work_dir, args.seed, args.repeat, args.train_all)
+            print(f"[OK] {scale}: loaded in {result['load_s']}s, {len(result['timings'])} queries timed")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    os.makedirs(args.out, exist_ok=True)
+    base = os.path.join(args.out, f"benchmark-{report['commit']}")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(base + ".md", "w", encoding="utf-8") as f:
+        f.write(to_markdown(report, baseline))
+    print(f"[DONE] Report written to {base}.json and {base}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Pre-aggregated data for the Data Analysis charts.
+
+The charts used to embed every food_listings row in their Vega-Lite spec
+and count them in the browser. They now get one row per group from the
+rollup_listings table, largest first. Axes with more groups than TOP_N
+(e.g. location) keep the TOP_N - 1 largest and fold the rest into an
+"Other" bar, and the number of bars is reduced further until the series
+fits the payload budget.
+
+The payload is measured as the JSON size of the rows embedded in the
+chart spec. CHART_BUDGET_BYTES and CHART_TOP_N can be overridden with the
+FOOD_CHART_BUDGET_BYTES and FOOD_CHART_TOP_N environment variables.
+
+Trend series come from rollup_timeseries (see timeseries.py) at the
+finest grain that shows the requested range in at most TREND_MAX_POINTS
+buckets, so a trend chart reads a bounded number of rows however long
+the history is.
+"""
+
+import os
+
+import pandas as pd
+
+from db import run_query
+from timeseries import ALL as TREND_ALL, COUNTERS, GRAINS, TABLE as TIMESERIES, bucket_start
+
+CHART_BUDGET_BYTES = int(os.environ.get("FOOD_CHART_BUDGET_BYTES", 4 * 1024))
+CHART_TOP_N = int(os.environ.get("FOOD_CHART_TOP_N", 25))
+OTHER = "Other"
+
+# rollup_listings has one row per (dimension, value); NULLs are stored as ''
+COUNTS_SQL = ("SELECT value, listings_count FROM rollup_listings "
+              "WHERE dimension = ? AND value <> '' AND listings_count > 0 "
+              "ORDER BY listings_count DESC, value")
+SAMPLE_ROWS_SQL = "SELECT * FROM food_listings_view LIMIT 200"
+
+TREND_MAX_POINTS = 200
+# Both read the (grain, city, bucket) primary key as a range
+TREND_SQL = (f"SELECT bucket, {', '.join(COUNTERS)} FROM {TIMESERIES} "
+             "WHERE grain = ? AND city = ? AND bucket BETWEEN ? AND ? ORDER BY bucket")
+TREND_EXTENT_SQL = (f"SELECT MIN(bucket) AS first, MAX(bucket) AS last FROM {TIMESERIES} "
+                    "WHERE grain = 'hour' AND city = ?")
+
+
+def payload_bytes(df: pd.DataFrame) -> int:
+    return len(df.to_json(orient="records").encode())
+
+
+def top_n(counts: pd.DataFrame, n: int, column: str = "listings_count") -> pd.DataFrame:
+    """The n - 1 largest groups plus an OTHER row summing the rest (n rows at most)."""
+    if len(counts) <= n:
+        return counts
+    head, rest = counts.iloc[:max(n - 1, 0)], counts.iloc[max(n - 1, 0):]
+    other = pd.DataFrame({counts.columns[0]: [OTHER], column: [int(rest[column].sum())]})
+    return pd.concat([head, other], ignore_index=True)
+
+
+def fit_budget(counts: pd.DataFrame, n: int, budget_bytes: int) -> pd.DataFrame:
+    """top_n(counts, k) for the largest k <= n whose payload fits the budget."""
+    lo, hi = 1, max(1, min(n, len(counts)))
+    if payload_bytes(top_n(counts, hi)) <= budget_bytes:
+        return top_n(counts, hi)
+    while lo < hi:  # payload grows with k
+        mid = (lo + hi + 1) // 2
+        if payload_bytes(top_n(counts, mid)) <= budget_bytes:
+            lo = mid
+        else:
+            hi = mid - 1
+    return top_n(counts, lo)
+
+
+def _full_table_bytes(rows: int) -> int:
+    """Estimated JSON size of `rows` food_listings rows, as the charts used to embed them."""
+    sample = run_query(SAMPLE_ROWS_SQL)
+    return int(payload_bytes(sample) / len(sample) * rows) if len(sample) else 0
+
+
+def listing_counts(dimension: str, top: int = CHART_TOP_N, budget_bytes: int = CHART_BUDGET_BYTES) -> dict:
+    """Listings per value of a food_listings column, ready to chart.
+
+    Returns `data` (columns `dimension` and `listings_count`, largest
+    first, OTHER last), `groups` (before bucketing), `other_groups`
+    (folded into OTHER), `payload_bytes` and `full_bytes` (estimated
+    payload of the old per-row chart data).
+    """
+    counts = run_query(COUNTS_SQL, [dimension]).rename(columns={"value": dimension})
+    data = fit_budget(counts, top, budget_bytes)
+    other = len(counts) - (len(data) - 1) if len(data) < len(counts) else 0
+    return {
+        "data": data,
+        "groups": len(counts),
+        "other_groups": other,
+        "payload_bytes": payload_bytes(data),
+        "full_bytes": _full_table_bytes(int(counts["listings_count"].sum())),
+    }
+
+
+def trend_grain(seconds: int, max_points: int = TREND_MAX_POINTS) -> str:
+    """Finest grain showing `seconds` in at most max_points buckets (else the coarsest)."""
+    for grain, size in GRAINS.items():
+        if seconds / size <= max_points:
+            return grain
+    return list(GRAINS)[-1]
+
+
+def trend_extent(city: str = TREND_ALL) -> tuple:
+    """(first, last) hour with any activity, as epoch seconds, or (None, None)."""
+    row = run_query(TREND_EXTENT_SQL, [city]).iloc[0]
+    if pd.isna(row["last"]):
+        return None, None
+    return int(row["first"]), int(row["last"])
+
+
+def trend(start: int, end: int, city: str = TREND_ALL, max_points: int = TREND_MAX_POINTS) -> tuple:
+    """(grain, DataFrame) of the counters per bucket from start to end (epoch seconds).
+
+    Buckets without activity are filled with zeros; `period` is the
+    bucket start as a UTC timestamp.
+    """
+    grain = trend_grain(end - start, max_points)
+    first, last = bucket_start(grain, start), bucket_start(grain, end)
+    df = run_query(TREND_SQL, [grain, city, first, last])
+    df = (df.set_index("bucket")
+            .reindex(range(first, last + 1, GRAINS[grain]), fill_value=0)
+            .rename_axis("bucket").reset_index())
+    df.insert(0, "period", pd.to_datetime(df["bucket"], unit="s"))
+    return grain, df
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN QUERY PLAN regression check.
+
+Builds a scratch database from the CSVs with setup_db (indexes and ANALYZE
+included), collects every query the project runs (queries.sql, the SQL
+literals passed to run_query/show_sql/exec_query in app.py, the generated
+Data Filtering pages for every filter combination, sort key and direction,
+with and without a cursor, and the SQL constants of the batch tools) and
+records which tables each query reads with a full SCAN and whether it
+sorts its rows in a temporary B-tree.
+
+The accepted plans are stored in query_plans.json. The check fails if any
+query scans a table that its baseline entry does not list, or newly needs
+a temporary sort (e.g. a page whose ORDER BY no index provides). Queries
+that legitimately read a whole table or sort (e.g. full aggregates) are
+accepted by running with --update after reviewing the plans.
+
+Usage:
+    python check_query_plans.py            # exit 1 on plan regressions
+    python check_query_plans.py --update   # rewrite query_plans.json
+"""
+
+import argparse
+import ast
+import hashlib
+import itertools
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import setup_db
+
+BASELINE_PATH = "query_plans.json"
+
+_SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_TEMP_SORT_RE = re.compile(r"^USE TEMP B-TREE FOR (?:RIGHT PART OF |LAST TERM OF )?ORDER BY")
+_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_KEYWORDS = {"where", "join", "left", "inner", "cross", "on", "group", "order", "limit", "using", "natural", "union", "except"}
+
+
+def normalize(sql: str) -> str:
+    sql = "\n".join(line.split("--")[0] for line in sql.splitlines())
+    return " ".join(sql.split()).rstrip(";")
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def queries_from_sql_file(path: str = "queries.sql") -> list:
+    """(label, sql) for each statement, labelled by the comment above it."""
+    queries, label, buf = [], "", []
+    for line in open(path, encoding="utf-8"):
+        stripped = line.strip()
+        if stripped.startswith("--"):
+            if re.match(r"--\s*\d+\)", stripped):
+                label = stripped.lstrip("- ").strip()
+            continue
+        buf.append(line)
+        if stripped.endswith(";"):
+            queries.append((f"queries.sql {label}", "".join(buf)))
+            buf = []
+    return queries
+
+
+def queries_from_app(path: str = "app.py") -> list:
+    """SQL strings passed to run_query / show_sql / exec_query.
+
+    f-strings are evaluated when they only use the claim_status,
+    availability and lookups helpers.
+    """
+    import availability
+    import claim_status
+    import lookups
+    queries = []
+    tree = ast.parse(open(path, encoding="utf-8").read())
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+            continue
+        if node.func.id in ("run_query", "exec_query"):
+            args = node.args[:1]
+        elif node.func.id == "show_sql":
+            args = node.args[1:2]
+        else:
+            continue
+        for arg in args:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                queries.append((f"{path}:{node.lineno}", arg.value))
+            elif isinstance(arg, ast.JoinedStr):
+                code = compile(ast.Expression(arg), path, "eval")
+                queries.append((f"{path}:{node.lineno}", eval(code, {"claim_status": claim_status, "availability": availability,
+                                                                         "lookups": lookups})))
+    return queries
+
+
+def queries_from_modules() -> list:
+    # Imported lazily: these modules open the app database on import
+    import analytics
+    import chart_data
+    import listings
+    import model_registry
+    import pickers
+    import reservations
+    import score_listings
+    import search
+
+    queries = [
+        ("analytics.CLAIMS_PER_LISTING_SQL", analytics.CLAIMS_PER_LISTING_SQL),
+        ("chart_data.COUNTS_SQL", chart_data.COUNTS_SQL),
+        ("chart_data.TREND_SQL", chart_data.TREND_SQL),
+        ("chart_data.TREND_EXTENT_SQL", chart_data.TREND_EXTENT_SQL),
+        ("listings.INSERT_SQL", listings.INSERT_SQL),
+        ("listings.UPDATE_SQL", listings.UPDATE_SQL),
+        ("model_registry.TRAINING_SQL", model_registry.TRAINING_SQL),
+        ("model_registry.FINGERPRINT_SQL", model_registry.FINGERPRINT_SQL),
+        ("score_listings.OPEN_LISTINGS_SQL", score_listings.OPEN_LISTINGS_SQL),
+        ("score_listings.AT_RISK_SQL", score_listings.AT_RISK_SQL),
+        ("search.SEARCH_SQL", search.SEARCH_SQL),
+        ("pickers.RECEIVERS_BY_PREFIX_SQL", pickers.RECEIVERS_BY_PREFIX_SQL),
+        ("pickers.AVAILABLE_LISTINGS_BY_MATCH_SQL", pickers.AVAILABLE_LISTINGS_BY_MATCH_SQL),
+        ("pickers.CLAIMS_BY_RECEIVER_PREFIX_SQL", pickers.CLAIMS_BY_RECEIVER_PREFIX_SQL),
+        ("reservations.HOLDER_SQL", reservations.HOLDER_SQL),
+        ("reservations.INSERT_SQL", reservations.INSERT_SQL),
+        ("reservations.UPDATE_SQL", reservations.UPDATE_SQL),
+    ]
+    samples = {"location": "X", "provider_id": 1, "food_type": "X", "meal_type": "X"}
+    cursors = {None: "", (1, 1): " after cursor", (None, 1): " after NULL cursor"}
+    for n in range(len(listings.FILTERS) + 1):
+        for names in itertools.combinations(listings.FILTERS, n):
+            filters = {name: samples[name] for name in names}
+            label = "listings " + ("+".join(names) or "no filter")
+            queries.append((f"{label} count", listings.count_sql(filters)[0]))
+            for sort_by, descending, (cursor, after) in itertools.product(listings.SORTS, (False, True),
+                                                                         cursors.items()):
+                sql, _ = listings.page_sql(filters, list(listings.COLUMNS), sort_by, descending, cursor, 50)
+                order = f"{sort_by} {'desc' if descending else 'asc'}"
+                queries.append((f"{label} page by {order}{after}", sql))
+    return queries
+
+
+def aliases(sql: str, tables: set) -> dict:
+    """Name used in query plans (alias or table name) -> table name."""
+    names = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        if table in tables:
+            names[table] = table
+            if alias and alias.lower() not in _KEYWORDS:
+                names[alias] = table
+    return names
+
+
+def partial_indexes(conn: sqlite3.Connection) -> set:
+    return {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")}
+
+
+def scanned_tables(conn: sqlite3.Connection, sql: str, tables: set, partial: set) -> list:
+    """Tables the query reads in full. Scans of a partial index only read
+    the rows matching the index's WHERE clause, and virtual table scans
+    (FTS5 MATCH) are lookups, so neither counts."""
+    # A string sample: with NULL SQLite cannot turn LIKE 'prefix%' into a range
+    params = ["x"] * sql.count("?")
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    names = aliases(sql, tables)
+    scans = set()
+    for row in plan:
+        match = _SCAN_RE.match(row[3])
+        if match and match.group(1) in names and match.group(2) not in partial and "VIRTUAL TABLE" not in row[3]:
+            scans.add(names[match.group(1)])
+    return sorted(scans)
+
+
+def temp_sort(conn: sqlite3.Connection, sql: str) -> bool:
+    """True if the query sorts rows in a temporary B-tree for its ORDER BY."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, ["x"] * sql.count("?")).fetchall()
+    return any(_TEMP_SORT_RE.match(row[3]) for row in plan)
+
+
+def collect_plans() -> dict:
+    queries = queries_from_sql_file() + queries_from_app() + queries_from_modules()
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "plans.db"))
+        try:
+            setup_db.full_load(conn)
+            import score_listings
+            score_listings.ensure_scores_table(conn)
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+            partial = partial_indexes(conn)
+            plans = {}
+            for label, sql in queries:
+                plans[fingerprint(sql)] = {
+                    "label": label,
+                    "sql": normalize(sql),
+                    "scans": scanned_tables(conn, sql, tables, partial),
+                    "temp_sort": temp_sort(conn, sql),
+                }
+        finally:
+            conn.close()
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if any project query regresses to a full table scan.")
+    parser.add_argument("--update", action="store_true", help=f"accept the current plans into {BASELINE_PATH}")
+    args = parser.parse_args()
+
+    plans = collect_plans()
+    if args.update:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(plans, f, indent=2, sort_keys=True)
+            f.write("\n")
+        accepted = sum(1 for p in plans.values() if p["scans"])
+        sorts = sum(1 for p in plans.values() if p["temp_sort"])
+        print(f"[OK] Wrote {len(plans)} query plans ({accepted} with accepted full scans, "
+              f"{sorts} with accepted temporary sorts) to {BASELINE_PATH}")
+        return
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        baseline = json.load(open(BASELINE_PATH, encoding="utf-8"))
+
+    failures = []
+    for key, plan in plans.items():
+        accepted = baseline.get(key, {})
+        regressed = [t for t in plan["scans"] if t not in accepted.get("scans", [])]
+        if regressed:
+            failures.append(f"{plan['label']}: full scan of {', '.join(regressed)}\n    {plan['sql']}")
+        if plan["temp_sort"] and not accepted.get("temp_sort"):
+            failures.append(f"{plan['label']}: sorts in a temporary B-tree\n    {plan['sql']}")
+
+    if failures:
+        print(f"[FAIL] {len(failures)} regressions in {len(plans)} query plans (full scans or temporary sorts):")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print(f"[OK] {len(plans)} query plans checked, no new full scans or temporary sorts")
+
+
+if __name__ == "__main__":
+    main()
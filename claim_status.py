@@ -0,0 +1,93 @@
+"""
+Claim status codes.
+
+claims.status_code is a small integer constrained to the codes below; the
+`claim_statuses` lookup table holds their display names and the
+`claims_view` view shows claims with the name in a `status` column.
+
+Queries filter on the literal codes (e.g. `c.status_code = 2`) so SQLite
+can use the partial indexes built for completed and active claims; a
+bound parameter or a join on the lookup name cannot match them.
+"""
+
+import sqlite3
+
+import pandas as pd
+
+from query_cache import register_derived
+
+PENDING = 1
+COMPLETED = 2
+CANCELLED = 3
+
+STATUSES = {PENDING: "Pending", COMPLETED: "Completed", CANCELLED: "Cancelled"}
+
+LOOKUP_TABLE = "claim_statuses"
+VIEW = "claims_view"
+
+# Free-text spellings seen in (or expected from) the source CSVs
+ALIASES = {
+    "pending": PENDING,
+    "open": PENDING,
+    "completed": COMPLETED,
+    "complete": COMPLETED,
+    "done": COMPLETED,
+    "fulfilled": COMPLETED,
+    "cancelled": CANCELLED,
+    "canceled": CANCELLED,
+}
+
+register_derived(VIEW, ["claims", LOOKUP_TABLE])
+
+
+def _column(alias: str) -> str:
+    return f"{alias}.status_code" if alias else "status_code"
+
+
+def is_completed(alias: str = "") -> str:
+    return f"{_column(alias)} = {COMPLETED}"
+
+
+def is_active(alias: str = "") -> str:
+    """Claims that still hold their listing (anything but cancelled)."""
+    return f"{_column(alias)} <> {CANCELLED}"
+
+
+def code_of(name: str) -> int:
+    """Status code for a display name or free-text spelling."""
+    code = ALIASES.get(str(name).strip().lower())
+    if code is None:
+        raise ValueError(f"Unknown claim status: {name!r}")
+    return code
+
+
+def normalize(statuses: pd.Series) -> pd.Series:
+    """Map a column of free-text statuses to codes; raise on unknown values."""
+    codes = statuses.astype(str).str.strip().str.lower().map(ALIASES)
+    unknown = statuses[codes.isna()].unique()
+    if len(unknown):
+        raise ValueError(f"Unknown claim status values: {', '.join(map(repr, unknown[:10]))}")
+    return codes.astype("int64")
+
+
+def create_lookup(conn: sqlite3.Connection):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {LOOKUP_TABLE} (
+        status_code INTEGER PRIMARY KEY,
+        status      TEXT NOT NULL UNIQUE
+    );
+    """)
+    conn.executemany(
+        f"INSERT INTO {LOOKUP_TABLE} (status_code, status) VALUES (?, ?) "
+        "ON CONFLICT(status_code) DO UPDATE SET status = excluded.status",
+        list(STATUSES.items()),
+    )
+
+
+def create_view(conn: sqlite3.Connection):
+    conn.execute(f"""
+    CREATE VIEW IF NOT EXISTS {VIEW} AS
+    SELECT c.claim_id, c.food_id, c.receiver_id, s.status, c.timestamp, c.timestamp_epoch
+    FROM claims c
+    JOIN {LOOKUP_TABLE} s ON s.status_code = c.status_code;
+    """)
@@ -0,0 +1,86 @@
+"""
+Long-lived SQLite connections for the app.
+
+Every thread that reads gets its own connection (Streamlit runs each script
+run on its own thread), and all writes share a single connection guarded by
+a lock, so there is at most one writer at a time. The database is switched
+to WAL so readers never block on the writer and vice versa.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+CACHE_SIZE_KB = 16 * 1024        # page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024    # memory-mapped I/O window
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE = 256            # prepared statements kept per connection
+
+
+def configure_connection(conn: sqlite3.Connection):
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB};")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+
+
+class ConnectionPool:
+    def __init__(self, path: str):
+        self.path = path
+        self._readers = {}  # thread ident -> (thread, connection)
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._wal_ready = False
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False only so the pool can close connections
+        # left behind by finished threads; each reader is used by one thread.
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        configure_connection(conn)
+        if not self._wal_ready:
+            conn.execute("PRAGMA journal_mode = WAL;")
+            self._wal_ready = True
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Connection owned by the calling thread."""
+        thread = threading.current_thread()
+        with self._readers_lock:
+            entry = self._readers.get(thread.ident)
+            if entry is not None and entry[0] is thread:
+                return entry[1]
+            self._sweep()
+            conn = self._open()
+            self._readers[thread.ident] = (thread, conn)
+            return conn
+
+    @contextmanager
+    def writer(self):
+        """Serialized write transaction; commits on success, rolls back on error."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    def _sweep(self):
+        for ident, (thread, conn) in list(self._readers.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._readers[ident]
+
+    def close(self):
+        with self._readers_lock:
+            for _, conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -0,0 +1,134 @@
+"""
+Data-access helpers shared by the Streamlit app and the command-line tools.
+
+Reads go through a process-wide QueryCache and a per-thread pooled
+connection. Writes (exec_query, write_transaction) are handed to `writes`,
+a group-commit queue whose background thread owns the pool's writer
+connection and commits concurrent writes from all sessions together (see
+write_queue.py); each write bumps the versions of the tables it touches
+so cached reads of those tables are refetched. Callables in
+`write_listeners` are notified after each write that changed rows with
+(label, tables, versions before the write, row), where row is the
+(table, {column: value}) a write_transaction() declared it inserted, or
+None. Every call is timed
+into `stats` (see query_stats.py) for the Diagnostics page; write times
+include the wait for the group commit.
+
+write_transaction() runs a read-check-write sequence atomically while the
+batch holds the database's write lock.
+
+Reads that keep large frames around (whole tables, training data) can
+ask for compact dtypes: categoricals for the location and type columns,
+parsed dates and downcast integers (see compact()).
+
+The database path can be overridden with the FOOD_DB_PATH environment
+variable (benchmark.py uses this to point the app's queries at a scratch
+database).
+"""
+
+import os
+import time
+
+import pandas as pd
+
+import availability  # registers claims as a source of food_listings with the query cache
+import rollups  # registers the rollup tables' sources with the query cache
+import timeseries  # registers claims and food_listings as sources of rollup_timeseries
+from connection_pool import ConnectionPool
+from query_stats import QueryStats
+from write_queue import WriteQueue, is_busy  # noqa: F401  (is_busy is re-exported)
+from query_cache import QueryCache, tables_in, ensure_versions_table, read_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+# Low-cardinality text columns, whichever table or query they come from
+CATEGORY_COLUMNS = frozenset({"location", "provider_type", "food_type", "meal_type", "status", "city", "type"})
+DATETIME_COLUMNS = frozenset({"expiry_date", "timestamp"})
+
+pool = ConnectionPool(DB_PATH)
+cache = QueryCache()
+stats = QueryStats()
+write_listeners = []
+
+with pool.writer() as _conn:
+    ensure_versions_table(_conn)
+
+
+def _committed(request):
+    """write_queue callback, on the writer thread, for each request of a committed batch."""
+    if request.error is None and request.changes:
+        cache.invalidate(request.tables)
+        for listener in write_listeners:
+            listener(request.label, request.tables, request.before, request.row)
+    ms = (time.perf_counter() - request.submitted) * 1000
+    stats.record(request.label, request.params, request.kind, ms, request.changes)
+
+
+writes = WriteQueue(pool, on_commit=_committed)
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Give df an explicit, smaller schema (in place) and return it.
+
+    Columns in CATEGORY_COLUMNS become categoricals, DATETIME_COLUMNS are
+    parsed, and integer columns are downcast to the smallest integer type
+    that holds their values. Other columns are left as they are.
+    """
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col in DATETIME_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def run_query(q, params=None, compact_frame: bool = False):
+    """Run a read query (through the cache); returns a copy of the result.
+
+    With compact_frame=True the result gets compact()'s schema, before it
+    is cached, so the cached frame is the small one too. Leave it off when
+    values are bound back into SQL (datetimes and numpy integers are not
+    valid sqlite3 parameters).
+    """
+    start = time.perf_counter()
+    key = cache.key(q, params) + (compact_frame,)
+    conn = pool.reader()
+    versions = read_versions(conn)
+    df = cache.get(key, versions)
+    hit = df is not None
+    if not hit:
+        df = pd.read_sql_query(q, conn, params=params or [])
+        if compact_frame:
+            compact(df)
+        cache.put(key, df, tables_in(q), versions)
+    df = df.copy()
+    stats.record(q, params, "read", (time.perf_counter() - start) * 1000, len(df), cache_hit=hit)
+    return df
+
+
+def exec_query(q, params=None):
+    """Run one write statement through the group-commit queue; returns its rowcount."""
+    return writes.execute(q, params or [], tables_in(q))
+
+
+def load_table(name, columns=None, compact_frame: bool = True):
+    """A whole table (or just `columns` of it) as a compact() DataFrame."""
+    return run_query(f"SELECT {', '.join(columns) if columns else '*'} FROM {name}", compact_frame=compact_frame)
+
+
+def write_transaction(work, tables, label: str, row=None) -> tuple:
+    """Run work(conn) atomically through the group-commit queue; returns (result, attempts).
+
+    The batch holds the write lock (BEGIN IMMEDIATE) before `work` runs, so
+    anything it reads stays true until it commits. `work` runs under its
+    own savepoint: if it raises, only its changes are rolled back and the
+    error is re-raised here. SQLITE_BUSY is retried by the queue (see
+    write_queue.py). Table versions are bumped and caches invalidated only
+    if `work` changed rows. `label` names the transaction in the query
+    statistics. When `work` inserts a single row, pass it as
+    row=(table, {column: value}) with readable values (names, not lookup
+    ids) so write_listeners can apply it without reloading.
+    """
+    return writes.transaction(work, tables, label, row)
@@ -0,0 +1,120 @@
+"""
+Shared vocabularies for the app's dropdowns.
+
+Every selectbox of cities, providers, receivers and food/meal/provider
+types reads from one process-wide DimensionCache instead of issuing its
+own SELECT DISTINCT. The vocabularies are loaded together in a single
+UNION ALL query (mostly from the trigger-maintained rollup tables) and
+kept as sorted tuples.
+
+Each vocabulary remembers the version of its source table. A write
+that declares the row it inserted (listings.save_listing() does, with
+the location and type names it stores as ids) is applied in place:
+the new value is bisected into the sorted tuple, so adding a listing does
+not reload anything. Any other write to a source table makes the affected
+vocabularies reload on the next refresh().
+"""
+
+import bisect
+import threading
+
+import db
+from query_cache import read_versions
+
+# name -> (SELECT returning (value, id) rows, source table, (value column, id column) of a source row)
+DIMENSIONS = {
+    "location": ("SELECT value, NULL FROM rollup_listings WHERE dimension = 'location' AND value <> ''",
+                 "food_listings", ("location", None)),
+    "food_name": ("SELECT value, NULL FROM rollup_listings WHERE dimension = 'food_name' AND value <> ''",
+                  "food_listings", ("food_name", None)),
+    "provider_type": ("SELECT value, NULL FROM rollup_listings WHERE dimension = 'provider_type' AND value <> ''",
+                      "food_listings", ("provider_type", None)),
+    "food_type": ("SELECT value, NULL FROM rollup_listings WHERE dimension = 'food_type' AND value <> ''",
+                  "food_listings", ("food_type", None)),
+    "meal_type": ("SELECT value, NULL FROM rollup_listings WHERE dimension = 'meal_type' AND value <> ''",
+                  "food_listings", ("meal_type", None)),
+    "provider_city": ("SELECT city, NULL FROM rollup_provider_cities WHERE city <> ''",
+                      "providers", ("city", None)),
+    "receiver_city": ("SELECT city, NULL FROM rollup_receiver_cities WHERE city <> ''",
+                      "receivers", ("city", None)),
+    "provider": ("SELECT name, provider_id FROM providers", "providers", ("name", "provider_id")),
+    "receiver": ("SELECT name, receiver_id FROM receivers", "receivers", ("name", "receiver_id")),
+}
+
+class DimensionCache:
+    """Thread-safe sorted vocabularies, refreshed per source-table version."""
+
+    def __init__(self):
+        self._values = {}    # name -> sorted tuple of values
+        self._ids = {}       # name -> tuple of ids aligned with _values (entities)
+        self._versions = {}  # name -> source table version the values reflect
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the vocabularies whose source tables changed, in one query."""
+        conn = db.pool.reader()
+        versions = read_versions(conn)
+        with self._lock:
+            stale = [name for name, (_, source, _) in DIMENSIONS.items()
+                     if name not in self._versions or self._versions[name] != versions.get(source, 0)]
+            if not stale:
+                return self
+            sql = " UNION ALL ".join(f"SELECT '{name}', * FROM ({DIMENSIONS[name][0]})" for name in stale)
+            rows = {name: [] for name in stale}
+            for name, value, id_ in conn.execute(sql):
+                if value is not None:
+                    rows[name].append((value, id_))
+            for name in stale:
+                pairs = sorted(rows[name])
+                self._values[name] = tuple(value for value, _ in pairs)
+                self._ids[name] = tuple(id_ for _, id_ in pairs)
+                self._versions[name] = versions.get(DIMENSIONS[name][1], 0)
+        return self
+
+    def values(self, name: str) -> list:
+        return list(self._values[name])
+
+    def ids(self, name: str) -> list:
+        """Ids aligned with values(name), for provider and receiver."""
+        return list(self._ids[name])
+
+    def id_of(self, name: str, value):
+        """Id of the first entity with this name, or None."""
+        values = self._values[name]
+        i = bisect.bisect_left(values, value)
+        return self._ids[name][i] if i < len(values) and values[i] == value else None
+
+    def on_write(self, label: str, tables, versions_before: dict, inserted):
+        """db write listener: apply a declared single-row insert in place."""
+        with self._lock:
+            for name, (_, source, (value_col, id_col)) in DIMENSIONS.items():
+                if source not in tables or name not in self._versions:
+                    continue
+                # Only a write that moved the source version on from what we hold
+                # can be applied; anything else is reloaded by refresh().
+                if self._versions[name] != versions_before.get(source, 0):
+                    continue
+                if inserted is None or inserted[0] != source:
+                    continue
+                row = inserted[1]
+                if value_col not in row or (id_col and id_col not in row):
+                    continue
+                self._insert(name, row[value_col], row.get(id_col) if id_col else None)
+                self._versions[name] += 1
+
+    def _insert(self, name: str, value, id_):
+        if value is None or str(value).strip() == "":
+            return
+        values, ids = self._values[name], self._ids[name]
+        if id_ is None:
+            i = bisect.bisect_left(values, value)
+            if i < len(values) and values[i] == value:
+                return
+        else:
+            i = bisect.bisect_right(values, value)  # entities may share a name
+        self._values[name] = values[:i] + (value,) + values[i:]
+        self._ids[name] = ids[:i] + (id_,) + ids[i:]
+
+
+dimensions = DimensionCache()
+db.write_listeners.append(dimensions.on_write)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic providers, receivers, listings and claims at scale.
+
+The output CSVs have the same names, headers and date formats as the
+bundled ones, so `setup_db.py --csv-dir DIR` loads them unchanged. Values
+are drawn with a seeded numpy generator from the bundled CSVs, which
+keeps their distributions: provider and receiver cities, types, food
+names, quantities and claim statuses are sampled with their observed
+frequencies. Timestamps and expiry dates are spread over the observed
+date ranges. As in the bundled data, a listing's location and provider
+type are those of its provider, and claims pick listings and receivers
+uniformly (some listings get several claims, some none).
+
+`--rows` sets the number of listings and claims, as a plain count or
+with a k/m suffix (200k, 2.5m); providers and receivers default to a
+tenth of that (at least 1,000).
+
+Usage:
+    python generate_data.py --rows 1000000 --out data/1m [--seed 0]
+"""
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 1_000_000
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+_ROWS_RE = re.compile(r"^(\d+(?:\.\d+)?)([km]?)$")
+
+
+def parse_rows(text: str) -> int:
+    """Row count from '100000', '200k', '2.5m' or '1_000'."""
+    match = _ROWS_RE.match(text.strip().lower().replace("_", ""))
+    if not match or float(match.group(1)) * SUFFIXES.get(match.group(2), 1) < 1:
+        raise ValueError(f"not a positive row count: {text!r}")
+    number, suffix = match.groups()
+    return round(float(number) * SUFFIXES[suffix]) if suffix else int(number)
+
+
+class Sampler:
+    """Draws columns from the value distributions of the bundled CSVs."""
+
+    def __init__(self, source_dir: str = ".", seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.providers = pd.read_csv(os.path.join(source_dir, "providers_data.csv"))
+        self.receivers = pd.read_csv(os.path.join(source_dir, "receivers_data.csv"))
+        self.listings = pd.read_csv(os.path.join(source_dir, "food_listings_data.csv"))
+        self.claims = pd.read_csv(os.path.join(source_dir, "claims_data.csv"))
+
+    def sample(self, column: pd.Series, n: int) -> np.ndarray:
+        """n values drawn with the column's observed frequencies."""
+        values = column.dropna().to_numpy()
+        return values[self.rng.integers(0, len(values), n)]
+
+    def dates(self, column: pd.Series, fmt: str, n: int) -> pd.Series:
+        """n datetimes uniform over the column's observed range, to the minute."""
+        parsed = pd.to_datetime(column, format=fmt)
+        lo, hi = parsed.min().value // 60_000_000_000, parsed.max().value // 60_000_000_000
+        minutes = self.rng.integers(lo, hi + 1, n)
+        return pd.Series(pd.to_datetime(minutes, unit="m"))
+
+
+def format_date(dt: pd.Series) -> pd.Series:
+    """m/d/YYYY without zero padding, as in the bundled CSVs."""
+    return dt.dt.month.astype(str) + "/" + dt.dt.day.astype(str) + "/" + dt.dt.year.astype(str)
+
+
+def format_timestamp(dt: pd.Series) -> pd.Series:
+    """m/d/YYYY H:MM, as in the bundled CSVs."""
+    return format_date(dt) + " " + dt.dt.hour.astype(str) + ":" + dt.dt.strftime("%M")
+
+
+def _chunks(n: int):
+    for start in range(0, n, CHUNK_ROWS):
+        yield start, min(n, start + CHUNK_ROWS) - start
+
+
+def _write(df: pd.DataFrame, path: str, first: bool):
+    df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def generate(out_dir: str, n_rows: int, n_providers: int = None, n_receivers: int = None,
+             seed: int = 0, source_dir: str = ".") -> dict:
+    """Write the four CSVs into out_dir; returns the row count per table."""
+    n_providers = n_providers or max(1_000, n_rows // 10)
+    n_receivers = n_receivers or max(1_000, n_rows // 10)
+    s = Sampler(source_dir, seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Providers are kept in memory: listings copy their city and type
+    p = s.providers
+    provider_city = s.sample(p["City"], n_providers)
+    provider_type = s.sample(p["Type"], n_providers)
+    _write(pd.DataFrame({
+        "Provider_ID": np.arange(1, n_providers + 1),
+        "Name": s.sample(p["Name"], n_providers),
+        "Type": provider_type,
+        "Address": s.sample(p["Address"], n_providers),
+        "City": provider_city,
+        "Contact": s.sample(p["Contact"], n_providers),
+    }), os.path.join(out_dir, "providers_data.csv"), True)
+
+    r = s.receivers
+    for start, n in _chunks(n_receivers):
+        _write(pd.DataFrame({
+            "Receiver_ID": np.arange(start + 1, start + n + 1),
+            "Name": s.sample(r["Name"], n),
+            "Type": s.sample(r["Type"], n),
+            "City": s.sample(r["City"], n),
+            "Contact": s.sample(r["Contact"], n),
+        }), os.path.join(out_dir, "receivers_data.csv"), start == 0)
+
+    f = s.listings
+    for start, n in _chunks(n_rows):
+        provider = s.rng.integers(0, n_providers, n)
+        _write(pd.DataFrame({
+            "Food_ID": np.arange(start + 1, start + n + 1),
+            "Food_Name": s.sample(f["Food_Name"], n),
+            "Quantity": s.sample(f["Quantity"], n),
+            "Expiry_Date": format_date(s.dates(f["Expiry_Date"], "%m/%d/%Y", n)),
+            "Provider_ID": provider + 1,
+            "Provider_Type": provider_type[provider],
+            "Location": provider_city[provider],
+            "Food_Type": s.sample(f["Food_Type"], n),
+            "Meal_Type": s.sample(f["Meal_Type"], n),
+        }), os.path.join(out_dir, "food_listings_data.csv"), start == 0)
+
+    c = s.claims
+    for start, n in _chunks(n_rows):
+        _write(pd.DataFrame({
+            "Claim_ID": np.arange(start + 1, start + n + 1),
+            "Food_ID": s.rng.integers(1, n_rows + 1, n),
+            "Receiver_ID": s.rng.integers(1, n_receivers + 1, n),
+            "Status": s.sample(c["Status"], n),
+            "Timestamp": format_timestamp(s.dates(c["Timestamp"], "%m/%d/%Y %H:%M", n)),
+        }), os.path.join(out_dir, "claims_data.csv"), start == 0)
+
+    return {"providers": n_providers, "receivers": n_receivers, "food_listings": n_rows, "claims": n_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic CSVs shaped like the bundled ones.")
+    parser.add_argument("--rows", type=parse_rows, required=True,
+                        help="listings and claims to generate, e.g. 100000, 100k, 1m or 10m")
+    parser.add_argument("--providers", type=parse_rows, help="default: rows / 10, at least 1,000")
+    parser.add_argument("--receivers", type=parse_rows, help="default: rows / 10, at least 1,000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="output directory")
+    args = parser.parse_args()
+
+    counts = generate(args.out, args.rows, args.providers, args.receivers, args.seed)
+    for table, n in counts.items():
+        print(f"[OK] {table}: {n:,} rows")
+    print(f"[DONE] CSVs written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Filtered, paginated access to food listings for the Data Filtering tab.
+
+Pages are fetched with keyset pagination: the cursor is the (sort value,
+food_id) of the last row of the previous page, so every page is an index
+range read no matter how deep the user pages. Only the SORTS keys are
+offered, each backed by an index in (sort value, food_id) order; location
+sorts by its lookup id, which groups listings by city. The total row count comes
+from a separate COUNT(*) query, and only the requested columns are read
+(providers is joined only when a provider column is requested).
+
+Free-text search goes through the FTS5 index maintained by search.py.
+
+save_listing() writes a listing from the CRUD forms, adding any new
+city or type names to the lookup tables in the same transaction.
+"""
+
+import pandas as pd
+
+import lookups
+from db import run_query, write_transaction
+from search import SEARCH_SQL, match_expression
+
+PAGE_SIZE = 50
+SEARCH_LIMIT = 50
+
+# Column name shown in the app -> SQL expression
+COLUMNS = {
+    "food_id": "f.food_id",
+    "food_name": "f.food_name",
+    "quantity": "f.quantity",
+    "expiry_date": "f.expiry_date",
+    "provider_id": "f.provider_id",
+    "provider_type": lookups.name_of("food_listings", "provider_type", "f"),
+    "location": lookups.name_of("food_listings", "location", "f"),
+    "food_type": lookups.name_of("food_listings", "food_type", "f"),
+    "meal_type": lookups.name_of("food_listings", "meal_type", "f"),
+    "provider_name": "p.name",
+    "provider_contact": "p.contact",
+}
+PROVIDER_COLUMNS = {"provider_name", "provider_contact"}
+
+# Sort key -> SQL expression ordered by an index (food_id is the rowid, so
+# every index on food_listings also orders ties by food_id)
+SORTS = {
+    "food_id": "f.food_id",
+    "food_name": "f.food_name",        # idx_food_name
+    "quantity": "f.quantity",          # idx_food_quantity
+    "expiry_date": "f.expiry_date",    # idx_food_expiry
+    "provider_id": "f.provider_id",    # idx_food_provider_filters
+    "location": "f.location_id",       # idx_food_location_sort
+}
+
+# Columns written by save_listing(), after lookups.encode_row()
+WRITE_COLUMNS = ["food_name", "quantity", "expiry_date", "provider_id", "provider_type_id",
+                 "location_id", "food_type_id", "meal_type_id"]
+INSERT_SQL = (f"INSERT INTO food_listings ({', '.join(WRITE_COLUMNS)}, expiry_epoch, created_epoch) "
+              f"VALUES ({', '.join('?' * len(WRITE_COLUMNS))}, CAST(strftime('%s', ?) AS INTEGER), "
+              "CAST(strftime('%s', 'now') AS INTEGER))")
+UPDATE_SQL = (f"UPDATE food_listings SET {', '.join(f'{c} = ?' for c in WRITE_COLUMNS)}, "
+              "expiry_epoch = CAST(strftime('%s', ?) AS INTEGER) WHERE food_id = ?")
+
+# Filter name -> (column it is an equality predicate on, SQL for the value);
+# names are compared as lookup ids so the filter indexes apply
+FILTERS = {
+    "location": ("f.location_id", lookups.id_of("food_listings", "location")),
+    "provider_id": ("f.provider_id", "?"),
+    "food_type": ("f.food_type_id", lookups.id_of("food_listings", "food_type")),
+    "meal_type": ("f.meal_type_id", lookups.id_of("food_listings", "meal_type")),
+}
+# A handful of values each: a page reads fewer rows walking the sort index
+# and skipping non-matches than sorting every match, so pages mark these
+# filters with unary + (SQLite then does not drive the query from their index)
+WIDE_FILTERS = {"food_type", "meal_type"}
+
+
+def _clauses(filters: dict, page: bool = False) -> tuple:
+    clauses, params = [], []
+    for name, value in filters.items():
+        if value is not None:
+            column, value_sql = FILTERS[name]
+            if page and name in WIDE_FILTERS:
+                column = "+" + column
+            clauses.append(f"{column} = {value_sql}")
+            params.append(value)
+    return clauses, params
+
+
+def _where(filters: dict) -> tuple:
+    clauses, params = _clauses(filters)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def count_sql(filters: dict) -> tuple:
+    where, params = _where(filters)
+    return f"SELECT COUNT(*) AS n FROM food_listings f{where}", params
+
+
+def count_listings(filters: dict) -> int:
+    sql, params = count_sql(filters)
+    return int(run_query(sql, params)["n"].iloc[0])
+
+
+def _after(sort_expr: str, descending: bool, cursor: tuple) -> tuple:
+    """Keyset predicate for rows after `cursor` in (sort, food_id) order.
+
+    Non-NULL cursors compare row values, which SQLite turns into a seek on
+    the sort index. SQLite sorts NULLs first ascending and last descending;
+    the NULL rows after a descending non-NULL cursor are read by a second
+    branch in page_sql.
+    """
+    value, food_id = cursor
+    if sort_expr == "f.food_id":
+        return ("f.food_id < ?" if descending else "f.food_id > ?"), [food_id]
+    if value is None:
+        if descending:
+            return f"({sort_expr} IS NULL AND f.food_id < ?)", [food_id]
+        return f"(({sort_expr} IS NULL AND f.food_id > ?) OR {sort_expr} IS NOT NULL)", [food_id]
+    return f"({sort_expr}, f.food_id) {'<' if descending else '>'} (?, ?)", [value, food_id]
+
+
+def _select(select: dict, sort_expr: str, clauses: list, order: str) -> str:
+    need_providers = bool(PROVIDER_COLUMNS & set(select))
+    return (
+        f"SELECT {', '.join(f'{COLUMNS[c]} AS {c}' for c in select)}, {sort_expr} AS sort_value FROM food_listings f"
+        + (" LEFT JOIN providers p ON p.provider_id = f.provider_id" if need_providers else "")
+        + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        + f" ORDER BY {order} LIMIT ?"
+    )
+
+
+def page_sql(filters: dict, columns: list, sort_by: str, descending: bool,
+             cursor: tuple, page_size: int) -> tuple:
+    """(sql, params) selecting one page plus one extra row to detect a next page."""
+    sort_expr = SORTS[sort_by]
+    select = dict.fromkeys(columns + ["food_id"])
+    clauses, params = _clauses(filters, page=True)
+
+    direction = "DESC" if descending else "ASC"
+    order = f"f.food_id {direction}" if sort_by == "food_id" else f"{sort_expr} {direction}, f.food_id {direction}"
+    if cursor is None:
+        return _select(select, sort_expr, clauses, order), params + [page_size + 1]
+
+    predicate, cursor_params = _after(sort_expr, descending, cursor)
+    sql = _select(select, sort_expr, clauses + [predicate], order)
+    if not (descending and cursor[0] is not None and sort_by != "food_id"):
+        return sql, params + cursor_params + [page_size + 1]
+    # The NULL rows follow the non-NULL ones descending; reading them in a
+    # second, index-ordered branch keeps both seeks (an OR would scan)
+    tail = _select(select, sort_expr, clauses + [f"{sort_expr} IS NULL"], f"f.food_id {direction}")
+    sql = f"SELECT * FROM ({sql}) UNION ALL SELECT * FROM ({tail}) ORDER BY sort_value DESC, food_id DESC LIMIT ?"
+    return sql, params + cursor_params + [page_size + 1] + params + [page_size + 1] + [page_size + 1]
+
+
+def listings_page(filters: dict, columns=None, sort_by: str = "food_id", descending: bool = False,
+                  cursor: tuple = None, page_size: int = PAGE_SIZE) -> tuple:
+    """One page of listings and the cursor for the next page (None on the last page)."""
+    columns = list(columns or COLUMNS)
+    df = run_query(*page_sql(filters, columns, sort_by, descending, cursor, page_size))
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        value = last["sort_value"]
+        if pd.isna(value):
+            value = None
+        elif hasattr(value, "item"):
+            value = value.item()  # numpy scalar -> Python value for sqlite3
+        next_cursor = (value, int(last["food_id"]))
+    return df[columns], next_cursor
+
+
+def search_listings(text: str, limit: int = SEARCH_LIMIT):
+    """Best bm25 matches for free text with a highlighted snippet, or None
+    if the text has no searchable words."""
+    query = match_expression(text)
+    if not query:
+        return None
+    return run_query(SEARCH_SQL, [query, limit])
+
+
+def save_listing(values: dict, food_id: int = None) -> int:
+    """Insert a listing, or update food_id, from {column: value} with names
+    for the type and location columns; returns the listing's food_id."""
+    def work(conn):
+        row = lookups.encode_row(conn, "food_listings", values)
+        params = [row.get(c) for c in WRITE_COLUMNS] + [row.get("expiry_date")]
+        if food_id is None:
+            return conn.execute(INSERT_SQL, params).lastrowid
+        conn.execute(UPDATE_SQL, params + [food_id])
+        return food_id
+
+    # A new listing only adds values, so the dropdown vocabularies take it in
+    # place; an update may drop one and leaves them to reload.
+    saved, _ = write_transaction(work, ["food_listings", *lookups.LOOKUPS],
+                                 "create listing" if food_id is None else "update listing",
+                                 ("food_listings", dict(values)) if food_id is None else None)
+    return saved
@@ -0,0 +1,133 @@
+"""
+Dictionary-encoded dimension columns.
+
+The city and type columns of food_listings, providers and receivers are
+stored as integer ids into small lookup tables (`cities`,
+`provider_types`, `food_types`, `meal_types`), each holding one row per
+distinct name. Listings, providers and receivers share `cities`;
+listings and providers share `provider_types`. A column `location` is
+stored as `location_id`, `city` as `city_id` and so on.
+
+`food_listings_view`, `providers_view` and `receivers_view` show the
+tables with their original column names and the names decoded, for
+queries that only display rows. Queries that filter or group on these
+columns use the id columns, so they compare integers and can use the
+indexes on them: filter with `id_of()`, and decode names with `name_of()`
+(also used by the rollup, search and time-series triggers).
+
+Names are added to the lookup tables as rows are written (see encode());
+empty names are stored as NULL ids. Lookup rows are never deleted, so a
+name stays valid for as long as the database exists.
+"""
+
+import json
+import sqlite3
+
+import pandas as pd
+
+from query_cache import register_derived
+
+LOOKUPS = ["cities", "provider_types", "food_types", "meal_types"]
+
+# table -> {original text column: lookup table}
+ENCODED = {
+    "providers": {"type": "provider_types", "city": "cities"},
+    "receivers": {"city": "cities"},
+    "food_listings": {"provider_type": "provider_types", "location": "cities",
+                      "food_type": "food_types", "meal_type": "meal_types"},
+}
+VIEWS = {table: f"{table}_view" for table in ENCODED}
+
+for _table, _columns in ENCODED.items():
+    register_derived(VIEWS[_table], [_table, *_columns.values()])
+
+
+def id_column(column: str) -> str:
+    return f"{column}_id"
+
+
+def stored_column(table: str, column: str) -> str:
+    """Column that holds table.column: its id column if it is encoded."""
+    return id_column(column) if column in ENCODED.get(table, {}) else column
+
+
+def name_of(table: str, column: str, alias: str) -> str:
+    """SQL for the text value of table.column in the row `alias` (e.g. NEW)."""
+    lookup = ENCODED.get(table, {}).get(column)
+    if lookup is None:
+        return f"{alias}.{column}"
+    return f"(SELECT name FROM {lookup} WHERE id = {alias}.{id_column(column)})"
+
+
+def id_of(table: str, column: str, name: str = "?") -> str:
+    """SQL for the id of a name (a bound parameter by default), NULL if unknown."""
+    return f"(SELECT id FROM {ENCODED[table][column]} WHERE name = {name})"
+
+
+def create_lookups(conn: sqlite3.Connection):
+    for lookup in LOOKUPS:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {lookup} (
+            id   INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        """)
+
+
+def view_sql(conn: sqlite3.Connection, table: str) -> str:
+    """SELECT listing the table's columns under their original names."""
+    decoded = {id_column(column): column for column in ENCODED[table]}
+    exprs = []
+    for _, name, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        if name in decoded:
+            exprs.append(f"{name_of(table, decoded[name], 't')} AS {decoded[name]}")
+        else:
+            exprs.append(f"t.{name}")
+    return f"SELECT {', '.join(exprs)} FROM {table} t"
+
+
+def create_views(conn: sqlite3.Connection):
+    for table, view in VIEWS.items():
+        conn.execute(f"CREATE VIEW IF NOT EXISTS {view} AS {view_sql(conn, table)};")
+
+
+def drop_views(conn: sqlite3.Connection):
+    for view in VIEWS.values():
+        conn.execute(f"DROP VIEW IF EXISTS {view};")
+
+
+def _clean(name):
+    return None if name is None or pd.isna(name) or str(name).strip() == "" else name
+
+
+def ensure(conn: sqlite3.Connection, lookup: str, names) -> dict:
+    """{name: id} for the given names, adding those the lookup lacks."""
+    names = list(dict.fromkeys(n for n in map(_clean, names) if n is not None))
+    if not names:
+        return {}
+    conn.executemany(f"INSERT INTO {lookup} (name) VALUES (?) ON CONFLICT(name) DO NOTHING",
+                     [(n,) for n in names])
+    return dict(conn.execute(f"SELECT name, id FROM {lookup} WHERE name IN (SELECT value FROM json_each(?))",
+                             [json.dumps(names)]))
+
+
+def encode(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Replace the table's text columns in df with their id columns."""
+    for column, lookup in ENCODED.get(table, {}).items():
+        if column not in df.columns:
+            continue
+        names = df[column].map(_clean)
+        ids = ensure(conn, lookup, names.dropna().unique())
+        df[id_column(column)] = names.map(ids).astype("Int64")
+        df = df.drop(columns=column)
+    return df
+
+
+def encode_row(conn: sqlite3.Connection, table: str, row: dict) -> dict:
+    """encode() for one row given as {column: value}."""
+    row = dict(row)
+    for column, lookup in ENCODED.get(table, {}).items():
+        if column in row:
+            name = _clean(row.pop(column))
+            row[id_column(column)] = ensure(conn, lookup, [name])[name] if name is not None else None
+    return row
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Memory report for the DataFrames a session builds from whole tables.
+
+Generates synthetic CSVs at --rows (default 1m) with generate_data.py,
+loads them into a scratch database and measures the deep memory usage of
+each frame as run_query returns it by default and with compact dtypes
+(db.compact: categoricals, parsed dates, downcast integers). The
+per-session total counts the frames app.py used to hold per session:
+food_listings three times (`listings` twice and `fl`), claims twice and
+the model's training data. Pass --db to measure an existing database
+instead.
+
+Usage:
+    python memory_report.py                  # 1M listings and claims
+    python memory_report.py --rows 100k
+    python memory_report.py --db food.db
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import generate_data
+import setup_db
+
+# (label, copies per session, source)
+FRAMES = [
+    ("food_listings (listings, fl)", 3, "food_listings"),
+    ("claims (with status)", 2, "claims_view"),
+    ("model training data", 1, None),
+]
+
+
+def build_db(work_dir: str, rows: str) -> str:
+    n_rows = generate_data.parse_rows(rows)
+    start = time.perf_counter()
+    counts = generate_data.generate(work_dir, n_rows)
+    db_path = os.path.join(work_dir, "food.db")
+    conn = sqlite3.connect(db_path)
+    try:
+        setup_db.full_load(conn, work_dir)
+    finally:
+        conn.close()
+    print(f"[OK] Generated and loaded {counts} in {time.perf_counter() - start:.1f}s")
+    return db_path
+
+
+def measure(db_path: str) -> list:
+    """[(label, copies, default bytes, compact bytes, rows)] for FRAMES."""
+    os.environ["FOOD_DB_PATH"] = db_path
+    # Imported here: db opens FOOD_DB_PATH on import
+    import db
+    from model_registry import TRAINING_SQL
+
+    results = []
+    for label, copies, table in FRAMES:
+        sql = f"SELECT * FROM {table}" if table else TRAINING_SQL
+        sizes = []
+        for compact_frame in (False, True):
+            df = db.run_query(sql, compact_frame=compact_frame)
+            sizes.append(int(df.memory_usage(index=True, deep=True).sum()))
+            rows = len(df)
+            db.cache.clear()
+            del df
+        results.append((label, copies, *sizes, rows))
+    return results
+
+
+def mb(n: int) -> str:
+    return f"{n / 2**20:,.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure DataFrame memory with default and compact dtypes.")
+    parser.add_argument("--rows", default="1m", help="listings/claims to generate (default: %(default)s)")
+    parser.add_argument("--db", help="measure this database instead of generating one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = args.db or build_db(work_dir, args.rows)
+        results = measure(db_path)
+
+    print("| Frame | Rows | Default | Compact | Saved |")
+    print("|---|---:|---:|---:|---:|")
+    for label, _, default, small, rows in results:
+        print(f"| {label} | {rows:,} | {mb(default)} | {mb(small)} | {100 * (1 - small / default):.0f}% |")
+    default = sum(copies * d for _, copies, d, _, _ in results)
+    small = sum(copies * s for _, copies, _, s, _ in results)
+    print(f"| **per session** | | **{mb(default)}** | **{mb(small)}** | **{100 * (1 - small / default):.0f}%** |")
+    print(f"[DONE] Per-session frames: {mb(default)} -> {mb(small)}")
+
+
+if __name__ == "__main__":
+    main()
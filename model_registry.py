@@ -0,0 +1,158 @@
+"""
+Claim-success model registry.
+
+The logistic-regression pipeline is trained once, saved to disk together
+with its metrics and the fingerprint of the data it was trained on, and
+loaded from there on startup. When enough new claims have arrived since
+the saved model was trained, a replacement is trained on a background
+thread while the current model keeps serving predictions.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+import joblib
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OneHotEncoder
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.linear_model import LogisticRegression
+
+import db
+import lookups
+from claim_status import COMPLETED
+from query_cache import read_versions
+
+MODEL_PATH = os.path.join("models", "claim_model.joblib")
+RETRAIN_MIN_NEW_CLAIMS = 50
+
+FEATURES = ["quantity", "provider_type", "location", "food_type", "meal_type"]
+CATEGORICAL = ["provider_type", "location", "food_type", "meal_type"]
+
+TRAINING_SQL = f"""
+    SELECT c.status_code, {", ".join(f"{lookups.name_of('food_listings', col, 'f')} AS {col}" for col in FEATURES)}
+    FROM claims c
+    LEFT JOIN food_listings f ON f.food_id = c.food_id
+"""
+
+
+FINGERPRINT_SQL = """
+    SELECT (SELECT COALESCE(SUM(claims_count), 0) FROM rollup_claim_status),
+           (SELECT MAX(claim_id) FROM claims),
+           (SELECT MAX(food_id) FROM food_listings)
+"""
+
+
+class InsufficientData(Exception):
+    """Raised when the claims history has only one outcome class."""
+
+
+def data_fingerprint() -> tuple:
+    """(fingerprint, claim count) of the tables the model is trained on.
+
+    Runs on every Data Analysis render, so it stays O(1) in the data: the
+    table versions change on every write, MAX of a rowid is a b-tree seek
+    and the claim count comes from the rollup of claims per status.
+    """
+    conn = db.pool.reader()
+    versions = read_versions(conn)
+    n_claims, max_claim, max_food = conn.execute(FINGERPRINT_SQL).fetchone()
+    raw = repr((versions.get("claims", 0), versions.get("food_listings", 0), max_claim, max_food))
+    return hashlib.sha1(raw.encode()).hexdigest(), n_claims
+
+
+def build_pipeline() -> Pipeline:
+    pre = ColumnTransformer([("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL)], remainder="passthrough")
+    return Pipeline([("pre", pre), ("clf", LogisticRegression(max_iter=200))])
+
+
+def train(fingerprint: str, n_claims: int) -> dict:
+    data = db.run_query(TRAINING_SQL, compact_frame=True)
+    X = data[FEATURES].copy()
+    y = (data["status_code"] == COMPLETED).astype(int)
+
+    # Handle missing numeric values
+    X["quantity"] = X["quantity"].fillna(0)
+
+    if y.nunique() < 2:
+        raise InsufficientData("Need both successful and unsuccessful claims for training.")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    model = build_pipeline()
+    model.fit(X_train, y_train)
+    return {
+        "model": model,
+        "metrics": {
+            "accuracy": model.score(X_test, y_test),
+            "train_samples": len(X_train),
+            "n_features": len(FEATURES),
+        },
+        "fingerprint": fingerprint,
+        "n_claims": n_claims,
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+class ModelRegistry:
+    def __init__(self, path: str = MODEL_PATH, retrain_min_new_claims: int = RETRAIN_MIN_NEW_CLAIMS):
+        self.path = path
+        self.retrain_min_new_claims = retrain_min_new_claims
+        self._entry = None
+        self._lock = threading.Lock()
+        self._retraining = None
+
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                entry = joblib.load(self.path)
+                if entry["model"].feature_names_in_.tolist() == FEATURES:
+                    return entry
+            except Exception as e:
+                print(f"[WARN] Ignoring unreadable model at {self.path}: {e}")
+        return None
+
+    def _save(self, entry: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        joblib.dump(entry, tmp)
+        os.replace(tmp, self.path)
+
+    def _train_and_save(self, fingerprint: str, n_claims: int) -> dict:
+        entry = train(fingerprint, n_claims)
+        self._save(entry)
+        self._entry = entry
+        return entry
+
+    def _retrain_in_background(self, fingerprint: str, n_claims: int):
+        def work():
+            try:
+                self._train_and_save(fingerprint, n_claims)
+            except Exception as e:
+                print(f"[WARN] Background retrain failed: {e}")
+            finally:
+                self._retraining = None
+
+        self._retraining = threading.Thread(target=work, name="model-retrain", daemon=True)
+        self._retraining.start()
+
+    def current(self) -> dict:
+        """Entry with keys model, metrics, fingerprint, n_claims, trained_at.
+
+        Trains synchronously only when no usable model exists yet.
+        """
+        fingerprint, n_claims = data_fingerprint()
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._load()
+            if self._entry is None:
+                return self._train_and_save(fingerprint, n_claims)
+            stale = self._entry["fingerprint"] != fingerprint
+            enough_new = abs(n_claims - self._entry["n_claims"]) >= self.retrain_min_new_claims
+            if stale and enough_new and self._retraining is None:
+                self._retrain_in_background(fingerprint, n_claims)
+            return self._entry
+
+
+registry = ModelRegistry()
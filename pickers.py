@@ -0,0 +1,116 @@
+"""
+Type-ahead lookups for the CRUD pickers.
+
+Each function takes what the user has typed and returns at most `limit`
+matches as a DataFrame with an `id` column (the value the picker returns)
+and a `label` column (what it shows). Digits match an id exactly; text is
+matched with an index-backed prefix query (receiver names via
+idx_receivers_name, listings via the listings_fts index), so the cost
+does not grow with the size of the tables.
+"""
+
+import pandas as pd
+
+import availability
+import claim_status
+import lookups
+from db import run_query
+from search import FTS_TABLE, match_expression
+
+PICKER_LIMIT = 20
+
+
+def _like_prefix(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame({"id": pd.Series(dtype="int64"), "label": pd.Series(dtype="object")})
+
+
+RECEIVERS_BY_PREFIX_SQL = (
+    f"SELECT receiver_id AS id, name, city FROM {lookups.VIEWS['receivers']} "
+    "WHERE name LIKE ? ESCAPE '\\' ORDER BY name COLLATE NOCASE LIMIT ?"
+)
+
+
+def find_receivers(text: str, limit: int = PICKER_LIMIT) -> pd.DataFrame:
+    text = text.strip().lstrip("#")
+    if text.isdigit():
+        df = run_query(f"SELECT receiver_id AS id, name, city FROM {lookups.VIEWS['receivers']} WHERE receiver_id = ?",
+                       [int(text)])
+    else:
+        df = run_query(RECEIVERS_BY_PREFIX_SQL, [_like_prefix(text), limit])
+    if df.empty:
+        return _empty()
+    df["label"] = df["name"] + " · " + df["city"].fillna("") + " (#" + df["id"].astype(str) + ")"
+    return df[["id", "label"]]
+
+
+_LISTING_COLUMNS = (f"SELECT f.food_id AS id, f.food_name, {lookups.name_of('food_listings', 'location', 'f')} AS location, "
+                    "p.name AS provider_name")
+_LISTING_SELECT = _LISTING_COLUMNS + """
+    FROM food_listings f
+    LEFT JOIN providers p ON p.provider_id = f.provider_id
+"""
+# Driven by the FTS index in rowid order, so LIMIT stops the scan early
+_LISTING_SEARCH = _LISTING_COLUMNS + f"""
+    FROM {FTS_TABLE}
+    JOIN food_listings f ON f.food_id = {FTS_TABLE}.rowid
+    LEFT JOIN providers p ON p.provider_id = f.provider_id
+    WHERE {FTS_TABLE} MATCH ?
+"""
+# Open listings only (maintained by the availability triggers)
+_AVAILABLE = availability.is_open("f")
+AVAILABLE_LISTINGS_BY_MATCH_SQL = _LISTING_SEARCH + f" AND {_AVAILABLE} ORDER BY {FTS_TABLE}.rowid DESC LIMIT ?"
+
+
+def find_listings(text: str, available_only: bool = False, limit: int = PICKER_LIMIT) -> pd.DataFrame:
+    """Listings by id, or newest first among full-text matches (all when empty)."""
+    text = text.strip().lstrip("#")
+    available = f" AND {_AVAILABLE}" if available_only else ""
+    if text.isdigit():
+        df = run_query(_LISTING_SELECT + f" WHERE f.food_id = ?{available}", [int(text)])
+    elif text:
+        query = match_expression(text)
+        if not query:
+            return _empty()
+        sql = AVAILABLE_LISTINGS_BY_MATCH_SQL if available_only else _LISTING_SEARCH + f" ORDER BY {FTS_TABLE}.rowid DESC LIMIT ?"
+        df = run_query(sql, [query, limit])
+    else:
+        df = run_query(_LISTING_SELECT + f" WHERE 1{available} ORDER BY f.food_id DESC LIMIT ?", [limit])
+    if df.empty:
+        return _empty()
+    df["label"] = ("#" + df["id"].astype(str) + " " + df["food_name"].fillna("") + " · "
+                   + df["location"].fillna("") + " · by " + df["provider_name"].fillna("?"))
+    return df[["id", "label"]]
+
+
+_CLAIM_SELECT = f"""
+    SELECT c.claim_id AS id, f.food_name, r.name AS receiver_name, s.status
+    FROM claims c
+    JOIN {claim_status.LOOKUP_TABLE} s ON s.status_code = c.status_code
+    LEFT JOIN food_listings f ON f.food_id = c.food_id
+    LEFT JOIN receivers r ON r.receiver_id = c.receiver_id
+"""
+CLAIMS_BY_RECEIVER_PREFIX_SQL = _CLAIM_SELECT + """
+    WHERE c.receiver_id IN (SELECT receiver_id FROM receivers WHERE name LIKE ? ESCAPE '\\')
+    ORDER BY c.claim_id DESC LIMIT ?
+"""
+
+
+def find_claims(text: str, limit: int = PICKER_LIMIT) -> pd.DataFrame:
+    """Claims by id, by receiver-name prefix, or the newest claims when empty."""
+    text = text.strip().lstrip("#")
+    if text.isdigit():
+        df = run_query(_CLAIM_SELECT + " WHERE c.claim_id = ?", [int(text)])
+    elif text:
+        df = run_query(CLAIMS_BY_RECEIVER_PREFIX_SQL, [_like_prefix(text), limit])
+    else:
+        df = run_query(_CLAIM_SELECT + " ORDER BY c.claim_id DESC LIMIT ?", [limit])
+    if df.empty:
+        return _empty()
+    df["label"] = ("#" + df["id"].astype(str) + ": " + df["food_name"].fillna("?") + " → "
+                   + df["receiver_name"].fillna("?") + " [" + df["status"] + "]")
+    return df[["id", "label"]]
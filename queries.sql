@@ -1,27 +1,42 @@
 
+-- Claim status is stored as claims.status_code (1 = Pending, 2 = Completed,
+-- 3 = Cancelled; names in claim_statuses). Filtering on the literal code lets
+-- SQLite use the partial indexes on completed claims.
+-- Listing availability is stored as food_listings.availability (1 = Open,
+-- 2 = Reserved, 3 = Fulfilled, 4 = Expired; names in listing_states), kept
+-- current by triggers on claims; `availability = 1` reads the idx_food_open
+-- partial index.
+-- City and type columns are stored as ids into lookup tables (cities,
+-- provider_types, food_types, meal_types; see lookups.py): group and filter
+-- on the *_id columns, and join the lookup for the name after aggregating so
+-- it is read once per group rather than once per row. food_listings_view,
+-- providers_view and receivers_view show the tables with the names decoded.
+
 -- 1) Providers and receivers count by city
-SELECT city, COUNT(*) AS providers_count
-FROM providers
-GROUP BY city
-ORDER BY providers_count DESC;
+SELECT l.name AS city, g.providers_count
+FROM (SELECT city_id, COUNT(*) AS providers_count FROM providers GROUP BY city_id) g
+LEFT JOIN cities l ON l.id = g.city_id
+ORDER BY g.providers_count DESC;
 
-SELECT city, COUNT(*) AS receivers_count
-FROM receivers
-GROUP BY city
-ORDER BY receivers_count DESC;
+SELECT l.name AS city, g.receivers_count
+FROM (SELECT city_id, COUNT(*) AS receivers_count FROM receivers GROUP BY city_id) g
+LEFT JOIN cities l ON l.id = g.city_id
+ORDER BY g.receivers_count DESC;
 
 -- 2) Provider type contributing the most (by total quantity listed)
-SELECT provider_type, SUM(quantity) AS total_quantity
-FROM food_listings
-GROUP BY provider_type
-ORDER BY total_quantity DESC;
+SELECT l.name AS provider_type, g.total_quantity
+FROM (SELECT provider_type_id, SUM(quantity) AS total_quantity FROM food_listings GROUP BY provider_type_id) g
+LEFT JOIN provider_types l ON l.id = g.provider_type_id
+ORDER BY g.total_quantity DESC;
 
 -- 3) Contact info of providers in a given city (use :city param in apps/clients)
 -- For SQLite in Streamlit we'll parameterize with ?
-SELECT name, type, address, city, contact
-FROM providers
-WHERE city = ?
-ORDER BY name;
+SELECT p.name, t.name AS type, p.address, l.name AS city, p.contact
+FROM cities l
+JOIN providers p ON p.city_id = l.id
+LEFT JOIN provider_types t ON t.id = p.type_id
+WHERE l.name = ?
+ORDER BY p.name;
 
 -- 4) Receivers who claimed the most food (by number of claims)
 SELECT r.receiver_id, r.name, COUNT(*) AS claims_count
@@ -34,16 +49,16 @@ ORDER BY claims_count DESC;
 SELECT SUM(quantity) AS total_quantity_available FROM food_listings;
 
 -- 6) City with highest number of food listings
-SELECT location AS city, COUNT(*) AS listings_count
-FROM food_listings
-GROUP BY location
-ORDER BY listings_count DESC;
+SELECT l.name AS city, g.listings_count
+FROM (SELECT location_id, COUNT(*) AS listings_count FROM food_listings GROUP BY location_id) g
+LEFT JOIN cities l ON l.id = g.location_id
+ORDER BY g.listings_count DESC;
 
 -- 7) Most commonly available food types
-SELECT food_type, COUNT(*) AS appearances
-FROM food_listings
-GROUP BY food_type
-ORDER BY appearances DESC;
+SELECT l.name AS food_type, g.appearances
+FROM (SELECT food_type_id, COUNT(*) AS appearances FROM food_listings GROUP BY food_type_id) g
+LEFT JOIN food_types l ON l.id = g.food_type_id
+ORDER BY g.appearances DESC;
 
 -- 8) Claims made for each food item
 SELECT f.food_id, f.food_name, COUNT(c.claim_id) AS claim_count
@@ -57,7 +72,7 @@ SELECT p.provider_id, p.name, COUNT(*) AS successful_claims
 FROM claims c
 JOIN food_listings f ON f.food_id = c.food_id
 JOIN providers p ON p.provider_id = f.provider_id
-WHERE LOWER(c.status) = 'completed'
+WHERE c.status_code = 2  -- Completed
 GROUP BY p.provider_id, p.name
 ORDER BY successful_claims DESC;
 
@@ -65,11 +80,12 @@ ORDER BY successful_claims DESC;
 WITH total AS (
   SELECT COUNT(*) AS n FROM claims
 )
-SELECT status,
+SELECT s.status,
        COUNT(*) AS cnt,
        ROUND(100.0 * COUNT(*) / (SELECT n FROM total), 2) AS pct
-FROM claims
-GROUP BY status
+FROM claims c
+JOIN claim_statuses s ON s.status_code = c.status_code
+GROUP BY s.status
 ORDER BY cnt DESC;
 
 -- 11) Average quantity claimed per receiver
@@ -79,17 +95,19 @@ SELECT r.receiver_id, r.name,
 FROM claims c
 JOIN receivers r ON r.receiver_id = c.receiver_id
 JOIN food_listings f ON f.food_id = c.food_id
-WHERE LOWER(c.status) = 'completed'
+WHERE c.status_code = 2  -- Completed
 GROUP BY r.receiver_id, r.name
 ORDER BY avg_quantity_claimed DESC;
 
 -- 12) Most claimed meal type
-SELECT f.meal_type, COUNT(*) AS claims_count
-FROM claims c
-JOIN food_listings f ON f.food_id = c.food_id
-WHERE LOWER(c.status) = 'completed'
-GROUP BY f.meal_type
-ORDER BY claims_count DESC;
+SELECT l.name AS meal_type, g.claims_count
+FROM (SELECT f.meal_type_id, COUNT(*) AS claims_count
+      FROM claims c
+      JOIN food_listings f ON f.food_id = c.food_id
+      WHERE c.status_code = 2  -- Completed
+      GROUP BY f.meal_type_id) g
+LEFT JOIN meal_types l ON l.id = g.meal_type_id
+ORDER BY g.claims_count DESC;
 
 -- 13) Total quantity donated by each provider
 SELECT p.provider_id, p.name, SUM(f.quantity) AS total_donated_quantity
@@ -99,22 +117,21 @@ GROUP BY p.provider_id, p.name
 ORDER BY total_donated_quantity DESC;
 
 -- 14) Near-expiry items within next 48 hours
--- Works if expiry_date is ISO-like text; otherwise adapt with date functions
+-- expiry_date is stored as ISO 'YYYY-MM-DD', so a plain range predicate uses idx_food_expiry
 SELECT food_id, food_name, quantity, expiry_date, location
-FROM food_listings
-WHERE DATE(expiry_date) <= DATE('now', '+2 days')
-ORDER BY DATE(expiry_date) ASC;
+FROM food_listings_view
+WHERE expiry_date <= DATE('now', '+2 days')
+ORDER BY expiry_date ASC;
 
--- 15) Unclaimed items (no claims)
+-- 15) Unclaimed items (open: no pending or completed claim)
 SELECT f.food_id, f.food_name, f.quantity, f.location
-FROM food_listings f
-LEFT JOIN claims c ON c.food_id = f.food_id
-WHERE c.claim_id IS NULL;
+FROM food_listings_view f
+WHERE f.availability = 1;
 
 -- 16) Provider fulfillment rate (completed / total claims for provider)
 WITH stats AS (
   SELECT p.provider_id,
-         SUM(CASE WHEN LOWER(c.status)='completed' THEN 1 ELSE 0 END) AS completed,
+         SUM(CASE WHEN c.status_code = 2 THEN 1 ELSE 0 END) AS completed,
          COUNT(*) AS total
   FROM claims c
   JOIN food_listings f ON f.food_id = c.food_id
@@ -129,16 +146,88 @@ JOIN providers p ON p.provider_id = s.provider_id
 ORDER BY completion_rate_pct DESC;
 
 -- 17) Daily claim trend (last 30 days)
-SELECT DATE(timestamp) AS day, COUNT(*) AS claims_count
-FROM claims
-WHERE DATE(timestamp) >= DATE('now', '-30 days')
-GROUP BY DATE(timestamp)
-ORDER BY day ASC;
+-- Read from the daily all-cities rows of rollup_timeseries (see timeseries.py): one row per day
+SELECT DATE(bucket, 'unixepoch') AS day, claims_pending + claims_completed + claims_cancelled AS claims_count
+FROM rollup_timeseries
+WHERE grain = 'day' AND city = '*' AND bucket >= CAST(strftime('%s', 'now', '-30 days') AS INTEGER)
+ORDER BY bucket ASC;
 
 -- 18) Top cities by completed claims
-SELECT f.location AS city, COUNT(*) AS completed_claims
-FROM claims c
-JOIN food_listings f ON f.food_id = c.food_id
-WHERE LOWER(c.status)='completed'
-GROUP BY f.location
+SELECT l.name AS city, g.completed_claims
+FROM (SELECT f.location_id, COUNT(*) AS completed_claims
+      FROM claims c
+      JOIN food_listings f ON f.food_id = c.food_id
+      WHERE c.status_code = 2  -- Completed
+      GROUP BY f.location_id) g
+LEFT JOIN cities l ON l.id = g.location_id
+ORDER BY g.completed_claims DESC;
+
+-- ---------------------------------------------------------------------------
+-- Rollup equivalents (tables kept current by triggers, see rollups.py).
+-- These read one row per group instead of aggregating the full joins above.
+-- ---------------------------------------------------------------------------
+
+-- 1) Providers / receivers count by city
+SELECT city, providers_count FROM rollup_provider_cities ORDER BY providers_count DESC;
+SELECT city, receivers_count FROM rollup_receiver_cities ORDER BY receivers_count DESC;
+
+-- 2) / 5) / 6) / 7) Listing aggregates by provider_type, location, food_type, meal_type
+SELECT value AS provider_type, total_quantity FROM rollup_listings WHERE dimension = 'provider_type' ORDER BY total_quantity DESC;
+SELECT SUM(total_quantity) AS total_quantity_available FROM rollup_listings WHERE dimension = 'location';
+SELECT value AS city, listings_count FROM rollup_listings WHERE dimension = 'location' ORDER BY listings_count DESC;
+SELECT value AS food_type, listings_count AS appearances FROM rollup_listings WHERE dimension = 'food_type' ORDER BY appearances DESC;
+
+-- 4) Receivers who claimed the most food
+SELECT r.receiver_id, r.name, s.claims_count
+FROM rollup_receivers s
+JOIN receivers r ON r.receiver_id = s.receiver_id
+ORDER BY s.claims_count DESC;
+
+-- 9) Provider with highest number of successful claims
+SELECT p.provider_id, p.name, s.claims_completed AS successful_claims
+FROM rollup_providers s
+JOIN providers p ON p.provider_id = s.provider_id
+WHERE s.claims_completed > 0
+ORDER BY successful_claims DESC;
+
+-- 10) Percentage of claims by status
+SELECT s.status, r.claims_count AS cnt,
+       ROUND(100.0 * r.claims_count / (SELECT SUM(claims_count) FROM rollup_claim_status), 2) AS pct
+FROM rollup_claim_status r
+JOIN claim_statuses s ON s.status_code = r.status_code
+ORDER BY cnt DESC;
+
+-- 11) Average quantity claimed per receiver
+SELECT r.receiver_id, r.name,
+       1.0 * s.completed_quantity / s.completed_quantity_n AS avg_quantity_claimed
+FROM rollup_receivers s
+JOIN receivers r ON r.receiver_id = s.receiver_id
+WHERE s.completed_quantity_n > 0
+ORDER BY avg_quantity_claimed DESC;
+
+-- 12) Most claimed meal type
+SELECT value AS meal_type, completed_claims AS claims_count
+FROM rollup_listings
+WHERE dimension = 'meal_type' AND completed_claims > 0
+ORDER BY claims_count DESC;
+
+-- 13) Total quantity donated by each provider
+SELECT p.provider_id, p.name, s.total_quantity AS total_donated_quantity
+FROM rollup_providers s
+JOIN providers p ON p.provider_id = s.provider_id
+ORDER BY total_donated_quantity DESC;
+
+-- 16) Provider fulfillment rate
+SELECT s.provider_id, p.name,
+       ROUND(100.0 * s.claims_completed / NULLIF(s.claims_total, 0), 2) AS completion_rate_pct,
+       s.claims_completed AS completed, s.claims_total AS total
+FROM rollup_providers s
+JOIN providers p ON p.provider_id = s.provider_id
+WHERE s.claims_total > 0
+ORDER BY completion_rate_pct DESC;
+
+-- 18) Top cities by completed claims
+SELECT value AS city, completed_claims
+FROM rollup_listings
+WHERE dimension = 'location' AND completed_claims > 0
 ORDER BY completed_claims DESC;
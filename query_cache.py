@@ -0,0 +1,127 @@
+"""
+Table-aware result cache for read queries.
+
+Each cached DataFrame remembers which tables its SQL reads and the version
+of each of those tables at fetch time. Writes bump a per-table version row
+in the `table_versions` table of the database, so every Streamlit worker
+sharing the same food.db sees the change and refetches only the entries
+that depend on the written tables. Entries are kept in LRU order and the
+cache is bounded both by entry count and by approximate bytes.
+"""
+
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+VERSIONS_TABLE = "table_versions"
+
+# "DO UPDATE SET" of an upsert names no table
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN|INTO|(?<!DO\s)UPDATE)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_CTE_RE = re.compile(r"(?:\bWITH|,)\s*([A-Za-z_][A-Za-z0-9_]*)\s+AS\s*\(", re.IGNORECASE)
+
+# Tables maintained from other tables (e.g. by triggers) -> their sources
+_derived = {}
+
+
+def register_derived(table: str, sources):
+    """Make reads of `table` depend on the versions of `sources` as well."""
+    _derived[table.lower()] = frozenset(s.lower() for s in sources)
+
+
+def tables_in(sql: str) -> frozenset:
+    """Names of the tables a statement reads or writes (CTE names excluded),
+    with the sources of derived tables added transitively (a view of
+    food_listings also depends on claims, which food_listings derives from)."""
+    ctes = {name.lower() for name in _CTE_RE.findall(sql)}
+    tables = {name.lower() for name in _TABLE_RE.findall(sql) if name.lower() not in ctes}
+    pending = list(tables)
+    while pending:
+        for source in _derived.get(pending.pop(), frozenset()):
+            if source not in tables:
+                tables.add(source)
+                pending.append(source)
+    return frozenset(tables)
+
+
+def ensure_versions_table(conn: sqlite3.Connection):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (
+        table_name TEXT PRIMARY KEY,
+        version    INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+
+
+def bump_versions(conn: sqlite3.Connection, tables):
+    """Increment the stored version of each table. Caller commits."""
+    conn.executemany(
+        f"INSERT INTO {VERSIONS_TABLE} (table_name, version) VALUES (?, 1) "
+        "ON CONFLICT(table_name) DO UPDATE SET version = version + 1",
+        [(t,) for t in tables],
+    )
+
+
+def read_versions(conn: sqlite3.Connection) -> dict:
+    return dict(conn.execute(f"SELECT table_name, version FROM {VERSIONS_TABLE}").fetchall())
+
+
+class QueryCache:
+    """Thread-safe LRU of query results keyed on (sql, params)."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (df, tables, versions, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql, params) -> tuple:
+        return (sql, tuple(params or ()))
+
+    def get(self, key, current_versions: dict):
+        """Return the cached frame, or None if missing or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            df, tables, versions, _ = entry
+            if any(current_versions.get(t, 0) != versions.get(t, 0) for t in tables):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return df
+
+    def put(self, key, df, tables, current_versions: dict):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        versions = {t: current_versions.get(t, 0) for t in tables}
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, tables, versions, nbytes)
+            self._bytes += nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tables):
+        """Evict every entry that reads any of the given tables."""
+        tables = set(tables)
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e[1] & tables]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def _drop(self, key):
+        _, _, _, nbytes = self._entries.pop(key)
+        self._bytes -= nbytes
@@ -0,0 +1,155 @@
+"""
+Per-query timing statistics for run_query / exec_query.
+
+Every call is recorded under the fingerprint of its normalized SQL
+(comments and whitespace stripped, `?, ?, ?` lists collapsed) with the
+shape of its parameters, whether the result came from the query cache,
+the rows returned or changed, and its wall time. Percentiles are taken
+over the last SAMPLES calls of each fingerprint.
+
+Calls slower than SLOW_QUERY_MS (override with the FOOD_SLOW_QUERY_MS
+environment variable) are logged as warnings on the "query_stats" logger
+and kept in a short list of recent slow queries. The parameters of the
+latest call are kept per fingerprint so its EXPLAIN QUERY PLAN can be
+shown on demand; dump() leaves them out.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+
+SAMPLES = 1000
+SLOW_QUERY_MS = float(os.environ.get("FOOD_SLOW_QUERY_MS", 250))
+RECENT_SLOW = 100
+
+log = logging.getLogger("query_stats")
+
+_PLACEHOLDER_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalize(sql: str) -> str:
+    sql = "\n".join(line.split("--")[0] for line in sql.splitlines())
+    return _PLACEHOLDER_LIST_RE.sub("?...", " ".join(sql.split()).rstrip(";"))
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def params_shape(params) -> str:
+    """e.g. 'str, int, int' — the types, never the values."""
+    return ", ".join(type(p).__name__ for p in params or ()) or "-"
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=None) -> list:
+    """EXPLAIN QUERY PLAN rows as indented text lines."""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params or []).fetchall()
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + detail)
+    return lines
+
+
+class QueryStats:
+    """Thread-safe per-fingerprint call statistics."""
+
+    def __init__(self, samples: int = SAMPLES, slow_ms: float = SLOW_QUERY_MS):
+        self.samples = samples
+        self.slow_ms = slow_ms
+        self._entries = {}  # fingerprint -> dict
+        self._slow = deque(maxlen=RECENT_SLOW)
+        self._started = datetime.now()
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, params, kind: str, ms: float, rows: int, cache_hit: bool = False):
+        fp = fingerprint(sql)
+        shape = params_shape(params)
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                entry = self._entries[fp] = {
+                    "sql": normalize(sql), "kind": kind, "calls": 0, "cache_hits": 0, "rows": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "param_shapes": set(),
+                    "times": deque(maxlen=self.samples), "last": (sql, list(params or [])),
+                }
+            entry["calls"] += 1
+            entry["cache_hits"] += cache_hit
+            entry["rows"] += rows or 0
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["param_shapes"].add(shape)
+            entry["times"].append(ms)
+            entry["last"] = (sql, list(params or []))
+            if ms >= self.slow_ms:
+                entry["slow"] += 1
+                self._slow.append({"at": datetime.now().isoformat(timespec="seconds"), "fingerprint": fp,
+                                   "kind": kind, "ms": round(ms, 2), "rows": rows, "params": shape,
+                                   "sql": entry["sql"]})
+        if ms >= self.slow_ms:
+            log.warning("slow %s %.0f ms (%s rows, params: %s): %s", kind, ms, rows, shape, normalize(sql)[:500])
+
+    def summary(self) -> list:
+        """One dict per fingerprint, slowest total time first."""
+        with self._lock:
+            entries = [(fp, dict(e, times=sorted(e["times"]), param_shapes=sorted(e["param_shapes"])))
+                       for fp, e in self._entries.items()]
+        rows = []
+        for fp, e in entries:
+            misses = e["calls"] - e["cache_hits"]
+            rows.append({
+                "fingerprint": fp,
+                "kind": e["kind"],
+                "calls": e["calls"],
+                "cache_hits": e["cache_hits"],
+                "cache_misses": misses,
+                "avg_rows": round(e["rows"] / e["calls"], 1),
+                "p50_ms": round(percentile(e["times"], 50), 2),
+                "p95_ms": round(percentile(e["times"], 95), 2),
+                "p99_ms": round(percentile(e["times"], 99), 2),
+                "max_ms": round(e["max_ms"], 2),
+                "total_ms": round(e["total_ms"], 1),
+                "slow": e["slow"],
+                "params": " | ".join(e["param_shapes"]),
+                "sql": e["sql"],
+            })
+        return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+    def slow_queries(self) -> list:
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def last_call(self, fp: str) -> tuple:
+        """(sql, params) of the latest call with this fingerprint, or None."""
+        with self._lock:
+            entry = self._entries.get(fp)
+            return entry["last"] if entry else None
+
+    def dump(self) -> dict:
+        """JSON-serializable snapshot (no parameter values)."""
+        return {
+            "since": self._started.isoformat(timespec="seconds"),
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "slow_query_ms": self.slow_ms,
+            "queries": self.summary(),
+            "slow_queries": self.slow_queries(),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._slow.clear()
+            self._started = datetime.now()
@@ -0,0 +1,103 @@
+"""
+Contention-safe claim creation and updates.
+
+A listing is held by at most one active (not cancelled) claim. The
+availability check and the write run in one BEGIN IMMEDIATE transaction
+(db.write_transaction), so two receivers submitting at the same moment,
+from any number of app processes, cannot both claim the same listing:
+the second one sees the first one's claim and gets a CONFLICT result.
+
+The rule is enforced here rather than with a unique index because the
+bundled history already has listings with several active claims.
+"""
+
+import sqlite3
+from datetime import datetime
+
+import claim_status
+from db import is_busy, write_transaction
+
+RESERVED = "reserved"
+UPDATED = "updated"
+CONFLICT = "conflict"
+MISSING = "missing"
+BUSY = "busy"
+
+INSERT_SQL = ("INSERT INTO claims (food_id, receiver_id, status_code, timestamp, timestamp_epoch) "
+              "VALUES (?, ?, ?, ?, CAST(strftime('%s', ?) AS INTEGER))")
+UPDATE_SQL = ("UPDATE claims SET food_id = ?, receiver_id = ?, status_code = ?, timestamp = ?, "
+              "timestamp_epoch = CAST(strftime('%s', ?) AS INTEGER) WHERE claim_id = ?")
+# Probes idx_claims_active_food
+HOLDER_SQL = (f"SELECT c.claim_id FROM claims c WHERE c.food_id = ? AND {claim_status.is_active('c')} "
+              "AND c.claim_id IS NOT ? LIMIT 1")
+
+
+def _result(outcome: str, message: str, claim_id=None, held_by=None, attempts: int = 0) -> dict:
+    return {"outcome": outcome, "message": message, "claim_id": claim_id, "held_by": held_by, "attempts": attempts}
+
+
+def _check(conn: sqlite3.Connection, food_id: int, receiver_id: int, takes_listing: bool, claim_id=None) -> dict:
+    """None if the claim may be written, else a MISSING or CONFLICT result."""
+    if conn.execute("SELECT 1 FROM food_listings WHERE food_id = ?", [food_id]).fetchone() is None:
+        return _result(MISSING, f"Listing #{food_id} no longer exists.")
+    if conn.execute("SELECT 1 FROM receivers WHERE receiver_id = ?", [receiver_id]).fetchone() is None:
+        return _result(MISSING, f"Receiver #{receiver_id} does not exist.")
+    if takes_listing:
+        holder = conn.execute(HOLDER_SQL, [food_id, claim_id]).fetchone()
+        if holder is not None:
+            return _result(CONFLICT, f"Listing #{food_id} was just claimed (claim #{holder[0]}).",
+                           held_by=holder[0])
+    return None
+
+
+def _run(work, label: str) -> dict:
+    try:
+        result, attempts = write_transaction(work, ["claims"], label)
+    except sqlite3.OperationalError as e:
+        if not is_busy(e):
+            raise
+        return _result(BUSY, "The database is busy; please try again.")
+    result["attempts"] = attempts
+    return result
+
+
+def reserve_claim(food_id: int, receiver_id: int, status: str = "Pending", timestamp: str = None) -> dict:
+    """Create a claim unless the listing is already held by an active claim.
+
+    Returns a dict with `outcome` (RESERVED, CONFLICT, MISSING or BUSY), a
+    user-facing `message`, the new `claim_id` or the `held_by` claim, and
+    the number of transaction `attempts`.
+    """
+    code = claim_status.code_of(status)
+    ts = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def work(conn):
+        refused = _check(conn, food_id, receiver_id, code != claim_status.CANCELLED)
+        if refused:
+            return refused
+        claim_id = conn.execute(INSERT_SQL, [food_id, receiver_id, code, ts, ts]).lastrowid
+        return _result(RESERVED, f"Claim #{claim_id} created.", claim_id=claim_id)
+
+    return _run(work, "reservations.reserve_claim")
+
+
+def update_claim(claim_id: int, food_id: int, receiver_id: int, status: str, timestamp: str = None) -> dict:
+    """Rewrite a claim. Moving an active claim to another listing, or
+    reactivating a cancelled one, is refused if the listing is held by
+    another active claim; other edits (e.g. Pending -> Completed) are not.
+    """
+    code = claim_status.code_of(status)
+    ts = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def work(conn):
+        old = conn.execute("SELECT food_id, status_code FROM claims WHERE claim_id = ?", [claim_id]).fetchone()
+        if old is None:
+            return _result(MISSING, f"Claim #{claim_id} does not exist.")
+        takes_listing = code != claim_status.CANCELLED and (old[0] != food_id or old[1] == claim_status.CANCELLED)
+        refused = _check(conn, food_id, receiver_id, takes_listing, claim_id)
+        if refused:
+            return refused
+        conn.execute(UPDATE_SQL, [food_id, receiver_id, code, ts, ts, claim_id])
+        return _result(UPDATED, f"Claim #{claim_id} updated.", claim_id=claim_id)
+
+    return _run(work, "reservations.update_claim")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Materialized summary tables for the SQL Queries tab.
+
+The rollup tables hold the per-city, per-provider, per-receiver, per-status
+and per-listing-attribute aggregates that the analytics panels used to
+compute with GROUP BY over full joins. SQLite triggers on providers,
+receivers, food_listings and claims keep them current on every insert,
+update and delete, so the panels read O(groups) rows.
+
+Simple counters are maintained with +/- deltas. Provider and receiver
+rows depend on both listings and claims, so the triggers recompute just
+the affected provider/receiver keys from the base tables (via indexes).
+
+Usage:
+    python rollups.py             # rebuild from scratch, then verify
+    python rollups.py --verify    # only check rollups against base tables
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+import claim_status
+import lookups
+from query_cache import register_derived, bump_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+DIMENSIONS = ["location", "food_name", "provider_type", "food_type", "meal_type"]
+TRIGGER_PREFIX = "trg_rollup_"
+
+
+def completed(alias: str) -> str:
+    return claim_status.is_completed(alias)
+
+
+def completed_claims_of(food_id: str) -> str:
+    return f"(SELECT COUNT(*) FROM claims c WHERE c.food_id = {food_id} AND {completed('c')})"
+
+
+ROLLUP_TABLES = {
+    "rollup_provider_cities": """
+        city            TEXT PRIMARY KEY,
+        providers_count INTEGER NOT NULL DEFAULT 0
+    """,
+    "rollup_receiver_cities": """
+        city            TEXT PRIMARY KEY,
+        receivers_count INTEGER NOT NULL DEFAULT 0
+    """,
+    "rollup_listings": """
+        dimension        TEXT NOT NULL,
+        value            TEXT NOT NULL,
+        listings_count   INTEGER NOT NULL DEFAULT 0,
+        total_quantity   INTEGER NOT NULL DEFAULT 0,
+        completed_claims INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, value)
+    """,
+    "rollup_claim_status": """
+        status_code  INTEGER PRIMARY KEY,
+        claims_count INTEGER NOT NULL DEFAULT 0
+    """,
+    "rollup_providers": """
+        provider_id      INTEGER PRIMARY KEY,
+        listings_count   INTEGER NOT NULL,
+        total_quantity   INTEGER NOT NULL,
+        claims_total     INTEGER NOT NULL,
+        claims_completed INTEGER NOT NULL
+    """,
+    "rollup_receivers": """
+        receiver_id          INTEGER PRIMARY KEY,
+        claims_count         INTEGER NOT NULL,
+        completed_claims     INTEGER NOT NULL,
+        completed_quantity   INTEGER NOT NULL,
+        completed_quantity_n INTEGER NOT NULL
+    """,
+}
+
+# Source tables of each rollup, so cached reads of a rollup are refetched
+# whenever one of its sources is written.
+SOURCES = {
+    "rollup_provider_cities": ["providers"],
+    "rollup_receiver_cities": ["receivers"],
+    "rollup_listings": ["food_listings", "claims"],
+    "rollup_claim_status": ["claims"],
+    "rollup_providers": ["food_listings", "claims"],
+    "rollup_receivers": ["food_listings", "claims"],
+}
+for _table, _sources in SOURCES.items():
+    register_derived(_table, _sources)
+
+# Full recomputation of each rollup from the base tables. Used both to
+# rebuild and to verify.
+PROVIDERS_SELECT = f"""
+    SELECT f.provider_id, COUNT(*), IFNULL(SUM(f.quantity), 0),
+           SUM((SELECT COUNT(*) FROM claims c WHERE c.food_id = f.food_id)),
+           SUM({completed_claims_of("f.food_id")})
+    FROM food_listings f
+    WHERE f.provider_id IS NOT NULL"""
+RECEIVERS_SELECT = f"""
+    SELECT c.receiver_id, COUNT(*),
+           SUM(CASE WHEN {completed('c')} THEN 1 ELSE 0 END),
+           IFNULL(SUM(CASE WHEN {completed('c')} THEN f.quantity END), 0),
+           COUNT(CASE WHEN {completed('c')} THEN f.quantity END)
+    FROM claims c
+    LEFT JOIN food_listings f ON f.food_id = c.food_id
+    WHERE c.receiver_id IS NOT NULL"""
+
+
+def _value(table: str, column: str, alias: str) -> str:
+    """Rollup key of a row: the column's text (decoded from its lookup id), '' for NULL."""
+    return f"IFNULL({lookups.name_of(table, column, alias)}, '')"
+
+
+EXPECTED = {
+    "rollup_provider_cities": f"SELECT {_value('providers', 'city', 'p')}, COUNT(*) FROM providers p "
+                              f"GROUP BY p.{lookups.stored_column('providers', 'city')}",
+    "rollup_receiver_cities": f"SELECT {_value('receivers', 'city', 'r')}, COUNT(*) FROM receivers r "
+                              f"GROUP BY r.{lookups.stored_column('receivers', 'city')}",
+    "rollup_listings": " UNION ALL ".join(f"""
+        SELECT '{dim}', {_value('food_listings', dim, 'f')}, COUNT(*), IFNULL(SUM(f.quantity), 0), IFNULL(SUM(cc.n), 0)
+        FROM food_listings f
+        LEFT JOIN (SELECT food_id, COUNT(*) AS n FROM claims c WHERE {completed('c')} GROUP BY food_id) cc
+               ON cc.food_id = f.food_id
+        GROUP BY f.{lookups.stored_column('food_listings', dim)}""" for dim in DIMENSIONS),
+    "rollup_claim_status": "SELECT status_code, COUNT(*) FROM claims GROUP BY 1",
+    "rollup_providers": PROVIDERS_SELECT + " GROUP BY f.provider_id",
+    "rollup_receivers": RECEIVERS_SELECT + " GROUP BY c.receiver_id",
+}
+
+
+# ---------- Trigger bodies ----------
+# Group rows are created with INSERT ... WHERE NOT EXISTS rather than
+# INSERT OR IGNORE: the conflict clause of the statement that fired the
+# trigger (e.g. the upserts in setup_db --incremental) overrides OR IGNORE.
+def _counter(table: str, key_col: str, count_col: str, key: str, sign: int) -> list:
+    op = "+" if sign > 0 else "-"
+    stmts = []
+    if sign > 0:
+        stmts.append(f"INSERT INTO {table} ({key_col}) SELECT {key} "
+                     f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {key_col} = {key});")
+    stmts.append(f"UPDATE {table} SET {count_col} = {count_col} {op} 1 WHERE {key_col} = {key};")
+    if sign < 0:
+        stmts.append(f"DELETE FROM {table} WHERE {key_col} = {key} AND {count_col} = 0;")
+    return stmts
+
+
+def _listing_delta(row: str, sign: int) -> list:
+    op = "+" if sign > 0 else "-"
+    stmts = []
+    for dim in DIMENSIONS:
+        key = _value("food_listings", dim, row)
+        if sign > 0:
+            stmts.append(f"INSERT INTO rollup_listings (dimension, value) SELECT '{dim}', {key} "
+                         f"WHERE NOT EXISTS (SELECT 1 FROM rollup_listings WHERE dimension = '{dim}' AND value = {key});")
+        stmts.append(
+            f"UPDATE rollup_listings SET listings_count = listings_count {op} 1, "
+            f"total_quantity = total_quantity {op} IFNULL({row}.quantity, 0), "
+            f"completed_claims = completed_claims {op} {completed_claims_of(row + '.food_id')} "
+            f"WHERE dimension = '{dim}' AND value = {key};"
+        )
+        if sign < 0:
+            stmts.append(f"DELETE FROM rollup_listings WHERE dimension = '{dim}' AND value = {key} AND listings_count = 0;")
+    return stmts
+
+
+def _claim_completed_delta(row: str, sign: int) -> list:
+    op = "+" if sign > 0 else "-"
+    return [
+        f"UPDATE rollup_listings SET completed_claims = completed_claims {op} 1 "
+        f"WHERE {completed(row)} AND dimension = '{dim}' "
+        f"AND value = (SELECT {_value('food_listings', dim, 'food_listings')} FROM food_listings "
+        f"WHERE food_id = {row}.food_id);"
+        for dim in DIMENSIONS
+    ]
+
+
+def _refresh_providers(ids: str) -> list:
+    return [
+        f"DELETE FROM rollup_providers WHERE provider_id IN ({ids});",
+        f"INSERT INTO rollup_providers {PROVIDERS_SELECT} AND f.provider_id IN ({ids}) GROUP BY f.provider_id;",
+    ]
+
+
+def _refresh_receivers(ids: str) -> list:
+    return [
+        f"DELETE FROM rollup_receivers WHERE receiver_id IN ({ids});",
+        f"INSERT INTO rollup_receivers {RECEIVERS_SELECT} AND c.receiver_id IN ({ids}) GROUP BY c.receiver_id;",
+    ]
+
+
+def _receivers_of(food_ids: str) -> str:
+    return f"SELECT receiver_id FROM claims WHERE food_id IN ({food_ids})"
+
+
+def _providers_of(food_ids: str) -> str:
+    return f"SELECT provider_id FROM food_listings WHERE food_id IN ({food_ids})"
+
+
+# Columns of food_listings the rollups read; updates to any other column
+# (e.g. the claim-maintained availability state) do not touch the rollups.
+LISTING_COLUMNS = ["food_id", "quantity", "provider_id"] + [lookups.stored_column("food_listings", dim)
+                                                             for dim in DIMENSIONS]
+
+TRIGGERS = {
+    ("providers", "INSERT"): _counter("rollup_provider_cities", "city", "providers_count", _value("providers", "city", "NEW"), +1),
+    ("providers", "DELETE"): _counter("rollup_provider_cities", "city", "providers_count", _value("providers", "city", "OLD"), -1),
+    ("providers", "UPDATE OF city_id"):
+        _counter("rollup_provider_cities", "city", "providers_count", _value("providers", "city", "OLD"), -1)
+        + _counter("rollup_provider_cities", "city", "providers_count", _value("providers", "city", "NEW"), +1),
+
+    ("receivers", "INSERT"): _counter("rollup_receiver_cities", "city", "receivers_count", _value("receivers", "city", "NEW"), +1),
+    ("receivers", "DELETE"): _counter("rollup_receiver_cities", "city", "receivers_count", _value("receivers", "city", "OLD"), -1),
+    ("receivers", "UPDATE OF city_id"):
+        _counter("rollup_receiver_cities", "city", "receivers_count", _value("receivers", "city", "OLD"), -1)
+        + _counter("rollup_receiver_cities", "city", "receivers_count", _value("receivers", "city", "NEW"), +1),
+
+    ("food_listings", "INSERT"):
+        _listing_delta("NEW", +1)
+        + _refresh_providers("NEW.provider_id")
+        + _refresh_receivers(_receivers_of("NEW.food_id")),
+    ("food_listings", "DELETE"):
+        _listing_delta("OLD", -1)
+        + _refresh_providers("OLD.provider_id")
+        + _refresh_receivers(_receivers_of("OLD.food_id")),
+    ("food_listings", f"UPDATE OF {', '.join(LISTING_COLUMNS)}"):
+        _listing_delta("OLD", -1)
+        + _listing_delta("NEW", +1)
+        + _refresh_providers("OLD.provider_id, NEW.provider_id")
+        + _refresh_receivers(_receivers_of("OLD.food_id, NEW.food_id")),
+
+    ("claims", "INSERT"):
+        _counter("rollup_claim_status", "status_code", "claims_count", "NEW.status_code", +1)
+        + _claim_completed_delta("NEW", +1)
+        + _refresh_providers(_providers_of("NEW.food_id"))
+        + _refresh_receivers("NEW.receiver_id"),
+    ("claims", "DELETE"):
+        _counter("rollup_claim_status", "status_code", "claims_count", "OLD.status_code", -1)
+        + _claim_completed_delta("OLD", -1)
+        + _refresh_providers(_providers_of("OLD.food_id"))
+        + _refresh_receivers("OLD.receiver_id"),
+    ("claims", "UPDATE"):
+        _counter("rollup_claim_status", "status_code", "claims_count", "OLD.status_code", -1)
+        + _counter("rollup_claim_status", "status_code", "claims_count", "NEW.status_code", +1)
+        + _claim_completed_delta("OLD", -1)
+        + _claim_completed_delta("NEW", +1)
+        + _refresh_providers(_providers_of("OLD.food_id, NEW.food_id"))
+        + _refresh_receivers("OLD.receiver_id, NEW.receiver_id"),
+}
+
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"{TRIGGER_PREFIX}{table}_{event.split()[0].lower()}"
+
+
+def drop_triggers(conn: sqlite3.Connection):
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", [TRIGGER_PREFIX + "%"])]
+    for name in names:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+
+def create_triggers(conn: sqlite3.Connection):
+    for (table, event), body in TRIGGERS.items():
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {_trigger_name(table, event)} AFTER {event} ON {table} "
+            f"BEGIN\n    " + "\n    ".join(body) + "\nEND;"
+        )
+
+
+def installed(conn: sqlite3.Connection) -> bool:
+    count = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", [TRIGGER_PREFIX + "%"]
+    ).fetchone()[0]
+    return count == len(TRIGGERS)
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recreate the rollup tables from the base tables and (re)install triggers.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    drop_triggers(conn)
+    for table, columns in ROLLUP_TABLES.items():
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+        conn.execute(f"CREATE TABLE {table} ({columns});")
+        conn.execute(f"INSERT INTO {table} {EXPECTED[table]};")
+    create_triggers(conn)
+    bump_versions(conn, list(ROLLUP_TABLES))
+
+
+def verify(conn: sqlite3.Connection) -> dict:
+    """Rows that differ between each rollup and a fresh recomputation."""
+    mismatches = {}
+    for table, expected in EXPECTED.items():
+        expected = f"SELECT * FROM ({expected})"
+        extra = conn.execute(f"SELECT COUNT(*) FROM (SELECT * FROM {table} EXCEPT {expected})").fetchone()[0]
+        missing = conn.execute(f"SELECT COUNT(*) FROM ({expected} EXCEPT SELECT * FROM {table})").fetchone()[0]
+        if extra or missing:
+            mismatches[table] = {"unexpected_rows": extra, "missing_rows": missing}
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild and verify the analytics rollup tables.")
+    parser.add_argument("--verify", action="store_true", help="only verify, do not rebuild")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not args.verify:
+            rebuild(conn)
+            conn.commit()
+            print(f"[OK] Rebuilt {len(ROLLUP_TABLES)} rollup tables and {len(TRIGGERS)} triggers")
+        mismatches = verify(conn)
+    finally:
+        conn.close()
+
+    if mismatches:
+        for table, counts in mismatches.items():
+            print(f"[FAIL] {table}: {counts['unexpected_rows']} unexpected, {counts['missing_rows']} missing rows")
+        sys.exit(1)
+    print("[OK] Rollups match the base tables")
+
+
+if __name__ == "__main__":
+    main()
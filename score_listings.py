@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Score every open food listing with the claim-success model.
+
+An open listing is one whose availability state is Open (no pending or
+completed claim and not expired; see availability.py). All open
+listings are fetched with one query, scored with predict_proba in chunks,
+and the results replace the contents of the `listing_scores` table along
+with the version of the model that produced them.
+
+Usage:
+    python score_listings.py [--chunk-size N]
+"""
+
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+import db
+import lookups
+from availability import is_open
+from model_registry import registry, FEATURES
+
+SCORES_TABLE = "listing_scores"
+CHUNK_SIZE = 50_000
+
+OPEN_LISTINGS_SQL = f"""
+    SELECT f.food_id, {", ".join(f"{lookups.name_of('food_listings', col, 'f')} AS {col}" for col in FEATURES)}
+    FROM food_listings f
+    WHERE {is_open('f')}
+"""
+
+# Scores are kept until the next run, so listings claimed or expired since
+# are skipped before the LIMIT. CROSS JOIN keeps the walk down the
+# probability index (it stops after `limit` open rows), and checking the
+# state in a subquery keeps SQLite from building a Bloom filter over the
+# whole of food_listings for the join.
+AT_RISK_SQL = f"""
+    SELECT s.food_id, f.food_name, f.quantity, f.expiry_date, {lookups.name_of('food_listings', 'location', 'f')} AS location,
+           ROUND(s.probability, 4) AS completion_probability, s.model_version, s.scored_at
+    FROM {SCORES_TABLE} s
+    CROSS JOIN food_listings f ON f.food_id = s.food_id
+    WHERE EXISTS (SELECT 1 FROM food_listings o WHERE o.food_id = s.food_id AND {is_open('o')})
+    ORDER BY s.probability ASC
+    LIMIT ?
+"""
+
+
+def ensure_scores_table(conn: sqlite3.Connection):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {SCORES_TABLE} (
+        food_id       INTEGER PRIMARY KEY,
+        probability   REAL NOT NULL,
+        model_version TEXT NOT NULL,
+        scored_at     TEXT NOT NULL
+    );
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_scores_probability ON {SCORES_TABLE}(probability);")
+
+
+with db.pool.writer() as _conn:
+    ensure_scores_table(_conn)
+
+
+def score_open_listings(chunk_size: int = CHUNK_SIZE) -> dict:
+    """Score all open listings and store the results. Returns a summary."""
+    start = time.perf_counter()
+    entry = registry.current()
+    model = entry["model"]
+    version = f"{entry['trained_at']}/{entry['fingerprint'][:8]}"
+    scored_at = datetime.now().isoformat(timespec="seconds")
+
+    listings = db.run_query(OPEN_LISTINGS_SQL, compact_frame=True)
+    X = listings[FEATURES].copy()
+    X["quantity"] = X["quantity"].fillna(0)
+
+    rows = []
+    for lo in range(0, len(X), chunk_size):
+        probs = model.predict_proba(X.iloc[lo:lo + chunk_size])[:, 1]
+        ids = listings["food_id"].iloc[lo:lo + chunk_size]
+        rows.extend(zip(ids.astype(int).tolist(), probs.tolist()))
+
+    def work(conn):
+        conn.execute(f"DELETE FROM {SCORES_TABLE}")
+        conn.executemany(
+            f"INSERT INTO {SCORES_TABLE} (food_id, probability, model_version, scored_at) VALUES (?, ?, ?, ?)",
+            [(food_id, prob, version, scored_at) for food_id, prob in rows],
+        )
+
+    db.write_transaction(work, [SCORES_TABLE], "score listings")
+
+    return {
+        "scored": len(rows),
+        "model_version": version,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def at_risk_listings(limit: int = 100):
+    """Open listings least likely to be claimed, lowest probability first."""
+    return db.run_query(AT_RISK_SQL, [int(limit)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    summary = score_open_listings(args.chunk_size)
+    print(f"[OK] Scored {summary['scored']} open listings with model {summary['model_version']} "
+          f"in {summary['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
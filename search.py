@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Full-text search over food listings and their providers.
+
+`listings_fts` is an FTS5 table with one row per listing (rowid = food_id)
+holding the listing's food_name and location and its provider's name,
+address and city. Triggers on food_listings and providers keep it in sync,
+so results reflect CRUD edits immediately.
+
+Every word of a search must match; the last one is prefix-matched so
+results appear while typing ("rice kelly" finds Rice in Kellytown).
+Results are ranked with bm25, weighting food name and location above
+provider details. Ranking is limited to the newest RANK_WINDOW matches,
+which keeps broad searches such as "rice" (a tenth of all listings) from
+scoring every match; narrower searches are ranked in full.
+
+Usage:
+    python search.py                    # rebuild the index
+    python search.py rice near kellyville
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+
+import lookups
+from query_cache import register_derived, bump_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+FTS_TABLE = "listings_fts"
+TRIGGER_PREFIX = "trg_search_"
+RANK_WINDOW = 500
+
+# FTS column -> source expression, and its bm25 weight
+FTS_COLUMNS = {
+    "food_name": ("f.food_name", 10.0),
+    "location": (lookups.name_of("food_listings", "location", "f"), 5.0),
+    "provider_name": ("p.name", 3.0),
+    "provider_address": ("p.address", 1.0),
+    "provider_city": (lookups.name_of("providers", "city", "p"), 2.0),
+}
+
+# Filler words in free-text queries such as "rice near Kellyville"
+STOPWORDS = {"a", "an", "and", "at", "by", "for", "from", "in", "near", "of", "the", "with"}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+register_derived(FTS_TABLE, ["food_listings", "providers"])
+
+SEARCH_SQL = f"""
+    SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, f.location,
+           f.food_type, f.meal_type, p.name AS provider_name, hits.match
+    FROM (
+        SELECT rowid AS food_id,
+               bm25({FTS_TABLE}, {", ".join(str(w) for _, w in FTS_COLUMNS.values())}) AS score,
+               snippet({FTS_TABLE}, -1, '[', ']', '…', 8) AS match
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH ?
+        ORDER BY rowid DESC
+        LIMIT {RANK_WINDOW}
+    ) hits
+    JOIN {lookups.VIEWS["food_listings"]} f ON f.food_id = hits.food_id
+    LEFT JOIN providers p ON p.provider_id = f.provider_id
+    ORDER BY hits.score
+    LIMIT ?
+"""
+
+
+def _index(where: str) -> list:
+    """Statements (re)indexing the listings selected by `where`."""
+    return [
+        f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT f.food_id FROM food_listings f WHERE {where});",
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"SELECT f.food_id, {', '.join(expr for expr, _ in FTS_COLUMNS.values())} "
+        f"FROM food_listings f LEFT JOIN providers p ON p.provider_id = f.provider_id WHERE {where};",
+    ]
+
+
+TRIGGERS = {
+    ("food_listings", "INSERT"): _index("f.food_id = NEW.food_id"),
+    ("food_listings", "DELETE"): [f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.food_id;"],
+    ("food_listings", "UPDATE OF food_id, food_name, location_id, provider_id"):
+        [f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.food_id;"] + _index("f.food_id = NEW.food_id"),
+    ("providers", "INSERT"): _index("f.provider_id = NEW.provider_id"),
+    ("providers", "DELETE"): _index("f.provider_id = OLD.provider_id"),
+    ("providers", "UPDATE OF provider_id, name, address, city_id"):
+        _index("f.provider_id IN (OLD.provider_id, NEW.provider_id)"),
+}
+
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"{TRIGGER_PREFIX}{table}_{event.split()[0].lower()}"
+
+
+def installed(conn: sqlite3.Connection) -> bool:
+    count = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", [TRIGGER_PREFIX + "%"]
+    ).fetchone()[0]
+    return count == len(TRIGGERS)
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recreate the search index from the base tables and (re)install triggers.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    for (table, event) in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, event)};")
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE};")
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(FTS_COLUMNS)}, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3');"
+    )
+    for stmt in _index("1"):
+        conn.execute(stmt)
+    conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize');")
+    for (table, event), body in TRIGGERS.items():
+        conn.execute(
+            f"CREATE TRIGGER {_trigger_name(table, event)} AFTER {event} ON {table} "
+            f"BEGIN\n    " + "\n    ".join(body) + "\nEND;"
+        )
+    bump_versions(conn, [FTS_TABLE])
+
+
+def match_expression(text: str) -> str:
+    """FTS5 query for free text: all words required, the last one as a prefix,
+    filler words dropped. Returns "" when the text has no searchable words.
+    """
+    words = _TOKEN_RE.findall(text.lower())
+    words = [w for w in words if w not in STOPWORDS] or words
+    return " ".join([f'"{w}"' for w in words[:-1]] + [f'"{w}"*' for w in words[-1:]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or query the listings search index.")
+    parser.add_argument("text", nargs="*", help="search text (omit to rebuild the index)")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not args.text:
+            rebuild(conn)
+            conn.commit()
+            count = conn.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}").fetchone()[0]
+            print(f"[OK] Indexed {count} listings into {FTS_TABLE}")
+            return
+        rows = conn.execute(SEARCH_SQL, [match_expression(" ".join(args.text)), args.limit]).fetchall()
+    finally:
+        conn.close()
+    for row in rows:
+        print(f"{row[0]:>8}  {row[1]:<12} {row[4]:<20} {row[-1]}")
+    print(f"[OK] {len(rows)} results")
+
+
+if __name__ == "__main__":
+    main()
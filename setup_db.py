@@ -1,114 +1,529 @@
 #!/usr/bin/env python3
 """
-Setup SQLite database 'food.db' and load CSVs.
+Setup SQLite database 'food.db' (or $FOOD_DB_PATH) and load CSVs.
 
-Expected CSVs in the current directory:
+Expected CSVs in the current directory (or the one given with --csv-dir):
 - providers_data.csv
 - receivers_data.csv
 - food_listings_data.csv
 - claims_data.csv
+
+By default the tables are rebuilt from scratch. With --incremental the CSVs
+are streamed in chunks and upserted by primary key; files whose checksum is
+unchanged since the last run are skipped, and files that only had rows
+appended are read from where the previous run stopped.
+
+Cities and provider/food/meal types are stored as ids into lookup tables
+(see lookups.py). --migrate converts a database created with the older
+text columns in place; --incremental does the same before loading.
 """
 
+import argparse
+import hashlib
+import json
 import os
 import sqlite3
+import time
+from datetime import datetime
+
 import pandas as pd
 
-DB_PATH = "food.db"
+import availability
+import claim_status
+import lookups
+import rollups
+import search
+import timeseries
+from query_cache import ensure_versions_table, bump_versions
 
-def create_schema(conn: sqlite3.Connection):
-    cur = conn.cursor()
-    # Enable FK
-    cur.execute("PRAGMA foreign_keys = ON;")
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS providers (
+# Date columns: source CSV format, ISO-8601 storage format, epoch column
+DATE_COLUMNS = {
+    "expiry_date": ("%m/%d/%Y", "%Y-%m-%d", "expiry_epoch"),
+    "timestamp": ("%m/%d/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "timestamp_epoch"),
+}
+
+# Parent tables first, so foreign keys are satisfied while loading
+TABLES = ["providers", "receivers", "food_listings", "claims"]
+PRIMARY_KEYS = {
+    "providers": "provider_id",
+    "receivers": "receiver_id",
+    "food_listings": "food_id",
+    "claims": "claim_id",
+}
+# table -> {(column, parent table, parent column)}
+FOREIGN_KEYS = {
+    "providers": {("type_id", "provider_types", "id"), ("city_id", "cities", "id")},
+    "receivers": {("city_id", "cities", "id")},
+    "food_listings": {("provider_id", "providers", "provider_id"),
+                      ("provider_type_id", "provider_types", "id"), ("location_id", "cities", "id"),
+                      ("food_type_id", "food_types", "id"), ("meal_type_id", "meal_types", "id"),
+                      ("availability", availability.LOOKUP_TABLE, "state_code")},
+    "claims": {("food_id", "food_listings", "food_id"), ("receiver_id", "receivers", "receiver_id"),
+               ("status_code", claim_status.LOOKUP_TABLE, "status_code")},
+}
+# Columns of the tables whose cities and types are lookup ids (see
+# lookups.py); also used to rebuild them in migrate_dimensions()
+ENCODED_TABLES = {
+    "providers": """
         provider_id    INTEGER PRIMARY KEY,
         name           TEXT NOT NULL,
-        type           TEXT,
+        type_id        INTEGER,
         address        TEXT,
-        city           TEXT,
-        contact        TEXT
-    );
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS receivers (
+        city_id        INTEGER,
+        contact        TEXT,
+        FOREIGN KEY (type_id) REFERENCES provider_types(id),
+        FOREIGN KEY (city_id) REFERENCES cities(id)
+    """,
+    "receivers": """
         receiver_id INTEGER PRIMARY KEY,
         name        TEXT NOT NULL,
         type        TEXT,
-        city        TEXT,
-        contact     TEXT
-    );
-    """)
+        city_id     INTEGER,
+        contact     TEXT,
+        FOREIGN KEY (city_id) REFERENCES cities(id)
+    """,
+    "food_listings": f"""
+        food_id          INTEGER PRIMARY KEY,
+        food_name        TEXT NOT NULL,
+        quantity         INTEGER,
+        expiry_date      TEXT,
+        expiry_epoch     INTEGER,
+        provider_id      INTEGER,
+        provider_type_id INTEGER,
+        location_id      INTEGER,
+        food_type_id     INTEGER,
+        meal_type_id     INTEGER,
+        created_epoch    INTEGER,
+        availability     INTEGER NOT NULL DEFAULT {availability.OPEN}
+                         CHECK (availability IN ({", ".join(str(code) for code in availability.STATES)})),
+        FOREIGN KEY (provider_id) REFERENCES providers(provider_id),
+        FOREIGN KEY (provider_type_id) REFERENCES provider_types(id),
+        FOREIGN KEY (location_id) REFERENCES cities(id),
+        FOREIGN KEY (food_type_id) REFERENCES food_types(id),
+        FOREIGN KEY (meal_type_id) REFERENCES meal_types(id),
+        FOREIGN KEY (availability) REFERENCES {availability.LOOKUP_TABLE}(state_code)
+    """,
+}
+BATCH_SIZE = 10_000
+INGEST_TABLE = "ingest_files"
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS food_listings (
-        food_id       INTEGER PRIMARY KEY,
-        food_name     TEXT NOT NULL,
-        quantity      INTEGER,
-        expiry_date   TEXT,
-        provider_id   INTEGER,
-        provider_type TEXT,
-        location      TEXT,
-        food_type     TEXT,
-        meal_type     TEXT,
-        FOREIGN KEY (provider_id) REFERENCES providers(provider_id)
-    );
-    """)
+def drop_tables(conn: sqlite3.Connection):
+    # Tables created by older versions of this script (via DataFrame.to_sql)
+    # have no keys, so they are always recreated from the declared schema.
+    conn.execute(f"DROP VIEW IF EXISTS {claim_status.VIEW};")
+    lookups.drop_views(conn)
+    for table in reversed(TABLES):
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+    for lookup in lookups.LOOKUPS:
+        conn.execute(f"DROP TABLE IF EXISTS {lookup};")
+    conn.commit()
 
-    cur.execute("""
+def create_schema(conn: sqlite3.Connection):
+    cur = conn.cursor()
+    # Enable FK
+    cur.execute("PRAGMA foreign_keys = ON;")
+
+    # Cities and types are stored as ids into lookup tables (see lookups.py);
+    # availability is a small-integer code maintained by triggers on claims
+    lookups.create_lookups(conn)
+    availability.create_lookup(conn)
+    for table, columns in ENCODED_TABLES.items():
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns});")
+
+    # Claim status is a small-integer code; names live in claim_statuses
+    claim_status.create_lookup(conn)
+    codes = ", ".join(str(code) for code in claim_status.STATUSES)
+    cur.execute(f"""
     CREATE TABLE IF NOT EXISTS claims (
         claim_id   INTEGER PRIMARY KEY,
         food_id    INTEGER,
         receiver_id INTEGER,
-        status     TEXT,
+        status_code INTEGER NOT NULL CHECK (status_code IN ({codes})),
         timestamp  TEXT,
+        timestamp_epoch INTEGER,
         FOREIGN KEY (food_id) REFERENCES food_listings(food_id),
-        FOREIGN KEY (receiver_id) REFERENCES receivers(receiver_id)
+        FOREIGN KEY (receiver_id) REFERENCES receivers(receiver_id),
+        FOREIGN KEY (status_code) REFERENCES {claim_status.LOOKUP_TABLE}(status_code)
     );
     """)
+    claim_status.create_view(conn)
+    lookups.create_views(conn)
+
+    # Checksums of ingested CSVs, used by incremental loads
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {INGEST_TABLE} (
+        csv_path    TEXT PRIMARY KEY,
+        table_name  TEXT NOT NULL,
+        size        INTEGER NOT NULL,
+        sha256      TEXT NOT NULL,
+        ingested_at TEXT NOT NULL
+    );
+    """)
+
+    # Per-table versions used by the app's query cache
+    ensure_versions_table(conn)
     conn.commit()
 
-def load_csv_to_table(conn: sqlite3.Connection, csv_path: str, table_name: str):
-    if not os.path.exists(csv_path):
-        print(f"[WARN] CSV not found: {csv_path}. Skipping.")
-        return
-    df = pd.read_csv(csv_path)
+def normalize_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Rewrite known date columns as ISO-8601 text plus an integer epoch column."""
+    for col, (src_fmt, iso_fmt, epoch_col) in DATE_COLUMNS.items():
+        if col not in df.columns:
+            continue
+        parsed = pd.to_datetime(df[col], format=src_fmt, errors="coerce")
+        # Fall back to per-value parsing only for rows not in the expected format
+        missed = parsed.isna() & df[col].notna()
+        if missed.any():
+            parsed[missed] = pd.to_datetime(df.loc[missed, col], format="mixed", errors="coerce")
+        df[col] = parsed.dt.strftime(iso_fmt)
+        df[epoch_col] = ((parsed - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).astype("Int64")
+    return df
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [c.strip().lower() for c in df.columns]
 
     # Basic cleanup: strip strings, unify city casing
-    for col in df.select_dtypes(include="object").columns:
+    for col in df.select_dtypes(include=["object", "string"]).columns:
         df[col] = df[col].astype(str).str.strip()
 
     if "city" in df.columns:
         df["city"] = df["city"].str.title()
 
-    # Write
-    df.to_sql(table_name, conn, if_exists="replace", index=False)
+    if "status" in df.columns:
+        df["status_code"] = claim_status.normalize(df["status"])
+
+    return normalize_dates(df)
+
+def table_columns(conn: sqlite3.Connection, table_name: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+def as_rows(df: pd.DataFrame):
+    """DataFrame rows as tuples of Python values, with NaN/NA as None."""
+    df = df.astype(object)
+    return df.where(df.notna(), None).itertuples(index=False, name=None)
+
+def hash_file(csv_path: str, prefix_len: int = None) -> tuple:
+    """(sha256 of the file, sha256 of its first prefix_len bytes or None)."""
+    full, prefix, seen = hashlib.sha256(), None, 0
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            if prefix_len is not None and prefix is None and seen + len(block) >= prefix_len:
+                full.update(block[:prefix_len - seen])
+                prefix = full.copy()
+                full.update(block[prefix_len - seen:])
+            else:
+                full.update(block)
+            seen += len(block)
+    return full.hexdigest(), prefix.hexdigest() if prefix else None
+
+def record_file(conn: sqlite3.Connection, csv_path: str, table_name: str, sha256: str = None):
+    if sha256 is None:
+        sha256, _ = hash_file(csv_path)
+    conn.execute(
+        f"INSERT INTO {INGEST_TABLE} (csv_path, table_name, size, sha256, ingested_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(csv_path) DO UPDATE SET table_name=excluded.table_name, size=excluded.size, "
+        "sha256=excluded.sha256, ingested_at=excluded.ingested_at",
+        [csv_path, table_name, os.path.getsize(csv_path), sha256, datetime.now().isoformat(timespec="seconds")],
+    )
+
+def load_csv_to_table(conn: sqlite3.Connection, csv_path: str, table_name: str):
+    if not os.path.exists(csv_path):
+        print(f"[WARN] CSV not found: {csv_path}. Skipping.")
+        return
+    df = lookups.encode(conn, table_name, clean_frame(pd.read_csv(csv_path)))
+
+    # Append into the declared schema (only the columns it defines)
+    columns = table_columns(conn, table_name)
+    df = df[[c for c in columns if c in df.columns]]
+    insert = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})"
+    for lo in range(0, len(df), BATCH_SIZE):
+        conn.executemany(insert, as_rows(df.iloc[lo:lo + BATCH_SIZE]))
+    record_file(conn, csv_path, table_name)
     print(f"[OK] Loaded {len(df)} rows into {table_name}")
 
+def upsert_csv_to_table(conn: sqlite3.Connection, csv_path: str, table_name: str, chunk_size: int = BATCH_SIZE) -> dict:
+    """Stream a CSV into its table by primary key, in one transaction per file.
+
+    Returns counts of rows inserted, updated and unchanged, plus timing.
+    """
+    stats = {"table": table_name, "inserted": 0, "updated": 0, "unchanged": 0, "seconds": 0.0, "file_skipped": False}
+    if not os.path.exists(csv_path):
+        print(f"[WARN] CSV not found: {csv_path}. Skipping.")
+        return stats
+    start = time.perf_counter()
+
+    prev = conn.execute(f"SELECT size, sha256 FROM {INGEST_TABLE} WHERE csv_path = ?", [csv_path]).fetchone()
+    size = os.path.getsize(csv_path)
+    sha256, prefix_sha = hash_file(csv_path, prev[0] if prev and prev[0] < size else None)
+    if prev and prev[1] == sha256:
+        stats["file_skipped"] = True
+        return stats
+
+    # Pure append since the last run: resume at the previous end of file,
+    # which is a row boundary if the old file ended with a newline.
+    offset = 0
+    if prev and prefix_sha == prev[1]:
+        with open(csv_path, "rb") as f:
+            f.seek(prev[0] - 1)
+            if f.read(1) == b"\n":
+                offset = prev[0]
+
+    pk = PRIMARY_KEYS[table_name]
+    columns = table_columns(conn, table_name)
+    header = pd.read_csv(csv_path, nrows=0).columns
+    try:
+        with open(csv_path, "rb") as f:
+            f.seek(offset)
+            if offset:
+                reader = pd.read_csv(f, header=None, names=header, chunksize=chunk_size)
+            else:
+                reader = pd.read_csv(f, chunksize=chunk_size)
+            for chunk in reader:
+                chunk = lookups.encode(conn, table_name, clean_frame(chunk))
+                chunk = chunk[[c for c in columns if c in chunk.columns]]
+                chunk = chunk[chunk[pk].notna()]
+                cols = list(chunk.columns)
+                updates = [c for c in cols if c != pk]
+                upsert = (
+                    f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                    f"ON CONFLICT({pk}) DO UPDATE SET {', '.join(f'{c}=excluded.{c}' for c in updates)} "
+                    f"WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in updates)}"
+                )
+
+                ids = json.dumps(chunk[pk].astype("int64").tolist())
+                existing = conn.execute(
+                    f"SELECT COUNT(*) FROM {table_name} WHERE {pk} IN (SELECT value FROM json_each(?))", [ids]
+                ).fetchone()[0]
+                # rowcount excludes rows written by the rollup triggers
+                changed = conn.executemany(upsert, as_rows(chunk)).rowcount
+
+                inserted = len(chunk) - existing
+                stats["inserted"] += inserted
+                stats["updated"] += changed - inserted
+                stats["unchanged"] += existing - (changed - inserted)
+    except pd.errors.EmptyDataError:
+        pass
+
+    record_file(conn, csv_path, table_name, sha256)
+    conn.commit()
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
 def add_indexes(conn: sqlite3.Connection):
     cur = conn.cursor()
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_providers_city ON providers(city);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_receivers_city ON receivers(city);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_provider ON food_listings(provider_id);")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_location ON food_listings(location);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_providers_city ON providers(city_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_receivers_city ON receivers(city_id);")
+    # Type-ahead receiver pickers: LIKE 'prefix%' is case-insensitive, so the
+    # index must be NOCASE for SQLite to turn it into a range search.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_receivers_name ON receivers(name COLLATE NOCASE);")
+    # Data Filtering combines equality filters on location, provider_id,
+    # food_type and meal_type (as lookup ids). Every combination has an index
+    # whose leading columns match: the selective provider_id/location filters
+    # lead, and the low-cardinality food_type/meal_type follow. They also
+    # cover COUNT(*).
+    cur.execute("DROP INDEX IF EXISTS idx_food_provider;")
+    cur.execute("DROP INDEX IF EXISTS idx_food_location;")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_provider_filters ON food_listings(provider_id, food_type_id, meal_type_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_location_filters ON food_listings(location_id, food_type_id, meal_type_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_type_meal ON food_listings(food_type_id, meal_type_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_meal ON food_listings(meal_type_id);")
+    # Sort keys of the Data Filtering pages (listings.SORTS); the rowid
+    # (food_id) breaks ties, so keyset pages are index range reads
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_name ON food_listings(food_name);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_quantity ON food_listings(quantity);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_location_sort ON food_listings(location_id);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_food ON claims(food_id);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_receiver ON claims(receiver_id);")
-    conn.commit()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_food_expiry ON food_listings(expiry_date);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_timestamp ON claims(timestamp);")
+    # Partial indexes over the claims the analytics actually read: joins on
+    # completed claims, and the active-claim probes of the availability
+    # triggers and claim reservation, touch only the matching rows.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_completed_food ON claims(food_id) "
+                f"WHERE {claim_status.is_completed()};")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_completed_receiver ON claims(receiver_id) "
+                f"WHERE {claim_status.is_completed()};")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_claims_active_food ON claims(food_id, status_code) "
+                f"WHERE {claim_status.is_active()};")
+    # Open listings only: available-food pickers and scoring read this set
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_food_open ON food_listings(food_id) WHERE {availability.is_open()};")
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
+def analyze(conn: sqlite3.Connection):
+    # Planner statistics; analysis_limit keeps ANALYZE fast on large tables
+    conn.execute("PRAGMA analysis_limit = 1000;")
+    conn.execute("ANALYZE;")
+
+def verify_schema(conn: sqlite3.Connection):
+    """Raise RuntimeError unless the declared primary and foreign keys are in place."""
+    problems = []
+    for table, pk in PRIMARY_KEYS.items():
+        plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM {table} WHERE {pk} = 1"))
+        if "INTEGER PRIMARY KEY" not in plan:
+            problems.append(f"{table}.{pk} is not a rowid-aliased INTEGER PRIMARY KEY ({plan})")
+    for table, expected in FOREIGN_KEYS.items():
+        actual = {(row[3], row[2], row[4]) for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+        for column, parent, parent_column in sorted(expected - actual):
+            problems.append(f"missing foreign key {table}.{column} -> {parent}.{parent_column}")
+    for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check"):
+        problems.append(f"{table} row {rowid} references a missing {parent} row")
+    if problems:
+        raise RuntimeError("Schema verification failed:\n  " + "\n  ".join(problems[:20]))
+    print("[OK] Verified primary keys and foreign keys")
+
+def full_load(conn: sqlite3.Connection, csv_dir: str = "."):
+    drop_tables(conn)
     create_schema(conn)
 
-    load_csv_to_table(conn, "providers_data.csv", "providers")
-    load_csv_to_table(conn, "receivers_data.csv", "receivers")
-    load_csv_to_table(conn, "food_listings_data.csv", "food_listings")
-    load_csv_to_table(conn, "claims_data.csv", "claims")
+    # Load everything in one transaction; indexes are built after the data
+    try:
+        for table in TABLES:
+            load_csv_to_table(conn, os.path.join(csv_dir, f"{table}_data.csv"), table)
+        add_indexes(conn)
+        analyze(conn)
+        verify_schema(conn)
 
+        # Derived state is computed once after the bulk load; triggers keep
+        # it current from here on.
+        availability.rebuild(conn)
+        rollups.rebuild(conn)
+        search.rebuild(conn)
+        timeseries.backfill_created(conn)
+        timeseries.rebuild(conn)
+
+        # Invalidate anything a running app has cached for the reloaded tables
+        bump_versions(conn, TABLES)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def migrate_dimensions(conn: sqlite3.Connection) -> bool:
+    """Convert a database with text city/type columns to lookup ids, in place.
+
+    The encoded tables are copied into the new schema, with every distinct
+    name added to its lookup table, and the derived state (availability,
+    rollups, search index, time series) and its triggers are rebuilt.
+    Returns False if the database already uses lookup ids.
+    """
+    if "location" not in table_columns(conn, "food_listings"):
+        return False
+    conn.commit()
+    # The tables are replaced under their children's foreign keys; checked at the end
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        # All triggers are derived state, and some read the old columns
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            conn.execute(f"DROP TRIGGER {name};")
+        conn.execute(f"DROP VIEW IF EXISTS {claim_status.VIEW};")
+        lookups.drop_views(conn)
+        lookups.create_lookups(conn)
+        for table, encoded in lookups.ENCODED.items():
+            for column, lookup in encoded.items():
+                conn.execute(f"INSERT OR IGNORE INTO {lookup} (name) SELECT DISTINCT {column} FROM {table} "
+                             f"WHERE TRIM(IFNULL({column}, '')) <> ''")
+            old_columns = table_columns(conn, table)
+            conn.execute(f"CREATE TABLE {table}_new ({ENCODED_TABLES[table]});")
+            sources = {lookups.id_column(column): lookups.id_of(table, column, f"o.{column}") for column in encoded}
+            columns = table_columns(conn, f"{table}_new")
+            exprs = [sources.get(c) or (f"o.{c}" if c in old_columns else "NULL") for c in columns]
+            conn.execute(f"INSERT INTO {table}_new ({', '.join(columns)}) SELECT {', '.join(exprs)} FROM {table} o;")
+            conn.execute(f"DROP TABLE {table};")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table};")
+
+        create_schema(conn)
+        add_indexes(conn)
+        availability.rebuild(conn)
+        rollups.rebuild(conn)
+        search.rebuild(conn)
+        timeseries.rebuild(conn)
+        analyze(conn)
+        verify_schema(conn)
+        bump_versions(conn, TABLES + lookups.LOOKUPS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
+    return True
+
+def incremental_load(conn: sqlite3.Connection, chunk_size: int = BATCH_SIZE, csv_dir: str = "."):
+    if migrate_dimensions(conn):
+        print("[OK] Migrated cities and types to lookup tables")
+    create_schema(conn)
+    if "status_code" not in table_columns(conn, "claims"):
+        raise RuntimeError("claims uses the old text status column; run a full rebuild (python setup_db.py) first")
+    if "availability" not in table_columns(conn, "food_listings"):
+        raise RuntimeError("food_listings has no availability column; run a full rebuild (python setup_db.py) first")
+    if not availability.installed(conn):
+        availability.rebuild(conn)
+        conn.commit()
+    if not rollups.installed(conn):
+        rollups.rebuild(conn)
+        conn.commit()
+    if not search.installed(conn):
+        search.rebuild(conn)
+        conn.commit()
+    if "created_epoch" not in table_columns(conn, "food_listings"):
+        raise RuntimeError("food_listings has no created_epoch column; run a full rebuild (python setup_db.py) first")
+    if not timeseries.installed(conn):
+        timeseries.rebuild(conn)
+        conn.commit()
+    changed = []
+    for table in TABLES:
+        csv_path = os.path.join(csv_dir, f"{table}_data.csv")
+        try:
+            stats = upsert_csv_to_table(conn, csv_path, table, chunk_size)
+        except Exception:
+            conn.rollback()
+            raise
+        if stats["file_skipped"]:
+            print(f"[SKIP] {csv_path} unchanged since last ingest")
+            continue
+        rows = stats["inserted"] + stats["updated"] + stats["unchanged"]
+        rate = rows / stats["seconds"] if stats["seconds"] else 0
+        print(f"[OK] {table}: {stats['inserted']} inserted, {stats['updated']} updated, "
+              f"{stats['unchanged']} unchanged ({rate:,.0f} rows/s)")
+        if stats["inserted"] or stats["updated"]:
+            changed.append(table)
+
+    if {"food_listings", "claims"} & set(changed):
+        timeseries.backfill_created(conn)
     add_indexes(conn)
-    conn.close()
-    print("[DONE] Database ready at food.db")
+    if changed:
+        analyze(conn)
+        bump_versions(conn, changed)
+    conn.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create food.db and load the CSVs.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upsert changed CSVs in chunks instead of rebuilding the tables")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE,
+                        help="rows per chunk for --incremental (default: %(default)s)")
+    parser.add_argument("--migrate", action="store_true",
+                        help="convert an existing database's city/type text columns to lookup tables, keeping its rows")
+    parser.add_argument("--csv-dir", default=".", help="directory holding the CSVs (default: current directory)")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if args.migrate:
+            before = os.path.getsize(DB_PATH)
+            if not migrate_dimensions(conn):
+                print("[SKIP] Cities and types already use lookup tables")
+                return
+            conn.execute("VACUUM;")
+            print(f"[OK] Migrated cities and types to lookup tables: "
+                  f"{before / 2**20:.2f} MB -> {os.path.getsize(DB_PATH) / 2**20:.2f} MB")
+        elif args.incremental:
+            incremental_load(conn, args.chunk_size, args.csv_dir)
+        else:
+            full_load(conn, args.csv_dir)
+    finally:
+        conn.close()
+    print(f"[DONE] Database ready at {DB_PATH}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshots of the base tables for analytics.
+
+export() copies food_listings, claims, providers and receivers from one
+consistent SQLite read transaction into zstd-compressed Parquet files,
+with the low-cardinality text columns (cities, types, food names) stored
+as dictionary-encoded categoricals. Tables with lookup-encoded columns
+are read through their views (see lookups.py), so the files keep the
+original column names and values. Files are written next to each other
+under a new directory and published by renaming a manifest into place,
+so readers never see half a snapshot. The manifest records when the
+snapshot was taken and the table versions it reflects.
+
+load() memory-maps the files of the current snapshot; analytics.py runs
+its aggregations on them in process, off the SQLite file.
+
+Run it periodically (cron, or --every) to keep the snapshot fresh.
+
+Usage:
+    python snapshot.py               # write one snapshot
+    python snapshot.py --every 300   # write one every 5 minutes until interrupted
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lookups import VIEWS
+from query_cache import read_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+SNAPSHOT_DIR = os.environ.get("FOOD_SNAPSHOT_DIR", "snapshots")
+MANIFEST = "manifest.json"
+COMPRESSION = "zstd"
+BATCH_ROWS = 100_000
+KEEP = 2  # snapshot directories kept on disk (the current one and the one before)
+
+TABLES = ["providers", "receivers", "food_listings", "claims"]
+CATEGORICAL = {
+    "providers": ["type", "city"],
+    "receivers": ["type", "city"],
+    "food_listings": ["food_name", "provider_type", "location", "food_type", "meal_type"],
+    "claims": [],
+}
+SQLITE_TYPES = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+
+_loaded = {}  # snapshot id -> {table: pa.Table}
+_loaded_lock = threading.Lock()
+
+
+def _source(table: str) -> str:
+    return VIEWS.get(table, table)
+
+
+def _schema(conn: sqlite3.Connection, table: str) -> pa.Schema:
+    fields = []
+    for _, name, decl, *_ in conn.execute(f"PRAGMA table_info({_source(table)})"):
+        type_ = SQLITE_TYPES.get(decl.upper(), pa.string())
+        if name in CATEGORICAL[table]:
+            type_ = pa.dictionary(pa.int32(), pa.string())
+        fields.append(pa.field(name, type_))
+    return pa.schema(fields)
+
+
+def _export_table(conn: sqlite3.Connection, table: str, path: str) -> int:
+    schema = _schema(conn, table)
+    plain = pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type)
+                       for f in schema])
+    cursor = conn.execute(f"SELECT {', '.join(schema.names)} FROM {_source(table)}")
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                break
+            columns = [pa.array(values, type=f.type) for values, f in zip(zip(*batch), plain)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=plain).cast(schema))
+            rows += len(batch)
+    return rows
+
+
+def export(db_path: str = DB_PATH, out_dir: str = SNAPSHOT_DIR) -> dict:
+    """Write a snapshot of TABLES and publish it; returns its manifest."""
+    snapshot_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    target = os.path.join(out_dir, snapshot_id)
+    os.makedirs(target)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("BEGIN")  # one read transaction: all tables from the same commit
+        manifest = {"id": snapshot_id, "exported_at": datetime.now().isoformat(timespec="seconds"),
+                    "versions": read_versions(conn), "tables": {}}
+        for table in TABLES:
+            path = os.path.join(target, f"{table}.parquet")
+            rows = _export_table(conn, table, path)
+            manifest["tables"][table] = {"file": os.path.join(snapshot_id, f"{table}.parquet"), "rows": rows,
+                                         "bytes": os.path.getsize(path)}
+        conn.rollback()
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    _prune(out_dir)
+    return manifest
+
+
+def _prune(out_dir: str):
+    dirs = sorted(d for d in os.listdir(out_dir) if os.path.isdir(os.path.join(out_dir, d)))
+    for old in dirs[:-KEEP]:
+        shutil.rmtree(os.path.join(out_dir, old), ignore_errors=True)
+
+
+def manifest(out_dir: str = SNAPSHOT_DIR) -> dict:
+    """The current snapshot's manifest, or None if none has been written."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load(out_dir: str = SNAPSHOT_DIR) -> tuple:
+    """(manifest, {table: memory-mapped pa.Table}) of the current snapshot, or (None, None)."""
+    current = manifest(out_dir)
+    if current is None:
+        return None, None
+    with _loaded_lock:
+        tables = _loaded.get(current["id"])
+        if tables is None:
+            tables = {table: pq.read_table(os.path.join(out_dir, info["file"]), memory_map=True)
+                      for table, info in current["tables"].items()}
+            _loaded.clear()  # keep only the current snapshot in memory
+            _loaded[current["id"]] = tables
+    return current, tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the base tables to a Parquet snapshot.")
+    parser.add_argument("--every", type=float, help="repeat every this many seconds")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="snapshot directory (default: %(default)s)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    while True:
+        start = time.perf_counter()
+        written = export(DB_PATH, args.out)
+        sizes = ", ".join(f"{table} {info['rows']:,} rows / {info['bytes'] / 1024:,.0f} KB"
+                          for table, info in written["tables"].items())
+        print(f"[OK] Snapshot {written['id']} in {time.perf_counter() - start:.2f}s: {sizes}")
+        if not args.every:
+            break
+        time.sleep(args.every)
+    print(f"[DONE] Current snapshot: {os.path.join(args.out, MANIFEST)}")
+
+
+if __name__ == "__main__":
+    main()
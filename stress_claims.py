@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for claim reservation.
+
+Copies food.db to a scratch directory, adds copies of existing listings
+until --listings of them have no active claim, and starts --writers separate processes (each with its own
+connections, like separate app servers) that all try to claim random
+listings from that set at the same moment through
+reservations.reserve_claim. Afterwards it checks that no listing gained
+more than one active claim and that every RESERVED result matches a row,
+and reports claims/sec.
+
+--sessions runs the writers as threads of one process instead, like
+concurrent sessions of one Streamlit server sharing its group-commit
+write queue (write_queue.py), and reports the queue's batch sizes;
+--max-batch 1 turns group commit off for comparison.
+
+--unsafe runs the old path instead (availability read on a reader
+connection, then a separate exec_query INSERT) to show the double claims
+the reservation API prevents.
+
+Usage:
+    python stress_claims.py [--writers 50] [--attempts 40] [--listings 2000] [--unsafe]
+    python stress_claims.py --sessions [--max-batch 1]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import claim_status
+import write_queue
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+AVAILABLE_SQL = f"""
+    SELECT f.food_id FROM food_listings f
+    WHERE NOT EXISTS (SELECT 1 FROM claims c WHERE c.food_id = f.food_id AND {claim_status.is_active('c')})
+    ORDER BY f.food_id LIMIT ?
+"""
+ADD_LISTINGS_SQL = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+    INSERT INTO food_listings (food_id, food_name, quantity, expiry_date, expiry_epoch, provider_id,
+                               provider_type_id, location_id, food_type_id, meal_type_id)
+    SELECT (SELECT MAX(food_id) FROM food_listings) + n.i, f.food_name, f.quantity, f.expiry_date,
+           f.expiry_epoch, f.provider_id, f.provider_type_id, f.location_id, f.food_type_id, f.meal_type_id
+    FROM n JOIN food_listings f ON f.food_id = (n.i - 1) % (SELECT COUNT(*) FROM food_listings) + 1
+"""
+DOUBLE_CLAIMS_SQL = f"""
+    SELECT food_id, COUNT(*) FROM claims c
+    WHERE c.food_id IN (SELECT value FROM json_each(?)) AND {claim_status.is_active('c')}
+    GROUP BY food_id HAVING COUNT(*) > 1
+"""
+
+
+def _unsafe_claim(food_id: int, receiver_id: int) -> str:
+    from db import exec_query, run_query
+    held = run_query(f"SELECT 1 FROM claims c WHERE c.food_id = ? AND {claim_status.is_active('c')}", [food_id])
+    if not held.empty:
+        return "conflict"
+    exec_query("INSERT INTO claims (food_id, receiver_id, status_code, timestamp, timestamp_epoch) "
+               "VALUES (?, ?, ?, datetime('now'), CAST(strftime('%s', 'now') AS INTEGER))",
+               [food_id, receiver_id, claim_status.PENDING])
+    return "reserved"
+
+
+def _attempt_claims(reservations, rng, food_ids, receiver_ids, attempts, unsafe, outcomes):
+    for _ in range(attempts):
+        food_id, receiver_id = rng.choice(food_ids), rng.choice(receiver_ids)
+        if unsafe:
+            outcomes[_unsafe_claim(food_id, receiver_id)] += 1
+        else:
+            result = reservations.reserve_claim(food_id, receiver_id)
+            outcomes[result["outcome"]] += 1
+            outcomes["retries"] += result["attempts"] - 1 if result["attempts"] else 0
+
+
+def writer(db_path, food_ids, receiver_ids, attempts, unsafe, seed, ready, start, results):
+    os.environ["FOOD_DB_PATH"] = db_path
+    import reservations  # imported here so db opens the scratch database
+
+    rng = random.Random(seed)
+    outcomes = Counter()
+    ready.put(os.getpid())
+    start.wait()
+    _attempt_claims(reservations, rng, food_ids, receiver_ids, attempts, unsafe, outcomes)
+    results.put(dict(outcomes))
+
+
+def server(db_path, food_ids, receiver_ids, attempts, unsafe, seed, sessions, max_batch, ready, start, results):
+    """One app server process with `sessions` threads sharing its write queue."""
+    os.environ["FOOD_DB_PATH"] = db_path
+    import db
+    import reservations
+
+    db.writes.max_batch = max_batch
+    outcomes = [Counter() for _ in range(sessions)]
+    threads = [threading.Thread(target=_attempt_claims, args=(reservations, random.Random(seed + i), food_ids,
+                                                              receiver_ids, attempts, unsafe, outcomes[i]))
+               for i in range(sessions)]
+    ready.put(os.getpid())
+    start.wait()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = sum(outcomes, Counter())
+    results.put({**total, "write_queue": db.writes.metrics()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer claim reservation with concurrent writer processes.")
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=40, help="claims each writer tries (default: %(default)s)")
+    parser.add_argument("--listings", type=int, default=2000,
+                        help="available listings the writers compete for (default: %(default)s)")
+    parser.add_argument("--unsafe", action="store_true", help="use the old check-then-insert path")
+    parser.add_argument("--sessions", action="store_true",
+                        help="run the writers as threads of one process (sessions of one app server)")
+    parser.add_argument("--max-batch", type=int, default=write_queue.MAX_BATCH,
+                        help="group-commit batch limit with --sessions; 1 commits every write alone "
+                             "(default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "food.db")
+        shutil.copy(DB_PATH, db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = WAL;")
+        food_ids = [row[0] for row in conn.execute(AVAILABLE_SQL, [args.listings])]
+        if len(food_ids) < args.listings:
+            conn.execute(ADD_LISTINGS_SQL, [args.listings - len(food_ids)])
+            conn.commit()
+            food_ids = [row[0] for row in conn.execute(AVAILABLE_SQL, [args.listings])]
+        receiver_ids = [row[0] for row in conn.execute("SELECT receiver_id FROM receivers")]
+        claims_before = conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+        conn.close()
+        print(f"[OK] {args.writers} {'sessions' if args.sessions else 'writers'} x {args.attempts} attempts "
+              f"on {len(food_ids)} available listings" + (" (unsafe path)" if args.unsafe else ""))
+
+        ctx = mp.get_context("spawn")
+        ready, start, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+        if args.sessions:
+            procs = [ctx.Process(target=server, args=(db_path, food_ids, receiver_ids, args.attempts, args.unsafe,
+                                                      args.seed, args.writers, args.max_batch, ready, start, results))]
+        else:
+            procs = [ctx.Process(target=writer, args=(db_path, food_ids, receiver_ids, args.attempts, args.unsafe,
+                                                      args.seed + i, ready, start, results))
+                     for i in range(args.writers)]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.get()  # every writer has imported and connected
+        began = time.perf_counter()
+        start.set()
+        outcomes, queue_metrics = Counter(), None
+        for _ in procs:
+            result = results.get()
+            queue_metrics = result.pop("write_queue", None)
+            outcomes.update(result)
+        elapsed = time.perf_counter() - began
+        for p in procs:
+            p.join()
+
+        conn = sqlite3.connect(db_path)
+        doubles = conn.execute(DOUBLE_CLAIMS_SQL, [str(food_ids).replace(" ", "")]).fetchall()
+        new_claims = conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0] - claims_before
+        conn.close()
+
+    attempts = args.writers * args.attempts
+    print(f"[OK] {attempts} attempts in {elapsed:.2f}s: {attempts / elapsed:,.0f} attempts/s, "
+          f"{outcomes['reserved'] / elapsed:,.0f} claims/s")
+    print(f"[OK] outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+    if queue_metrics:
+        print(f"[OK] write queue: {queue_metrics['batches']} commits, avg batch {queue_metrics['avg_batch_size']}, "
+              f"max {queue_metrics['max_batch_size']}, p95 request {queue_metrics['p95_request_ms']} ms, "
+              f"batch sizes {queue_metrics['batch_size_histogram']}")
+    print(f"[OK] {new_claims} new claim rows for {outcomes['reserved']} reserved results")
+    if doubles or new_claims != outcomes["reserved"]:
+        print(f"[FAIL] {len(doubles)} listings claimed more than once, e.g. {doubles[:5]}")
+        sys.exit(1)
+    print("[OK] No listing was claimed twice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Point the app's modules at a scratch copy of food.db before any test
+imports db (it opens FOOD_DB_PATH on import).
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="food-tests-")
+shutil.copy(os.path.join(ROOT, "food.db"), os.path.join(_scratch, "food.db"))
+os.environ["FOOD_DB_PATH"] = os.path.join(_scratch, "food.db")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_scratch, ignore_errors=True)
@@ -0,0 +1,16 @@
+import db
+import reservations
+from model_registry import data_fingerprint
+
+
+def test_fingerprint_follows_new_claims():
+    fingerprint, n_claims = data_fingerprint()
+    assert n_claims == int(db.run_query("SELECT COUNT(*) AS n FROM claims")["n"][0])
+
+    food_id = int(db.run_query("SELECT MAX(food_id) AS id FROM food_listings")["id"][0])
+    receiver_id = int(db.run_query("SELECT MIN(receiver_id) AS id FROM receivers")["id"][0])
+    reservations.reserve_claim(food_id, receiver_id, status="Cancelled")
+
+    new_fingerprint, new_claims = data_fingerprint()
+    assert new_claims == n_claims + 1
+    assert new_fingerprint != fingerprint
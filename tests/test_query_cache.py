@@ -0,0 +1,36 @@
+import availability
+import db
+import lookups
+import reservations
+from query_cache import tables_in
+
+
+def test_tables_in_skips_ctes():
+    sql = "WITH recent AS (SELECT * FROM claims) SELECT * FROM recent JOIN receivers r ON r.receiver_id = recent.receiver_id"
+    assert {"claims", "receivers"} <= tables_in(sql)
+    assert "recent" not in tables_in(sql)
+
+
+def test_tables_in_ignores_upsert_do_update():
+    sql = ("INSERT INTO table_versions (table_name, version) VALUES (?, 1) "
+           "ON CONFLICT(table_name) DO UPDATE SET version = version + 1")
+    assert tables_in(sql) == {"table_versions"}
+    assert tables_in("UPDATE claims SET status_code = ?") == {"claims"}
+
+
+def test_tables_in_expands_derived_tables_transitively():
+    # food_listings_view -> food_listings -> claims
+    assert "claims" in tables_in(f"SELECT f.food_id FROM {lookups.VIEWS['food_listings']} f")
+
+
+def test_reservation_invalidates_open_listings_view():
+    sql = f"SELECT f.food_id FROM {lookups.VIEWS['food_listings']} f WHERE {availability.is_open('f')}"
+    before = db.run_query(sql)["food_id"].tolist()
+    receiver_id = int(db.run_query("SELECT MIN(receiver_id) AS id FROM receivers")["id"][0])
+
+    result = reservations.reserve_claim(before[0], receiver_id)
+
+    assert result["outcome"] == reservations.RESERVED
+    after = db.run_query(sql)["food_id"].tolist()
+    assert before[0] not in after
+    assert len(after) == len(before) - 1
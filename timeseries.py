@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Time-bucketed rollups of listings and claims for the trend charts.
+
+rollup_timeseries holds, per grain (hour, day, week), city and bucket
+start (UTC epoch seconds):
+
+- listings_created: listings by creation time (food_listings.created_epoch)
+- claims_pending / claims_completed / claims_cancelled: claims by the time
+  they were made, under their current status
+- quantity_claimed: listing quantity of the completed claims
+
+Every bucket also has a row for ALL cities, so a chart over any range
+reads one row per bucket whatever the number of cities. Weeks start on
+Monday. Triggers on claims and food_listings apply +/- deltas to the
+affected buckets in the same transaction as the write, so a chart's cost
+depends on the number of buckets it shows, not on the length of the
+history; long ranges are read at a coarser grain (see chart_data.py).
+
+Listings imported from the CSVs have no creation time. setup_db backfills
+it with the time of the listing's first claim; imported listings never
+claimed stay out of listings_created.
+
+Usage:
+    python timeseries.py             # rebuild from scratch, then verify
+    python timeseries.py --verify    # only check against the base tables
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+import claim_status
+import lookups
+from query_cache import register_derived, bump_versions
+
+DB_PATH = os.environ.get("FOOD_DB_PATH", "food.db")
+
+TABLE = "rollup_timeseries"
+TRIGGER_PREFIX = "trg_timeseries_"
+ALL = "*"  # city of the all-cities rows
+
+GRAINS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+COUNTERS = ["listings_created", "claims_pending", "claims_completed", "claims_cancelled", "quantity_claimed"]
+
+register_derived(TABLE, ["claims", "food_listings"])
+
+COLUMNS = """
+    grain            TEXT NOT NULL,
+    city             TEXT NOT NULL,
+    bucket           INTEGER NOT NULL,
+""" + ",\n".join(f"    {name:<16} INTEGER NOT NULL DEFAULT 0" for name in COUNTERS) + """,
+    PRIMARY KEY (grain, city, bucket)
+"""
+
+
+def bucket_of(grain: str, epoch: str) -> str:
+    """SQL for the start of the `grain` bucket holding `epoch`."""
+    if grain == "week":  # day 0 (1970-01-01) is a Thursday; shift to Monday
+        return f"((({epoch}) / 86400 + 3) / 7 * 7 - 3) * 86400"
+    return f"(({epoch}) / {GRAINS[grain]}) * {GRAINS[grain]}"
+
+
+def bucket_start(grain: str, epoch: int) -> int:
+    """Python twin of bucket_of()."""
+    if grain == "week":
+        return ((epoch // 86400 + 3) // 7 * 7 - 3) * 86400
+    return epoch // GRAINS[grain] * GRAINS[grain]
+
+
+# ---------- Event sources ----------
+# Each yields one row per event with the columns e (epoch), city and one
+# value per counter.
+def _city(listing: str) -> str:
+    """City (location name) of the food_listings row `listing`."""
+    return lookups.name_of("food_listings", "location", listing)
+
+
+def _claim_counters(status: str, quantity: str) -> str:
+    return (f"0 AS listings_created, {status} = {claim_status.PENDING} AS claims_pending, "
+            f"{status} = {claim_status.COMPLETED} AS claims_completed, "
+            f"{status} = {claim_status.CANCELLED} AS claims_cancelled, "
+            f"CASE WHEN {status} = {claim_status.COMPLETED} THEN IFNULL({quantity}, 0) ELSE 0 END AS quantity_claimed")
+
+
+def _claims_of(food_id: str, city: str, quantity: str, condition: str = "1") -> str:
+    """Claims of one listing, attributed to the given city and quantity."""
+    return (f"SELECT c.timestamp_epoch AS e, {city} AS city, " + _claim_counters("c.status_code", quantity)
+            + f" FROM claims c WHERE c.food_id = {food_id} AND {condition}")
+
+
+# ---------- Trigger bodies ----------
+# Additions are UPSERTs. Unlike INSERT OR IGNORE (see rollups.py), the
+# DO UPDATE clause is not overridden by the conflict clause of the
+# statement that fired the trigger.
+def _upsert(grain: str, city: str, bucket: str, values: list) -> str:
+    return (f"INSERT INTO {TABLE} (grain, city, bucket, {', '.join(n for n, _ in values)}) "
+            f"SELECT '{grain}', {city}, {bucket}, {', '.join(v for _, v in values)}")
+
+
+def _on_conflict(names) -> str:
+    return (" ON CONFLICT(grain, city, bucket) DO UPDATE SET "
+            + ", ".join(f"{n} = {n} + excluded.{n}" for n in names) + ";")
+
+
+def _drop_empty(where: str) -> str:
+    return f"DELETE FROM {TABLE} WHERE {where} AND " + " AND ".join(f"{n} = 0" for n in COUNTERS) + ";"
+
+
+def _delta(source: str, sign: int) -> list:
+    """Add (sign > 0) or remove the events of `source`, a SELECT yielding
+    the columns e (epoch), city and one per counter, at every grain."""
+    stmts = []
+    for grain in GRAINS:
+        bucket = bucket_of(grain, "s.e")
+        for city in ("s.city", f"'{ALL}'"):
+            if sign > 0:
+                stmts.append(_upsert(grain, city, bucket, [(n, f"SUM(s.{n})") for n in COUNTERS])
+                             + f" FROM ({source}) s WHERE s.e IS NOT NULL GROUP BY 2, 3" + _on_conflict(COUNTERS))
+                continue
+            stmts.append(
+                f"UPDATE {TABLE} SET " + ", ".join(f"{n} = {TABLE}.{n} - d.{n}" for n in COUNTERS)
+                + f" FROM (SELECT {city} AS city, {bucket} AS bucket, "
+                + ", ".join(f"SUM(s.{n}) AS {n}" for n in COUNTERS)
+                + f" FROM ({source}) s WHERE s.e IS NOT NULL GROUP BY 1, 2) d "
+                f"WHERE {TABLE}.grain = '{grain}' AND {TABLE}.city = d.city AND {TABLE}.bucket = d.bucket;")
+            stmts.append(_drop_empty(f"grain = '{grain}' AND (city, bucket) IN "
+                                     f"(SELECT {city}, {bucket} FROM ({source}) s WHERE s.e IS NOT NULL)"))
+    return stmts
+
+
+def _row_delta(epoch: str, city: str, values: dict, sign: int) -> list:
+    """_delta() for a single event given as SQL expressions (e.g. over NEW).
+
+    Statements on one primary key each; much cheaper per trigger firing
+    than aggregating a subquery.
+    """
+    stmts = []
+    for grain in GRAINS:
+        bucket = bucket_of(grain, epoch)
+        for key in (city, f"'{ALL}'"):
+            if sign > 0:
+                stmts.append(_upsert(grain, key, bucket, list(values.items()))
+                             + f" WHERE {epoch} IS NOT NULL" + _on_conflict(values))
+                continue
+            where = f"grain = '{grain}' AND city = {key} AND bucket = {bucket}"
+            stmts.append(f"UPDATE {TABLE} SET " + ", ".join(f"{n} = {n} - {v}" for n, v in values.items())
+                         + f" WHERE {where};")
+            stmts.append(_drop_empty(where))
+    return stmts
+
+
+def _claim_row(row: str, sign: int) -> list:
+    listing = f"(SELECT {{}} FROM food_listings WHERE food_id = {row}.food_id)"
+    status = f"{row}.status_code"
+    return _row_delta(f"{row}.timestamp_epoch", f"IFNULL({listing.format(_city('food_listings'))}, '')", {
+        "claims_pending": f"({status} = {claim_status.PENDING})",
+        "claims_completed": f"({status} = {claim_status.COMPLETED})",
+        "claims_cancelled": f"({status} = {claim_status.CANCELLED})",
+        "quantity_claimed": f"(CASE WHEN {status} = {claim_status.COMPLETED} "
+                            f"THEN IFNULL({listing.format('quantity')}, 0) ELSE 0 END)",
+    }, sign)
+
+
+def _listing_row(row: str, sign: int) -> list:
+    return _row_delta(f"{row}.created_epoch", f"IFNULL({_city(row)}, '')", {"listings_created": "1"}, sign)
+
+
+def _listing_claims_moved(food_id: str, old_city: str, old_quantity: str, new_city: str, new_quantity: str,
+                          condition: str = "1") -> list:
+    """Re-attribute a listing's claims when its city or quantity changes."""
+    return (_delta(_claims_of(food_id, old_city, old_quantity, condition), -1)
+            + _delta(_claims_of(food_id, new_city, new_quantity, condition), +1))
+
+
+NEW_ATTRS = (f"IFNULL({_city('NEW')}, '')", "NEW.quantity")
+OLD_ATTRS = (f"IFNULL({_city('OLD')}, '')", "OLD.quantity")
+ORPHAN_ATTRS = ("''", "NULL")  # claims whose listing does not exist
+ID_CHANGED = "OLD.food_id IS NOT NEW.food_id"
+
+# Columns of food_listings the time series reads
+LISTING_COLUMNS = ["food_id", "quantity", lookups.stored_column("food_listings", "location"), "created_epoch"]
+
+TRIGGERS = {
+    ("claims", "INSERT"): _claim_row("NEW", +1),
+    ("claims", "DELETE"): _claim_row("OLD", -1),
+    ("claims", "UPDATE OF food_id, status_code, timestamp_epoch"): _claim_row("OLD", -1) + _claim_row("NEW", +1),
+
+    ("food_listings", "INSERT"):
+        _listing_row("NEW", +1)
+        + _listing_claims_moved("NEW.food_id", *ORPHAN_ATTRS, *NEW_ATTRS),
+    ("food_listings", "DELETE"):
+        _listing_row("OLD", -1)
+        + _listing_claims_moved("OLD.food_id", *OLD_ATTRS, *ORPHAN_ATTRS),
+    ("food_listings", f"UPDATE OF {', '.join(LISTING_COLUMNS)}"):
+        _listing_row("OLD", -1)
+        + _listing_row("NEW", +1)
+        # Only the claims of OLD.food_id move when the id stays the same
+        + _listing_claims_moved("OLD.food_id", *OLD_ATTRS, *NEW_ATTRS, f"NOT ({ID_CHANGED})")
+        + _listing_claims_moved("OLD.food_id", *OLD_ATTRS, *ORPHAN_ATTRS, ID_CHANGED)
+        + _listing_claims_moved("NEW.food_id", *ORPHAN_ATTRS, *NEW_ATTRS, ID_CHANGED),
+}
+
+EVENTS_SQL = f"""
+    SELECT f.created_epoch AS e, IFNULL({_city('f')}, '') AS city, 1 AS listings_created,
+           0 AS claims_pending, 0 AS claims_completed, 0 AS claims_cancelled, 0 AS quantity_claimed
+    FROM food_listings f
+    UNION ALL
+    SELECT c.timestamp_epoch, IFNULL({_city('f')}, ''), {_claim_counters("c.status_code", "f.quantity")}
+    FROM claims c LEFT JOIN food_listings f ON f.food_id = c.food_id"""
+
+EXPECTED = " UNION ALL ".join(
+    f"SELECT '{grain}', {city}, {bucket_of(grain, 's.e')}, " + ", ".join(f"SUM(s.{n})" for n in COUNTERS)
+    + f" FROM ({EVENTS_SQL}) s WHERE s.e IS NOT NULL GROUP BY 2, 3"
+    for grain in GRAINS for city in ("s.city", f"'{ALL}'")
+)
+
+BACKFILL_SQL = """
+    UPDATE food_listings SET created_epoch = (SELECT MIN(c.timestamp_epoch) FROM claims c
+                                              WHERE c.food_id = food_listings.food_id)
+    WHERE created_epoch IS NULL"""
+
+
+def _trigger_name(table: str, event: str) -> str:
+    return f"{TRIGGER_PREFIX}{table}_{event.split()[0].lower()}"
+
+
+def backfill_created(conn: sqlite3.Connection) -> int:
+    """Give listings without a creation time the time of their first claim.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    return conn.execute(BACKFILL_SQL).rowcount
+
+
+def installed(conn: sqlite3.Connection) -> bool:
+    count = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", [TRIGGER_PREFIX + "%"]
+    ).fetchone()[0]
+    return count == len(TRIGGERS)
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recompute the time series from the base tables and (re)install triggers.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    for (table, event) in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {_trigger_name(table, event)};")
+    conn.execute(f"DROP TABLE IF EXISTS {TABLE};")
+    conn.execute(f"CREATE TABLE {TABLE} ({COLUMNS}) WITHOUT ROWID;")
+    conn.execute(f"INSERT INTO {TABLE} (grain, city, bucket, {', '.join(COUNTERS)}) {EXPECTED};")
+    for (table, event), body in TRIGGERS.items():
+        conn.execute(
+            f"CREATE TRIGGER {_trigger_name(table, event)} AFTER {event} ON {table} "
+            f"BEGIN\n    " + "\n    ".join(body) + "\nEND;"
+        )
+    bump_versions(conn, [TABLE])
+
+
+def verify(conn: sqlite3.Connection) -> dict:
+    """Rows that differ from a fresh recomputation (empty if none)."""
+    expected = f"SELECT * FROM ({EXPECTED})"
+    extra = conn.execute(f"SELECT COUNT(*) FROM (SELECT * FROM {TABLE} EXCEPT {expected})").fetchone()[0]
+    missing = conn.execute(f"SELECT COUNT(*) FROM ({expected} EXCEPT SELECT * FROM {TABLE})").fetchone()[0]
+    return {"unexpected_rows": extra, "missing_rows": missing} if extra or missing else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild and verify the time-bucketed rollups.")
+    parser.add_argument("--verify", action="store_true", help="only verify, do not rebuild")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not args.verify:
+            rebuild(conn)
+            conn.commit()
+            rows = conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+            print(f"[OK] Rebuilt {TABLE} ({rows} rows) and {len(TRIGGERS)} triggers")
+        mismatches = verify(conn)
+    finally:
+        conn.close()
+
+    if mismatches:
+        print(f"[FAIL] {TABLE}: {mismatches['unexpected_rows']} unexpected, {mismatches['missing_rows']} missing rows")
+        sys.exit(1)
+    print("[OK] Time series match the base tables")
+
+
+if __name__ == "__main__":
+    main()
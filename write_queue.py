@@ -0,0 +1,239 @@
+"""
+Group-commit write queue.
+
+One background thread owns the pool's writer connection and applies
+write requests from every session of the server process. It takes the
+first waiting request, collects whatever else arrives within
+MAX_DELAY_MS (up to MAX_BATCH requests), and applies them all in one
+BEGIN IMMEDIATE transaction with a single commit, so a burst of writes
+pays for one write lock acquisition and one commit instead of one each.
+
+Each request runs under its own SAVEPOINT: a request that raises is
+rolled back on its own and its caller gets the exception, while the rest
+of the batch still commits. Callers block on a Future that resolves only
+after the batch has committed (or failed), so a returned write is a
+durable write. If the write lock stays busy (another process is writing)
+the whole batch is retried with exponential backoff and jitter, and
+after `retries` attempts every request in it fails with SQLITE_BUSY.
+
+Table versions are bumped per request, inside its savepoint, so the
+versions passed to `on_commit` for each request are exactly the ones
+that request moved on from, as if it had committed alone.
+
+Requests must not submit to the queue themselves (the writer thread
+would wait on itself).
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+from query_cache import bump_versions, read_versions
+from query_stats import percentile
+
+MAX_BATCH = 64
+MAX_DELAY_MS = 2.0
+WRITE_RETRIES = 6
+RETRY_BASE_SECONDS = 0.02
+WAIT_TIMEOUT_SECONDS = 60
+SAMPLES = 1000
+
+_SQLITE_BUSY, _SQLITE_LOCKED = 5, 6
+
+log = logging.getLogger("write_queue")
+
+
+def is_busy(error: sqlite3.OperationalError) -> bool:
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (_SQLITE_BUSY, _SQLITE_LOCKED)
+    return "locked" in str(error) or "busy" in str(error)
+
+
+class WriteRequest:
+    """One unit of work for the writer thread and its outcome."""
+
+    __slots__ = ("work", "tables", "label", "params", "kind", "future", "submitted",
+                 "result", "error", "changes", "before", "attempts", "row")
+
+    def __init__(self, work, tables, label: str, params=None, kind: str = "write", row=None):
+        self.work = work
+        self.tables = tables
+        self.label = label
+        self.params = params
+        self.kind = kind
+        self.row = row
+        self.future = Future()
+        self.submitted = time.perf_counter()
+        self.attempts = 0
+        self._reset()
+
+    def _reset(self):
+        self.result = self.error = self.before = None
+        self.changes = 0
+
+
+class WriteQueue:
+    """Batches write requests from many threads into group commits.
+
+    `on_commit(request)` is called on the writer thread for every request
+    of a committed batch, before its caller is woken up; `request.error`
+    is set if the request was rolled back and `request.changes` is 0 if
+    it changed nothing.
+    """
+
+    def __init__(self, pool, on_commit=None, max_batch: int = MAX_BATCH,
+                 max_delay_ms: float = MAX_DELAY_MS, retries: int = WRITE_RETRIES):
+        self.pool = pool
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.retries = retries
+        self._queue = Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    # -- callers --------------------------------------------------------
+
+    def submit(self, work, tables, label: str, params=None, kind: str = "transaction",
+               row=None) -> WriteRequest:
+        """Queue work(conn) to run in the next batch; wait on request.future."""
+        self._ensure_started()
+        request = WriteRequest(work, tables, label, params, kind, row)
+        self._queue.put(request)
+        return request
+
+    def execute(self, sql: str, params, tables) -> int:
+        """Run one statement in the next batch; returns its rowcount."""
+        request = self.submit(lambda conn: conn.execute(sql, params).rowcount, tables, sql, params, "write")
+        return request.future.result(WAIT_TIMEOUT_SECONDS)
+
+    def transaction(self, work, tables, label: str, row=None) -> tuple:
+        """Run work(conn) atomically in the next batch; returns (result, attempts)."""
+        request = self.submit(work, tables, label, row=row)
+        return request.future.result(WAIT_TIMEOUT_SECONDS), request.attempts
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # -- writer thread --------------------------------------------------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.perf_counter())))
+                except Empty:
+                    break
+            try:
+                self._commit(batch)
+            except BaseException as e:  # keep the writer alive; the callers get the error
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _apply(self, conn: sqlite3.Connection, request: WriteRequest):
+        conn.execute("SAVEPOINT write_request")
+        request.before = read_versions(conn)
+        changes = conn.total_changes
+        try:
+            request.result = request.work(conn)
+            request.changes = conn.total_changes - changes
+            if request.changes:
+                bump_versions(conn, request.tables)
+        except Exception as e:
+            conn.execute("ROLLBACK TO write_request")
+            request._reset()
+            request.error = e
+        conn.execute("RELEASE write_request")
+
+    def _commit(self, batch: list):
+        start = time.perf_counter()
+        for attempt in range(1, self.retries + 1):
+            for request in batch:
+                request._reset()
+                request.attempts = attempt
+            try:
+                with self.pool.writer() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for request in batch:
+                        self._apply(conn, request)
+                break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e) or attempt == self.retries:
+                    raise
+                time.sleep(RETRY_BASE_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        committed = time.perf_counter()
+
+        for request in batch:
+            if self.on_commit:
+                try:
+                    self.on_commit(request)
+                except Exception:  # the batch is committed; a broken callback must not undo that for callers
+                    log.exception("on_commit failed for %s", request.label[:200])
+            if request.error is not None:
+                request.future.set_exception(request.error)
+            else:
+                request.future.set_result(request.result)
+        self._record(batch, sum(r.error is not None for r in batch), (committed - start) * 1000)
+
+    # -- metrics --------------------------------------------------------
+
+    def _record(self, batch: list, failed: int, commit_ms: float):
+        now = time.perf_counter()
+        with self._metrics_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._failed += failed
+            self._retried += batch[0].attempts > 1
+            self._batch_sizes.append(len(batch))
+            self._commit_ms.append(commit_ms)
+            self._wait_ms.extend((now - r.submitted) * 1000 for r in batch)
+
+    def metrics(self) -> dict:
+        """Queue depth, batch sizes and latencies over the last SAMPLES batches."""
+        with self._metrics_lock:
+            sizes = sorted(self._batch_sizes)
+            commit_ms = sorted(self._commit_ms)
+            wait_ms = sorted(self._wait_ms)
+            totals = {"batches": self._batches, "requests": self._requests,
+                      "failed": self._failed, "retried_batches": self._retried}
+        histogram = {}
+        for size in sizes:
+            bucket = 1 if size == 1 else 2 ** (size - 1).bit_length()  # 1, 2, 4, 8, ...
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        return {
+            "queue_depth": self.depth(),
+            **totals,
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "max_batch_size": sizes[-1] if sizes else 0,
+            "batch_size_histogram": {f"<={k}": v for k, v in sorted(histogram.items())},
+            "p50_commit_ms": round(percentile(commit_ms, 50), 2),
+            "p95_commit_ms": round(percentile(commit_ms, 95), 2),
+            "p50_request_ms": round(percentile(wait_ms, 50), 2),
+            "p95_request_ms": round(percentile(wait_ms, 95), 2),
+        }
+
+    def reset_metrics(self):
+        with self._metrics_lock:
+            self._batches = self._requests = self._failed = self._retried = 0
+            self._batch_sizes = deque(maxlen=SAMPLES)
+            self._commit_ms = deque(maxlen=SAMPLES)
+            self._wait_ms = deque(maxlen=SAMPLES)